@@ -0,0 +1,460 @@
+# ============================================
+# RETRIEVAL QUALITY & LATENCY BENCHMARK
+# Scripted replacement for comprehensive_model_comparison.ipynb
+# ============================================
+#
+# Usage (from Training_Model/):
+#   python benchmark_retrieval.py --samples 500 --output benchmark_results.json
+#   python benchmark_retrieval.py --compare benchmark_results.json   # exits 1 on regression
+#
+# Every (retriever, index variant) pair runs in its own spawned process, so
+# peak RSS is measured per configuration. Quality metrics match the notebook
+# (SequenceMatcher accuracy, token-set precision/recall/F1, ROUGE-1/2/L, exact
+# match), plus recall@1/@5 of the reference code over the ranked results;
+# latency is measured through TrainingModelService.search.
+#
+# The split is by prompt hash, so a deduplicated dataset (dedup_dataset.py) is
+# queried with the same prompts as the original:
+#   python benchmark_retrieval.py --dataset flutter_dataset_dedup.jsonl --models --variants bm25
+#   (add --canonical-only to index without the duplicate_prompts rows)
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import platform
+import multiprocessing
+from datetime import datetime
+from collections import Counter
+from difflib import SequenceMatcher
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from dataset_builder import iter_jsonl_dataset
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.insert(0, BACKEND_DIR)
+
+MODELS = {
+    'MiniLM-L6': 'trained_models/MiniLM-L6_flutter_retriever_transformer',
+    'MiniLM-L12': 'trained_models/MiniLM-L12_flutter_retriever_transformer',
+    'MPNet-Base': 'trained_models/MPNet-Base_flutter_retriever_transformer',
+}
+
+# TrainingModelService options per index variant
+VARIANTS = {
+    'dense': {'retrieval_mode': 'dense'},
+    'hybrid': {'retrieval_mode': 'hybrid'},
+    'hybrid-first-stage': {'retrieval_mode': 'hybrid', 'sparse_first_stage': 200},
+}
+
+# Encoder-free baseline: BM25 over the same training split
+SPARSE_BASELINE = 'bm25'
+
+QUALITY_METRICS = ('accuracy', 'precision', 'recall', 'f1_score', 'rouge1', 'rouge2', 'rougeL', 'exact_match_rate',
+                   'recall_at_1', 'recall_at_5')
+# Retrieved results per query, for recall@k
+RECALL_K = (1, 5)
+LATENCY_METRICS = ('p50_ms', 'p95_ms', 'p99_ms')
+
+_ROUGE_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+# ============================================
+# METRICS
+# ============================================
+
+def _rouge_tokens(text):
+    return _ROUGE_TOKEN_RE.findall(text.lower())
+
+
+def _lcs_length(a, b):
+    """LCS length of two token lists, bit-parallel over ``a`` (Hyyrö 2004)"""
+    if not a or not b:
+        return 0
+    masks = {}
+    for i, token in enumerate(a):
+        masks[token] = masks.get(token, 0) | (1 << i)
+    v = (1 << len(a)) - 1
+    for token in b:
+        u = v & masks.get(token, 0)
+        v = (v + u) | (v - u)
+    return len(a) - bin(v & ((1 << len(a)) - 1)).count('1')
+
+
+def _f_measure(overlap, pred_total, ref_total):
+    if not overlap or not pred_total or not ref_total:
+        return 0.0
+    precision, recall = overlap / pred_total, overlap / ref_total
+    return 2 * precision * recall / (precision + recall)
+
+
+def _ngram_overlap(pred, ref, n):
+    pred_ngrams = Counter(zip(*(pred[i:] for i in range(n))))
+    ref_ngrams = Counter(zip(*(ref[i:] for i in range(n))))
+    overlap = sum((pred_ngrams & ref_ngrams).values())
+    return _f_measure(overlap, sum(pred_ngrams.values()), sum(ref_ngrams.values()))
+
+
+def rouge_scores(pred, ref):
+    """ROUGE-1/2/L F-measures; uses rouge_score when installed (as the notebook did)"""
+    try:
+        from rouge_score import rouge_scorer
+    except ImportError:
+        pred_tokens, ref_tokens = _rouge_tokens(pred), _rouge_tokens(ref)
+        return {
+            'rouge1': _ngram_overlap(pred_tokens, ref_tokens, 1),
+            'rouge2': _ngram_overlap(pred_tokens, ref_tokens, 2),
+            'rougeL': _f_measure(_lcs_length(ref_tokens, pred_tokens), len(pred_tokens), len(ref_tokens)),
+        }
+
+    scorer = rouge_scores.__dict__.setdefault(
+        'scorer', rouge_scorer.RougeScorer(['rouge1', 'rouge2', 'rougeL'], use_stemmer=True)
+    )
+    scores = scorer.score(ref, pred)
+    return {name: scores[name].fmeasure for name in ('rouge1', 'rouge2', 'rougeL')}
+
+
+def rouge_implementation():
+    try:
+        import rouge_score  # noqa: F401
+        return 'rouge_score (stemmed)'
+    except ImportError:
+        return 'builtin (unstemmed)'
+
+
+def _code_key(code):
+    return ' '.join(code.split())
+
+
+def recall_at_k(ranked_codes, references):
+    """Share of queries whose reference code (whitespace-insensitive) is among the top k results"""
+    hits = {k: 0 for k in RECALL_K}
+    for ranked, ref in zip(ranked_codes, references):
+        ranked = [_code_key(code) for code in ranked]
+        ref = _code_key(ref)
+        for k in RECALL_K:
+            hits[k] += ref in ranked[:k]
+    count = len(references) or 1
+    return {f'recall_at_{k}': round(hits[k] / count, 6) for k in RECALL_K}
+
+
+def calculate_metrics(ranked_codes, references):
+    """
+    Same metric definitions as comprehensive_model_comparison.ipynb (on the top
+    result), plus recall@k over the ranked results
+    """
+    predictions = [ranked[0] if ranked else '' for ranked in ranked_codes]
+    totals = {name: 0.0 for name in QUALITY_METRICS if not name.startswith('recall_at_')}
+    for pred, ref in zip(predictions, references):
+        pred, ref = pred.strip(), ref.strip()
+        if pred == ref:
+            # Every metric is exactly 1.0; skip the quadratic comparisons
+            for name in totals:
+                totals[name] += 1.0
+            continue
+
+        totals['accuracy'] += SequenceMatcher(None, pred, ref).ratio()
+        pred_tokens, ref_tokens = set(pred.split()), set(ref.split())
+        if pred_tokens and ref_tokens:
+            common = len(pred_tokens & ref_tokens)
+            precision, recall = common / len(pred_tokens), common / len(ref_tokens)
+            totals['precision'] += precision
+            totals['recall'] += recall
+            totals['f1_score'] += 2 * precision * recall / (precision + recall) if common else 0.0
+        for name, value in rouge_scores(pred, ref).items():
+            totals[name] += value
+
+    count = len(predictions) or 1
+    metrics = {name: round(value / count, 6) for name, value in totals.items()}
+    metrics.update(recall_at_k(ranked_codes, references))
+    return metrics
+
+
+def latency_summary(latencies_ms, wall_seconds):
+    latencies = np.asarray(latencies_ms, dtype=np.float64)
+    return {
+        'queries': int(latencies.size),
+        'mean_ms': round(float(latencies.mean()), 3),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 3),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 3),
+        'max_ms': round(float(latencies.max()), 3),
+        'throughput_qps': round(latencies.size / wall_seconds, 2) if wall_seconds else 0.0,
+    }
+
+
+# ============================================
+# SPLIT
+# ============================================
+
+def flatten_records(dataset_path):
+    """
+    (record, is_duplicate) per prompt: records merged by dedup_dataset.py are
+    expanded back into one row per ``duplicate_prompts`` entry, sharing the code
+    """
+    for record in iter_jsonl_dataset(dataset_path):
+        if not (record.get('prompt') and record.get('flutter_code')):
+            continue
+        duplicates = record.pop('duplicate_prompts', None) or []
+        record.pop('cluster_size', None)
+        yield record, False
+        for prompt in duplicates:
+            yield {**record, 'prompt': prompt}, True
+
+
+def _test_rank(prompt, seed):
+    """Uniform [0, 1) position of a prompt; the split depends on the prompt only"""
+    digest = hashlib.sha256(f'{seed}\0{prompt}'.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+
+def split_dataset(dataset_path, workdir, samples, test_fraction, seed, canonical_only=False):
+    """
+    Seeded train/test split; writes train.jsonl (indexed) and test.jsonl (queries).
+
+    A row is a test query when its prompt hashes below ``test_fraction``, so a
+    dataset and its deduplicated version are queried with the same prompts.
+    ``canonical_only`` leaves the duplicate-prompt rows of a deduplicated
+    dataset out of the index (queries still cover every prompt).
+    """
+    rows = [(record, is_duplicate, _test_rank(record['prompt'], seed))
+            for record, is_duplicate in flatten_records(dataset_path)]
+    test = sorted((row for row in rows if row[2] < test_fraction), key=lambda row: row[2])[:samples]
+    train = [row for row in rows if row[2] >= test_fraction and not (canonical_only and row[1])]
+
+    os.makedirs(workdir, exist_ok=True)
+    paths = {}
+    for name, split in (('train', train), ('test', test)):
+        paths[name] = os.path.join(workdir, f'{name}.jsonl')
+        with open(paths[name], 'w', encoding='utf-8') as f:
+            for record, _, _ in split:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    with open(dataset_path, 'rb') as f:
+        dataset_sha = hashlib.sha256(f.read()).hexdigest()
+    return paths, {'num_train': len(train), 'num_test': len(test), 'dataset_sha256': dataset_sha,
+                   'canonical_only': canonical_only}
+
+
+# ============================================
+# WORKERS (one spawned process per configuration)
+# ============================================
+
+def _build_artifact(train_path, model_dir, artifact_dir, checkpoint_dir):
+    from build_retriever import build_retriever
+
+    manifest = build_retriever(train_path, model_dir, artifact_dir, workers=1, checkpoint_dir=checkpoint_dir)
+    return manifest['build']
+
+
+def _run_queries(search, test_records, warmup, reset=None):
+    for record in test_records[:warmup]:
+        search(record['prompt'])
+    if reset:
+        reset()
+
+    predictions, latencies = [], []
+    wall_start = time.perf_counter()
+    for record in test_records:
+        start = time.perf_counter()
+        results = search(record['prompt'])
+        latencies.append((time.perf_counter() - start) * 1000)
+        predictions.append([result['code'] for result in results])
+    wall = time.perf_counter() - wall_start
+    return predictions, latencies, wall
+
+
+def _run_config(model_name, variant, artifact_dir, model_dir, train_path, test_path, warmup):
+    test_records = list(iter_jsonl_dataset(test_path))
+
+    load_start = time.perf_counter()
+    reset = None
+    if variant == SPARSE_BASELINE:
+        from training_model.bm25_index import BM25Index, document_text
+
+        train_records = list(iter_jsonl_dataset(train_path))
+        index = BM25Index.build(document_text(record) for record in train_records)
+
+        def search(query):
+            scores = index.score(query)
+            ranked = np.argsort(-scores, kind='stable')[:max(RECALL_K)]
+            return [{'code': train_records[i]['flutter_code']} for i in ranked if scores[i] > 0]
+    else:
+        from training_model.embedding_cache import QueryEmbeddingCache
+        from training_model.training_model_service import TrainingModelService
+
+        service = TrainingModelService(
+            pkl_path=artifact_dir, model_dir=model_dir,
+            embedding_cache=QueryEmbeddingCache(), **VARIANTS[variant],
+        )
+        if not service.load():
+            raise RuntimeError(f"Failed to load {artifact_dir}")
+
+        def search(query):
+            return service.search(query, top_k=max(RECALL_K))
+        # Warmup queries must not turn into embedding-cache hits when timed
+        reset = service.embedding_cache.clear
+    load_seconds = time.perf_counter() - load_start
+
+    predictions, latencies, wall = _run_queries(search, test_records, warmup, reset)
+    result = {'model': model_name, 'variant': variant, 'load_seconds': round(load_seconds, 3)}
+    result.update(calculate_metrics(predictions, [r['flutter_code'] for r in test_records]))
+    result.update(latency_summary(latencies, wall))
+    try:
+        import resource  # Unix only
+    except ImportError:
+        result['peak_rss_mb'] = None
+    else:
+        result['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+
+def _in_subprocess(fn, *args):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(fn, *args).result()
+
+
+# ============================================
+# RUN / COMPARE
+# ============================================
+
+def run_benchmark(dataset_path, models, variants, samples=500, test_fraction=0.1, seed=42,
+                  warmup=5, workdir='benchmark_runs', canonical_only=False):
+    """Benchmark every (model, variant) pair; returns the JSON-serializable report"""
+    paths, split_info = split_dataset(dataset_path, workdir, samples, test_fraction, seed, canonical_only)
+
+    print("=" * 70)
+    print("📏 RETRIEVAL BENCHMARK")
+    print("=" * 70)
+    print(f"   Dataset: {dataset_path} ({split_info['num_train']} indexed, {split_info['num_test']} queries)")
+    print(f"   Models: {', '.join(models) or '-'} | Variants: {', '.join(variants)}\n")
+
+    results, builds = {}, {}
+    configs = [(None, SPARSE_BASELINE)] if SPARSE_BASELINE in variants else []
+    configs += [(m, v) for m in models for v in variants if v != SPARSE_BASELINE]
+
+    for model_name, variant in configs:
+        key = variant if model_name is None else f'{model_name}/{variant}'
+        model_dir = MODELS.get(model_name)
+        artifact_dir = os.path.join(workdir, f'{model_name}_artifact') if model_name else None
+        try:
+            if model_name and model_name not in builds:
+                builds[model_name] = _in_subprocess(
+                    _build_artifact, paths['train'], model_dir, artifact_dir,
+                    os.path.join(workdir, f'{model_name}_checkpoint'),
+                )
+            results[key] = _in_subprocess(
+                _run_config, model_name, variant, artifact_dir, model_dir, paths['train'], paths['test'], warmup
+            )
+            r = results[key]
+            print(f"   ✅ {key:<32} F1 {r['f1_score'] * 100:6.2f}%  EM {r['exact_match_rate'] * 100:6.2f}%  "
+                  f"R@5 {r['recall_at_5'] * 100:6.2f}%  "
+                  f"p50 {r['p50_ms']:7.2f}ms  p99 {r['p99_ms']:7.2f}ms  {r['throughput_qps']:8.1f} q/s  "
+                  f"RSS {_format_mb(r['peak_rss_mb'], '.0f')}")
+        except Exception as e:
+            results[key] = {'model': model_name, 'variant': variant, 'error': f'{type(e).__name__}: {e}'}
+            print(f"   ❌ {key:<32} {type(e).__name__}: {e}")
+
+    return {
+        'metadata': {
+            'date': datetime.now().isoformat(),
+            'dataset': os.path.abspath(dataset_path),
+            'seed': seed,
+            'test_fraction': test_fraction,
+            'warmup': warmup,
+            'rouge': rouge_implementation(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            **split_info,
+        },
+        'builds': builds,
+        'results': results,
+    }
+
+
+def _format_mb(value, spec):
+    """Peak RSS for the report lines; None where the platform has no ``resource`` module"""
+    return '-' if value is None else f"{value:{spec}} MB"
+
+
+def _rss_delta(before, now):
+    if before.get('peak_rss_mb') is None or now.get('peak_rss_mb') is None:
+        return _format_mb(None, '')
+    return _format_mb(now['peak_rss_mb'] - before['peak_rss_mb'], '+6.1f')
+
+
+def compare_reports(baseline, current, max_quality_drop=0.01, max_latency_increase=0.25):
+    """Print per-config deltas; returns the list of regressions"""
+    regressions = []
+    print(f"\n{'=' * 70}")
+    print("🔍 COMPARISON WITH BASELINE")
+    print(f"{'=' * 70}")
+    for key, now in current['results'].items():
+        before = baseline.get('results', {}).get(key)
+        if not before or 'error' in before or 'error' in now:
+            continue
+        for metric in QUALITY_METRICS:
+            if metric not in before:
+                continue
+            delta = now[metric] - before[metric]
+            if delta < -max_quality_drop:
+                regressions.append(f"{key} {metric}: {before[metric]:.4f} -> {now[metric]:.4f}")
+        for metric in LATENCY_METRICS:
+            if before[metric] and now[metric] > before[metric] * (1 + max_latency_increase):
+                regressions.append(f"{key} {metric}: {before[metric]:.2f}ms -> {now[metric]:.2f}ms")
+        print(f"   {key:<32} F1 {(now['f1_score'] - before['f1_score']) * 100:+6.2f}pp  "
+              f"p50 {now['p50_ms'] - before['p50_ms']:+7.2f}ms  p99 {now['p99_ms'] - before['p99_ms']:+7.2f}ms  "
+              f"RSS {_rss_delta(before, now)}")
+
+    if regressions:
+        print("\n⚠️  Regressions:")
+        for line in regressions:
+            print(f"   • {line}")
+    else:
+        print("\n✅ No regressions")
+    return regressions
+
+
+# ============================================
+# MAIN EXECUTION
+# ============================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark retrieval quality and latency")
+    parser.add_argument('--dataset', default='flutter_dataset.jsonl')
+    parser.add_argument('--models', nargs='*', default=list(MODELS), choices=list(MODELS))
+    parser.add_argument('--variants', nargs='*', default=[SPARSE_BASELINE] + list(VARIANTS),
+                        choices=[SPARSE_BASELINE] + list(VARIANTS))
+    parser.add_argument('--samples', type=int, default=500, help="Max test queries")
+    parser.add_argument('--test-fraction', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--workdir', default='benchmark_runs')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', default=None, help="Baseline JSON; exit 1 on regression")
+    parser.add_argument('--max-quality-drop', type=float, default=0.01)
+    parser.add_argument('--max-latency-increase', type=float, default=0.25)
+    parser.add_argument('--canonical-only', action='store_true',
+                        help="Deduplicated datasets: index each record's own prompt only, not its duplicate_prompts")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.dataset, args.models, args.variants, samples=args.samples,
+                           test_fraction=args.test_fraction, seed=args.seed,
+                           warmup=args.warmup, workdir=args.workdir, canonical_only=args.canonical_only)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results saved to: {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare_reports(baseline, report, args.max_quality_drop, args.max_latency_increase):
+            sys.exit(1)
@@ -0,0 +1,339 @@
+# ============================================
+# OFFLINE BATCH EMBEDDING JOB
+# JSONL dataset -> memory-mappable retriever artifact
+# ============================================
+#
+# Usage (from Training_Model/):
+#   python build_retriever.py --dataset flutter_dataset.jsonl
+#
+# Writes ../backend/training_model/flutter_ui_retrieval_model/ which
+# TrainingModelService loads directly. Embeddings are computed in shards that
+# are checkpointed to disk, so an interrupted run resumes where it stopped;
+# a checkpoint is only reused for the same prompts, model and embedding dim.
+
+import os
+import sys
+import json
+import time
+import pickle
+import shutil
+import hashlib
+import argparse
+import platform
+from datetime import datetime
+
+import numpy as np
+
+from dataset_builder import iter_jsonl_dataset
+
+# Backend modules (artifact layout, indexes)
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.insert(0, BACKEND_DIR)
+
+from training_model.bm25_index import BM25Index, document_text, save_bm25_arrays
+from training_model.metadata_index import MetadataIndex
+from training_model.training_model_service import (
+    ARTIFACT_MANIFEST, ARTIFACT_EMBEDDINGS, ARTIFACT_RECORDS, ARTIFACT_METADATA_INDEX,
+)
+
+DEFAULT_MODEL_DIR = 'trained_models/MiniLM-L6_flutter_retriever_transformer'
+DEFAULT_OUTPUT = os.path.join(BACKEND_DIR, 'training_model', 'flutter_ui_retrieval_model')
+
+
+def normalize_record(item):
+    """Same key mapping as the training notebooks"""
+    return {
+        'prompt': item.get('prompt') or item.get('input_text', ''),
+        'flutter_code': item.get('flutter_code') or item.get('target_text', ''),
+        'category': item.get('category', 'general'),
+        'tags': item.get('tags', []),
+        'components': item.get('components', []),
+        'layout_type': item.get('layout_type', 'unknown'),
+    }
+
+
+def iter_rows(dataset_path, duplicate_prompts=True):
+    """
+    Valid, normalized records, one row per prompt.
+
+    Records merged by dedup_dataset.py keep their other prompts in
+    ``duplicate_prompts``; each becomes a row of its own (the prompts are the
+    retrieval keys) whose ``code_row`` points at the record's row instead of
+    repeating the code.
+    """
+    row = 0
+    for item in iter_jsonl_dataset(dataset_path):
+        record = normalize_record(item)
+        if not (record['prompt'] and record['flutter_code']):
+            continue
+        code_row = row
+        yield record
+        row += 1
+        if not duplicate_prompts:
+            continue
+        for prompt in item.get('duplicate_prompts') or []:
+            if prompt:
+                yield {**record, 'prompt': prompt, 'flutter_code': None, 'code_row': code_row}
+                row += 1
+
+
+def iter_shards(dataset_path, shard_size, duplicate_prompts=True):
+    """Stream the dataset rows in shards"""
+    shard = []
+    for record in iter_rows(dataset_path, duplicate_prompts):
+        shard.append(record)
+        if len(shard) == shard_size:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+
+def prompts_digest(prompts):
+    digest = hashlib.sha256()
+    for prompt in prompts:
+        digest.update(prompt.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def model_identity(model_dir):
+    """Resolved model path and a hash of its config files; checkpoints embedded by another model are not reused"""
+    model_dir = os.path.realpath(model_dir)
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(model_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.json'):
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, model_dir).encode('utf-8') + b'\0')
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+    return {'model_dir': model_dir, 'model_config_sha256': digest.hexdigest()}
+
+
+def load_checkpoint(shard_path, meta_path, digest, identity, dim):
+    """Whether a checkpointed shard was embedded from these prompts by this model (and with ``dim``, if known)"""
+    if not (os.path.exists(shard_path) and os.path.exists(meta_path)):
+        return False
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('prompts_sha256') != digest or any(meta.get(key) != value for key, value in identity.items()):
+        return False
+    shape = np.load(shard_path, mmap_mode='r').shape
+    return shape == (meta.get('count'), meta.get('embedding_dim')) and dim in (None, shape[1])
+
+
+class ShardEncoder:
+    """Encodes prompts in length-sorted batches, optionally across CPU processes"""
+
+    def __init__(self, model_dir, batch_size, workers):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_dir, device='cpu', local_files_only=True)
+        self.batch_size = batch_size
+        self.workers = workers
+        self.pool = None
+        if workers > 1:
+            # One process per core, one intra-op thread each
+            torch.set_num_threads(1)
+            self.pool = self.model.start_multi_process_pool(['cpu'] * workers)
+
+    def encode(self, prompts):
+        # Sort by length so every batch pads to a similar sequence length
+        order = np.argsort([-len(p) for p in prompts], kind='stable')
+        sorted_prompts = [prompts[i] for i in order]
+
+        if self.pool:
+            embeddings = self.model.encode_multi_process(
+                sorted_prompts, self.pool, batch_size=self.batch_size,
+                chunk_size=max(1, len(sorted_prompts) // (self.workers * 4)),
+            )
+            embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        else:
+            embeddings = self.model.encode(
+                sorted_prompts, batch_size=self.batch_size, convert_to_numpy=True,
+                normalize_embeddings=True, show_progress_bar=False,
+            )
+
+        result = np.empty_like(embeddings, dtype=np.float32)
+        result[order] = embeddings
+        return result
+
+    def close(self):
+        if self.pool:
+            self.model.stop_multi_process_pool(self.pool)
+
+
+def build_retriever(dataset_path, model_dir, output_dir, batch_size=128, shard_size=2048,
+                    workers=None, checkpoint_dir=None, fresh=False, duplicate_prompts=True):
+    """Embed the dataset and write the artifact; returns the timing report"""
+    workers = workers or os.cpu_count() or 1
+    checkpoint_dir = checkpoint_dir or output_dir + '.checkpoint'
+    if fresh and os.path.exists(checkpoint_dir):
+        shutil.rmtree(checkpoint_dir)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+
+    print("=" * 70)
+    print("🧠 BUILDING RETRIEVER ARTIFACT")
+    print("=" * 70)
+    print(f"   Dataset:    {dataset_path}")
+    print(f"   Model:      {model_dir}")
+    print(f"   Output:     {output_dir}")
+    print(f"   Checkpoint: {checkpoint_dir}")
+    print(f"   Batch size: {batch_size} | Shard size: {shard_size} | Workers: {workers}")
+    print(f"   Python {platform.python_version()} on {platform.machine()} ({os.cpu_count()} CPUs)\n")
+
+    timings = {'encode': 0.0, 'read': 0.0, 'write': 0.0, 'index': 0.0}
+    total_start = time.perf_counter()
+    encoder = None
+    shard_files = []
+    encoded_count = 0
+    resumed_count = 0
+    identity = model_identity(model_dir)
+    dim = None
+
+    staging_dir = output_dir + '.staging'
+    if os.path.exists(staging_dir):
+        shutil.rmtree(staging_dir)
+    os.makedirs(staging_dir)
+
+    try:
+        read_start = time.perf_counter()
+        with open(os.path.join(staging_dir, ARTIFACT_RECORDS), 'w', encoding='utf-8') as records_out:
+            for shard_id, shard in enumerate(iter_shards(dataset_path, shard_size, duplicate_prompts)):
+                prompts = [record['prompt'] for record in shard]
+                for record in shard:
+                    if 'code_row' in record:
+                        record = {key: value for key, value in record.items() if key != 'flutter_code'}
+                    records_out.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+                shard_path = os.path.join(checkpoint_dir, f'shard_{shard_id:05d}.npy')
+                meta_path = os.path.join(checkpoint_dir, f'shard_{shard_id:05d}.json')
+                digest = prompts_digest(prompts)
+                shard_files.append(shard_path)
+
+                if load_checkpoint(shard_path, meta_path, digest, identity, dim):
+                    dim = dim or np.load(shard_path, mmap_mode='r').shape[1]
+                    resumed_count += len(prompts)
+                    print(f"   ♻️  Shard {shard_id}: resumed from checkpoint ({len(prompts)} prompts)")
+                    continue
+
+                timings['read'] += time.perf_counter() - read_start
+                if encoder is None:
+                    encoder = ShardEncoder(model_dir, batch_size, workers)
+
+                encode_start = time.perf_counter()
+                embeddings = encoder.encode(prompts)
+                elapsed = time.perf_counter() - encode_start
+                timings['encode'] += elapsed
+                encoded_count += len(prompts)
+
+                dim = dim or embeddings.shape[1]
+                np.save(shard_path, embeddings)
+                with open(meta_path, 'w', encoding='utf-8') as f:
+                    json.dump({'count': len(prompts), 'prompts_sha256': digest,
+                               'embedding_dim': int(embeddings.shape[1]), **identity}, f)
+                print(f"   🔄 Shard {shard_id}: {len(prompts)} prompts in {elapsed:.2f}s "
+                      f"({len(prompts) / elapsed:.1f} prompts/s)")
+                read_start = time.perf_counter()
+        timings['read'] += time.perf_counter() - read_start
+    finally:
+        if encoder:
+            encoder.close()
+
+    if not shard_files:
+        raise ValueError(f"❌ No valid records in {dataset_path}")
+
+    # Concatenate shards into one memory-mappable matrix, hashing as we go
+    write_start = time.perf_counter()
+    shapes = [np.load(path, mmap_mode='r').shape for path in shard_files]
+    total_rows, dim = sum(shape[0] for shape in shapes), shapes[0][1]
+    matrix = np.lib.format.open_memmap(
+        os.path.join(staging_dir, ARTIFACT_EMBEDDINGS), mode='w+', dtype=np.float32, shape=(total_rows, dim)
+    )
+    digest = hashlib.sha256()
+    row = 0
+    for path in shard_files:
+        shard = np.ascontiguousarray(np.load(path), dtype=np.float32)
+        matrix[row:row + shard.shape[0]] = shard
+        digest.update(shard.tobytes())
+        row += shard.shape[0]
+    matrix.flush()
+    del matrix
+    timings['write'] = time.perf_counter() - write_start
+
+    # Sparse and metadata indexes, built at packaging time
+    index_start = time.perf_counter()
+    records = list(iter_jsonl_dataset(os.path.join(staging_dir, ARTIFACT_RECORDS)))
+    save_bm25_arrays(BM25Index.build(document_text(record) for record in records), staging_dir)
+    with open(os.path.join(staging_dir, ARTIFACT_METADATA_INDEX), 'wb') as f:
+        pickle.dump(MetadataIndex.build(records).to_dict(), f, protocol=pickle.HIGHEST_PROTOCOL)
+    timings['index'] = time.perf_counter() - index_start
+
+    total = time.perf_counter() - total_start
+    manifest = {
+        'format': 'retriever-artifact-v1',
+        'model_name': os.path.basename(os.path.normpath(model_dir)),
+        'model_dir': identity['model_dir'],
+        'model_config_sha256': identity['model_config_sha256'],
+        'embeddings_sha256': digest.hexdigest(),
+        'num_samples': total_rows,
+        'embedding_dim': int(dim),
+        'normalized': True,
+        'dataset': os.path.abspath(dataset_path),
+        'created_at': datetime.now().isoformat(),
+        'build': {
+            'batch_size': batch_size,
+            'shard_size': shard_size,
+            'workers': workers,
+            'encoded': encoded_count,
+            'resumed': resumed_count,
+            'timings_seconds': {k: round(v, 3) for k, v in timings.items()},
+            'total_seconds': round(total, 3),
+        },
+    }
+    with open(os.path.join(staging_dir, ARTIFACT_MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    os.replace(staging_dir, output_dir)
+
+    throughput = encoded_count / timings['encode'] if timings['encode'] else 0.0
+    print(f"\n{'=' * 70}")
+    print("✅ ARTIFACT READY")
+    print(f"{'=' * 70}")
+    print(f"   Samples:     {total_rows} ({encoded_count} encoded, {resumed_count} resumed)")
+    print(f"   Matrix:      {total_rows} x {dim} float32 ({total_rows * dim * 4 / 1024 / 1024:.1f} MB)")
+    print(f"   Read:        {timings['read']:.2f}s")
+    print(f"   Encode:      {timings['encode']:.2f}s ({throughput:.1f} prompts/s)")
+    print(f"   Write:       {timings['write']:.2f}s")
+    print(f"   Index:       {timings['index']:.2f}s")
+    print(f"   Total:       {total:.2f}s")
+    return manifest
+
+
+# ============================================
+# MAIN EXECUTION
+# ============================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the memory-mappable retriever artifact")
+    parser.add_argument('--dataset', default='flutter_dataset.jsonl')
+    parser.add_argument('--model-dir', default=DEFAULT_MODEL_DIR)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--batch-size', type=int, default=128)
+    parser.add_argument('--shard-size', type=int, default=2048)
+    parser.add_argument('--workers', type=int, default=None, help="Encoder processes (default: CPU count)")
+    parser.add_argument('--checkpoint-dir', default=None)
+    parser.add_argument('--fresh', action='store_true', help="Discard checkpoints and re-encode everything")
+    parser.add_argument('--canonical-only', action='store_true',
+                        help="Index only each deduplicated record's own prompt, not its duplicate_prompts")
+    args = parser.parse_args()
+
+    build_retriever(args.dataset, args.model_dir, args.output, batch_size=args.batch_size,
+                    shard_size=args.shard_size, workers=args.workers,
+                    checkpoint_dir=args.checkpoint_dir, fresh=args.fresh,
+                    duplicate_prompts=not args.canonical_only)
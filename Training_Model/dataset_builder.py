@@ -0,0 +1,373 @@
+# ============================================
+# PARALLEL, STREAMING, INCREMENTAL DATASET BUILDER
+# JSON directory -> JSONL (+ optional Parquet)
+# ============================================
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+REQUIRED_FIELDS = ('prompt', 'flutter_code')
+PARQUET_COLUMNS = ('prompt', 'flutter_code', 'category', 'tags', 'components', 'layout_type')
+MAX_ERRORS_IN_SUMMARY = 20
+
+
+def _file_sort_key(filename):
+    """Sort numerically (0.json, 1.json, ...) with non-numeric names last"""
+    stem = filename[:-len('.json')]
+    return (0, int(stem), '') if stem.isdigit() else (1, 0, stem)
+
+
+def _parse_chunk(tasks):
+    """
+    Worker: hash and parse a chunk of JSON files.
+
+    Each task is (filepath, expected_sha256). If the content hash matches the
+    expected one the file is reported as unchanged and not parsed again.
+    """
+    results = []
+    for filepath, expected_sha in tasks:
+        filename = os.path.basename(filepath)
+        try:
+            with open(filepath, 'rb') as f:
+                raw = f.read()
+            sha = hashlib.sha256(raw).hexdigest()
+            if sha == expected_sha:
+                results.append((filename, 'unchanged', None, sha))
+                continue
+
+            data = json.loads(raw.decode('utf-8'))
+            missing = [field for field in REQUIRED_FIELDS if not data.get(field)]
+            if missing:
+                results.append((filename, 'error', {
+                    'filename': filename,
+                    'error_type': 'Missing fields',
+                    'details': f"Missing: {', '.join(missing)}",
+                }, sha))
+                continue
+
+            line = json.dumps(data, ensure_ascii=False) + '\n'
+            results.append((filename, 'ok', line.encode('utf-8'), sha))
+
+        except json.JSONDecodeError as e:
+            results.append((filename, 'error', {
+                'filename': filename, 'error_type': 'JSON Parse Error', 'details': str(e)
+            }, None))
+        except Exception as e:
+            results.append((filename, 'error', {
+                'filename': filename, 'error_type': type(e).__name__, 'details': str(e)
+            }, None))
+    return results
+
+
+def _state_path(output_file):
+    return output_file + '.state.json'
+
+
+def _load_state(output_file):
+    """Load the previous build state if it still describes the output file"""
+    state_file = _state_path(output_file)
+    if not (os.path.exists(state_file) and os.path.exists(output_file)):
+        return {}
+    with open(state_file, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    if state.get('output_size') != os.path.getsize(output_file):
+        print("   ⚠️  Output changed since last build, doing a full rebuild")
+        return {}
+    return state.get('files', {})
+
+
+class _ParquetSink:
+    """Writes records to Parquet in fixed-size row groups (bounded memory)"""
+
+    def __init__(self, path, row_group_size=1000):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.schema = pa.schema([
+            ('prompt', pa.string()),
+            ('flutter_code', pa.string()),
+            ('category', pa.string()),
+            ('tags', pa.list_(pa.string())),
+            ('components', pa.list_(pa.string())),
+            ('layout_type', pa.string()),
+        ])
+        self.writer = pq.ParquetWriter(path + '.tmp', self.schema, compression='zstd')
+        self.path = path
+        self.row_group_size = row_group_size
+        self.buffer = {column: [] for column in PARQUET_COLUMNS}
+
+    def add(self, line):
+        data = json.loads(line)
+        for column in PARQUET_COLUMNS:
+            value = data.get(column)
+            if column in ('tags', 'components'):
+                value = [str(v) for v in value or []]
+            elif value is not None:
+                value = str(value)
+            self.buffer[column].append(value)
+        if len(self.buffer['prompt']) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer['prompt']:
+            self.writer.write_table(self.pa.Table.from_pydict(self.buffer, schema=self.schema))
+            self.buffer = {column: [] for column in PARQUET_COLUMNS}
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        os.replace(self.path + '.tmp', self.path)
+
+
+def build_dataset(input_dir, output_file, parquet_file=None, workers=None,
+                  chunk_size=64, incremental=True, verbose=True):
+    """
+    Convert a directory of JSON samples to JSONL (and optionally Parquet).
+
+    Files are hashed and parsed in a process pool; results are written in file
+    order through a bounded window of in-flight chunks, so memory stays flat
+    regardless of dataset size. With ``incremental`` only files whose mtime or
+    size changed are re-read, and only files whose content hash changed are
+    re-parsed; unchanged records are copied from the previous output.
+    Errors are streamed to ``<output>_errors.jsonl``.
+    """
+    if not os.path.exists(input_dir):
+        raise FileNotFoundError(f"❌ Directory not found: {input_dir}")
+
+    start_time = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    json_files = sorted((f for f in os.listdir(input_dir) if f.endswith('.json')), key=_file_sort_key)
+    previous = _load_state(output_file) if incremental else {}
+
+    if verbose:
+        print("=" * 70)
+        print("📦 BUILDING DATASET")
+        print("=" * 70)
+        print(f"\n📁 Found {len(json_files)} JSON files in '{input_dir}'")
+        print(f"📝 Output file: '{output_file}'")
+        print(f"⚙️  Workers: {workers} | Incremental: {'yes' if previous else 'no'}\n")
+
+    counts = {'valid': 0, 'errors': 0, 'reused': 0, 'parsed': 0}
+    errors_sample = []
+    new_state = {}
+
+    tmp_output = output_file + '.tmp'
+    error_file = os.path.splitext(output_file)[0] + '_errors.jsonl'
+    old_output = open(output_file, 'rb') if previous else None
+    parquet = _ParquetSink(parquet_file) if parquet_file else None
+
+    def reuse(filename, entry, outfile):
+        if entry.get('length'):
+            old_output.seek(entry['offset'])
+            line = old_output.read(entry['length'])
+            return write_line(filename, entry, line, outfile)
+        counts['errors'] += 1
+        new_state[filename] = dict(entry)
+        if entry.get('error'):
+            errfile.write(json.dumps(entry['error'], ensure_ascii=False) + '\n')
+        return None
+
+    def write_line(filename, entry, line, outfile):
+        offset = outfile.tell()
+        outfile.write(line)
+        new_state[filename] = dict(entry, offset=offset, length=len(line))
+        counts['valid'] += 1
+        if parquet:
+            parquet.add(line)
+
+    try:
+        with open(tmp_output, 'wb') as outfile, open(error_file, 'w', encoding='utf-8') as errfile, \
+                ProcessPoolExecutor(max_workers=workers) as pool:
+
+            # Window of pending slots in file order: ('reuse', ...) or ('chunk', future, metas)
+            window = deque()
+            max_in_flight = workers * 2
+            in_flight = 0
+            pending_tasks, pending_meta = [], []
+
+            def submit_pending():
+                nonlocal in_flight
+                if pending_tasks:
+                    window.append(('chunk', pool.submit(_parse_chunk, list(pending_tasks)), list(pending_meta)))
+                    in_flight += 1
+                    pending_tasks.clear()
+                    pending_meta.clear()
+
+            def drain(limit):
+                nonlocal in_flight
+                while window and (in_flight > limit or window[0][0] == 'reuse' or window[0][1].done()):
+                    slot = window.popleft()
+                    if slot[0] == 'reuse':
+                        reuse(slot[1], slot[2], outfile)
+                        counts['reused'] += 1
+                        continue
+                    in_flight -= 1
+                    for (filename, status, payload, sha), meta in zip(slot[1].result(), slot[2]):
+                        entry = {'mtime_ns': meta[0], 'size': meta[1], 'sha256': sha}
+                        if status == 'unchanged':
+                            reuse(filename, dict(previous[filename], **entry), outfile)
+                            counts['reused'] += 1
+                        elif status == 'ok':
+                            write_line(filename, entry, payload, outfile)
+                            counts['parsed'] += 1
+                        else:
+                            counts['errors'] += 1
+                            counts['parsed'] += 1
+                            new_state[filename] = dict(entry, offset=0, length=0, error=payload)
+                            errfile.write(json.dumps(payload, ensure_ascii=False) + '\n')
+                            if len(errors_sample) < MAX_ERRORS_IN_SUMMARY:
+                                errors_sample.append(payload)
+
+            for filename in json_files:
+                filepath = os.path.join(input_dir, filename)
+                stat = os.stat(filepath)
+                old = previous.get(filename)
+
+                if old and old['mtime_ns'] == stat.st_mtime_ns and old['size'] == stat.st_size:
+                    submit_pending()
+                    window.append(('reuse', filename, old))
+                else:
+                    expected_sha = old.get('sha256') if old and old['size'] == stat.st_size else None
+                    pending_tasks.append((filepath, expected_sha))
+                    pending_meta.append((stat.st_mtime_ns, stat.st_size))
+                    if len(pending_tasks) >= chunk_size:
+                        submit_pending()
+
+                drain(max_in_flight)
+
+            submit_pending()
+            drain(-1)
+
+        os.replace(tmp_output, output_file)
+        if parquet:
+            parquet.close()
+    finally:
+        if old_output:
+            old_output.close()
+        if os.path.exists(tmp_output):
+            os.remove(tmp_output)
+
+    with open(_state_path(output_file), 'w', encoding='utf-8') as f:
+        json.dump({'output_size': os.path.getsize(output_file), 'files': new_state}, f)
+
+    if counts['errors'] == 0 and os.path.exists(error_file):
+        os.remove(error_file)
+
+    elapsed = time.perf_counter() - start_time
+    summary = dict(counts, seconds=elapsed, files=len(json_files),
+                   output_mb=os.path.getsize(output_file) / (1024 * 1024),
+                   errors_sample=errors_sample)
+
+    if verbose:
+        print(f"{'=' * 70}")
+        print("✅ BUILD COMPLETE!")
+        print(f"{'=' * 70}")
+        print(f"\n📊 Summary:")
+        print(f"   ✅ Valid entries: {counts['valid']}")
+        print(f"   ❌ Errors/Skipped: {counts['errors']}")
+        print(f"   ♻️  Reused: {counts['reused']} | 🔄 Parsed: {counts['parsed']}")
+        print(f"   💾 File size: {summary['output_mb']:.2f} MB")
+        print(f"   ⏱️  Time: {elapsed:.2f}s")
+        if parquet_file:
+            print(f"   🧱 Parquet: {parquet_file}")
+        if counts['errors']:
+            print(f"\n⚠️  Error log: {error_file}")
+            for i, err in enumerate(errors_sample, 1):
+                print(f"   {i}. {err['filename']}: {err['error_type']} - {err['details']}")
+
+    return summary
+
+
+def iter_jsonl_dataset(filepath):
+    """Stream records from a JSONL dataset one at a time"""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_parquet_batches(filepath, columns=None, batch_size=1024):
+    """Stream record batches (lists of dicts) from the Parquet dataset"""
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(filepath).iter_batches(batch_size=batch_size, columns=columns):
+        yield batch.to_pylist()
+
+
+def run_benchmark(input_dir, workdir):
+    """Time full, no-op incremental and one-file-changed builds of a copy of the dataset"""
+    os.makedirs(workdir, exist_ok=True)
+    # The one-file-changed run touches an input file, so never run on the real dataset
+    source_dir = input_dir
+    input_dir = os.path.join(workdir, 'input')
+    shutil.rmtree(input_dir, ignore_errors=True)
+    shutil.copytree(source_dir, input_dir)
+    output = os.path.join(workdir, 'flutter_dataset.jsonl')
+    parquet = os.path.join(workdir, 'flutter_dataset.parquet')
+    input_mb = sum(os.path.getsize(os.path.join(input_dir, f))
+                   for f in os.listdir(input_dir) if f.endswith('.json')) / (1024 * 1024)
+
+    results = {}
+    results['full'] = build_dataset(input_dir, output, parquet_file=parquet, incremental=False, verbose=False)
+    results['noop_incremental'] = build_dataset(input_dir, output, parquet_file=parquet, verbose=False)
+
+    touched = os.path.join(input_dir, sorted(os.listdir(input_dir), key=_file_sort_key)[0])
+    os.utime(touched)
+    results['one_file_touched'] = build_dataset(input_dir, output, parquet_file=parquet, verbose=False)
+
+    print("=" * 70)
+    print("⏱️  DATASET BUILD BENCHMARK")
+    print("=" * 70)
+    print(f"   Input: {source_dir} ({input_mb:.1f} MB, copied to {input_dir})")
+    for name, summary in results.items():
+        print(f"   {name:<18} {summary['seconds']:7.2f}s  {input_mb / summary['seconds']:8.1f} MB/s  "
+              f"parsed={summary['parsed']:<6} reused={summary['reused']}")
+    try:
+        import resource  # Unix only
+    except ImportError:
+        print("   Peak RSS (main process): unavailable on this platform")
+    else:
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"   Peak RSS (main process): {peak_mb:.1f} MB")
+    return results
+
+
+# ============================================
+# MAIN EXECUTION
+# ============================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the Flutter dataset JSONL/Parquet files")
+    parser.add_argument('--input-dir', default='flutter_dataset')
+    parser.add_argument('--output', default='flutter_dataset.jsonl')
+    parser.add_argument('--parquet', default=None, help="Also write a Parquet file (requires pyarrow)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--full', action='store_true', help="Ignore previous build state")
+    parser.add_argument('--benchmark', action='store_true', help="Time full and incremental builds")
+    parser.add_argument('--benchmark-dir', default='build_benchmark')
+    parser.add_argument('--dedup', action='store_true',
+                        help="Also write <output>_dedup.jsonl with duplicate code bodies collapsed")
+    parser.add_argument('--dedup-threshold', type=float, default=0.85)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        run_benchmark(args.input_dir, args.benchmark_dir)
+        sys.exit(0)
+
+    build_dataset(args.input_dir, args.output, parquet_file=args.parquet,
+                  workers=args.workers, incremental=not args.full)
+
+    if args.dedup:
+        from dedup_dataset import dedup_dataset
+
+        print()
+        dedup_dataset(args.output, os.path.splitext(args.output)[0] + '_dedup.jsonl',
+                      threshold=args.dedup_threshold, workers=args.workers)
@@ -0,0 +1,316 @@
+# ============================================
+# DATASET DEDUPLICATION
+# Exact + MinHash/LSH near-duplicate clustering of flutter_code
+# ============================================
+#
+# Usage (from Training_Model/):
+#   python dedup_dataset.py --input flutter_dataset.jsonl --output flutter_dataset_dedup.jsonl
+#
+# Each cluster of identical or near-identical code bodies is collapsed to one
+# canonical record; the prompts of the dropped members are kept on it as
+# ``duplicate_prompts``. A JSON report with before/after index sizes is written
+# next to the output.
+
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from dataset_builder import iter_jsonl_dataset
+
+# String literals and comments are matched first so '//' inside a URL is not a comment
+_DART_TOKEN_RE = re.compile(
+    r"'''.*?'''" r'|""".*?"""' r"|'(?:\\.|[^'\\\n])*'" r'|"(?:\\.|[^"\\\n])*"'
+    r"|//[^\n]*|/\*.*?\*/"
+    r"|[A-Za-z_$][A-Za-z0-9_$]*|\d+(?:\.\d+)?|\S",
+    re.DOTALL,
+)
+
+NUM_PERM = 128
+SHINGLE_SIZE = 5
+MAX_HASH = np.uint64(0xFFFFFFFF)
+EMBEDDING_DIMS = {'MiniLM-L6': 384, 'MiniLM-L12': 384, 'MPNet-Base': 768}
+
+
+def dart_tokens(code):
+    """Tokenize Dart source, dropping comments and whitespace"""
+    return [t for t in _DART_TOKEN_RE.findall(code) if not t.startswith(('//', '/*'))]
+
+
+def normalized_code_hash(code):
+    """Hash of the code with comments and formatting removed"""
+    return hashlib.sha256(' '.join(dart_tokens(code)).encode('utf-8')).hexdigest()
+
+
+def _permutations(num_perm, seed):
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+    shingle_coeffs = rng.integers(1, 2 ** 63, size=SHINGLE_SIZE, dtype=np.uint64) | np.uint64(1)
+    return a, b, shingle_coeffs
+
+
+def _token_ids(tokens):
+    # Stable across processes (unlike hash()), so chunks agree on token ids
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(t.encode('utf-8'), digest_size=8).digest(), 'little') for t in tokens),
+        dtype=np.uint64, count=len(tokens),
+    )
+
+
+def _minhash_chunk(args):
+    """Worker: MinHash signatures for a chunk of code bodies"""
+    codes, num_perm, seed = args
+    a, b, shingle_coeffs = _permutations(num_perm, seed)
+    signatures = np.empty((len(codes), num_perm), dtype=np.uint32)
+    token_cache = {}
+
+    with np.errstate(over='ignore'):
+        for row, code in enumerate(codes):
+            tokens = dart_tokens(code)
+            missing = [t for t in set(tokens) if t not in token_cache]
+            token_cache.update(zip(missing, _token_ids(missing)))
+            ids = np.fromiter((token_cache[t] for t in tokens), dtype=np.uint64, count=len(tokens))
+
+            # Rolling k-token shingles, combined with wrapping uint64 arithmetic
+            n = max(len(ids) - SHINGLE_SIZE + 1, 1)
+            shingles = np.zeros(n, dtype=np.uint64)
+            for k in range(min(SHINGLE_SIZE, len(ids))):
+                shingles += ids[k:k + n] * shingle_coeffs[k]
+            shingles = np.unique(shingles)
+
+            # Multiply-shift hashing: one "permutation" per (a, b) pair
+            hashed = (shingles[:, None] * a[None, :] + b[None, :]) >> np.uint64(32)
+            signatures[row] = hashed.min(axis=0) & MAX_HASH
+
+    return signatures
+
+
+def minhash_signatures(codes, num_perm=NUM_PERM, seed=42, workers=None, chunk_size=256):
+    """Compute MinHash signatures for all code bodies, in a process pool"""
+    workers = workers or os.cpu_count() or 1
+    chunks = [(codes[i:i + chunk_size], num_perm, seed) for i in range(0, len(codes), chunk_size)]
+    if not chunks:
+        return np.empty((0, num_perm), dtype=np.uint32)
+    if workers == 1:
+        return np.vstack([_minhash_chunk(chunk) for chunk in chunks])
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return np.vstack(list(pool.map(_minhash_chunk, chunks)))
+
+
+class UnionFind:
+    """Disjoint sets over record positions (path halving, union by size)"""
+
+    def __init__(self, size):
+        self.parent = list(range(size))
+        self.size = [1] * size
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, x, y):
+        x, y = self.find(x), self.find(y)
+        if x == y:
+            return False
+        if self.size[x] < self.size[y]:
+            x, y = y, x
+        self.parent[y] = x
+        self.size[x] += self.size[y]
+        return True
+
+
+def _lsh_pairs(signatures, group_keys, bands, threshold):
+    """Yield verified near-duplicate pairs from banded LSH buckets"""
+    rows = signatures.shape[1] // bands
+    for band in range(bands):
+        buckets = defaultdict(list)
+        band_sigs = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        for position, key in enumerate(group_keys):
+            buckets[(key, band_sigs[position].tobytes())].append(position)
+
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            member_sigs = signatures[members]
+            # Estimated Jaccard = fraction of agreeing signature slots
+            similarity = (member_sigs[:, None, :] == member_sigs[None, :, :]).mean(axis=2)
+            for i, j in zip(*np.nonzero(np.triu(similarity >= threshold, k=1))):
+                yield members[i], members[j]
+
+
+def _canonical(members, member_sigs):
+    """Cluster medoid by estimated Jaccard; ties go to the earliest record"""
+    if len(members) <= 2:
+        return min(members)
+    similarity = (member_sigs[:, None, :] == member_sigs[None, :, :]).mean(axis=2).sum(axis=1)
+    return members[int(np.argmax(similarity))]
+
+
+def dedup_dataset(input_file, output_file, threshold=0.85, bands=16, num_perm=NUM_PERM,
+                  per_category=True, workers=None, report_file=None, verbose=True):
+    """
+    Collapse exact and near-duplicate ``flutter_code`` bodies to one record each.
+
+    Exact duplicates share a hash of the comment- and whitespace-free token
+    stream. Near duplicates are found with MinHash over 5-token shingles and
+    banded LSH; candidate pairs are kept when their estimated Jaccard similarity
+    reaches ``threshold``. Pairs are merged with union-find, and each cluster is
+    written once, as its medoid. With ``per_category`` only records of the same
+    category can be merged. Returns the report dict.
+    """
+    if num_perm % bands:
+        raise ValueError(f"❌ num_perm ({num_perm}) must be divisible by bands ({bands})")
+
+    start_time = time.perf_counter()
+    records = list(iter_jsonl_dataset(input_file))
+    if verbose:
+        print("=" * 70)
+        print("🧹 DEDUPLICATING DATASET")
+        print("=" * 70)
+        print(f"\n📁 Input: '{input_file}' ({len(records)} records)")
+        print(f"⚙️  Threshold: {threshold} | Bands: {bands} x {num_perm // bands} rows | "
+              f"Per category: {'yes' if per_category else 'no'}\n")
+
+    timings = {}
+    uf = UnionFind(len(records))
+
+    # Stage 1: exact duplicates of the normalized code
+    stage_start = time.perf_counter()
+    first_by_hash = {}
+    exact_merges = 0
+    for position, record in enumerate(records):
+        key = (record.get('category') if per_category else None,
+               normalized_code_hash(record.get('flutter_code', '')))
+        if key in first_by_hash:
+            exact_merges += uf.union(first_by_hash[key], position)
+        else:
+            first_by_hash[key] = position
+    unique_positions = sorted(first_by_hash.values())
+    timings['exact'] = time.perf_counter() - stage_start
+
+    # Stage 2: MinHash/LSH over the exact-unique representatives
+    stage_start = time.perf_counter()
+    unique_sigs = minhash_signatures([records[p].get('flutter_code', '') for p in unique_positions],
+                                     num_perm=num_perm, workers=workers)
+    timings['minhash'] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    group_keys = [records[p].get('category') if per_category else None for p in unique_positions]
+    near_merges = 0
+    for i, j in _lsh_pairs(unique_sigs, group_keys, bands, threshold):
+        near_merges += uf.union(unique_positions[i], unique_positions[j])
+    timings['lsh'] = time.perf_counter() - stage_start
+
+    # Stage 3: one canonical record per cluster
+    stage_start = time.perf_counter()
+    sig_row = {position: row for row, position in enumerate(unique_positions)}
+    clusters = defaultdict(list)
+    for position in range(len(records)):
+        clusters[uf.find(position)].append(position)
+
+    kept = []
+    for members in clusters.values():
+        with_sig = [m for m in members if m in sig_row]
+        canonical = _canonical(with_sig, unique_sigs[[sig_row[m] for m in with_sig]]) \
+            if len(with_sig) > 2 else min(members)
+        record = dict(records[canonical])
+        if len(members) > 1:
+            seen = {record.get('prompt')}
+            record['duplicate_prompts'] = [
+                records[m]['prompt'] for m in sorted(members)
+                if m != canonical and not (records[m].get('prompt') in seen or seen.add(records[m].get('prompt')))
+            ]
+            record['cluster_size'] = len(members)
+        kept.append((canonical, record))
+    kept.sort(key=lambda item: item[0])
+
+    tmp_output = output_file + '.tmp'
+    with open(tmp_output, 'w', encoding='utf-8') as f:
+        for _, record in kept:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    os.replace(tmp_output, output_file)
+    timings['write'] = time.perf_counter() - stage_start
+
+    before, after = len(records), len(kept)
+    by_category = defaultdict(lambda: [0, 0])
+    for record in records:
+        by_category[record.get('category', 'general')][0] += 1
+    for _, record in kept:
+        by_category[record.get('category', 'general')][1] += 1
+    largest = sorted(clusters.values(), key=len, reverse=True)[:10]
+
+    report = {
+        'input': os.path.abspath(input_file),
+        'output': os.path.abspath(output_file),
+        'params': {'threshold': threshold, 'bands': bands, 'rows': num_perm // bands,
+                   'num_perm': num_perm, 'shingle_size': SHINGLE_SIZE, 'per_category': per_category},
+        'records_before': before,
+        'records_after': after,
+        'exact_duplicates_removed': exact_merges,
+        'near_duplicates_removed': near_merges,
+        'reduction_pct': round(100.0 * (before - after) / before, 2) if before else 0.0,
+        'clusters_with_duplicates': sum(1 for members in clusters.values() if len(members) > 1),
+        'largest_clusters': [{'size': len(members), 'records': members[:20]} for members in largest if len(members) > 1],
+        'by_category': {category: {'before': b, 'after': a} for category, (b, a) in sorted(by_category.items())},
+        'embedding_matrix_mb': {
+            name: {'before': round(before * dim * 4 / (1024 * 1024), 2),
+                   'after': round(after * dim * 4 / (1024 * 1024), 2)}
+            for name, dim in EMBEDDING_DIMS.items()
+        },
+        'file_mb': {'before': round(os.path.getsize(input_file) / (1024 * 1024), 2),
+                    'after': round(os.path.getsize(output_file) / (1024 * 1024), 2)},
+        'timings_seconds': {name: round(value, 3) for name, value in timings.items()},
+        'seconds': round(time.perf_counter() - start_time, 3),
+    }
+
+    report_file = report_file or os.path.splitext(output_file)[0] + '_report.json'
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    if verbose:
+        print(f"{'=' * 70}")
+        print("✅ DEDUP COMPLETE!")
+        print(f"{'=' * 70}")
+        print(f"\n📊 Summary:")
+        print(f"   📥 Records before: {before}")
+        print(f"   📤 Records after:  {after} (-{report['reduction_pct']}%)")
+        print(f"   🟰 Exact duplicates: {exact_merges} | ≈ Near duplicates: {near_merges}")
+        print(f"   🔗 Clusters with duplicates: {report['clusters_with_duplicates']}")
+        for name, sizes in report['embedding_matrix_mb'].items():
+            print(f"   🧠 {name} matrix: {sizes['before']} MB -> {sizes['after']} MB")
+        print(f"   ⏱️  Time: {report['seconds']:.2f}s "
+              f"({', '.join(f'{k} {v:.2f}s' for k, v in timings.items())})")
+        print(f"   📝 Report: {report_file}")
+
+    return report
+
+
+# ============================================
+# MAIN EXECUTION
+# ============================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deduplicate the Flutter dataset JSONL")
+    parser.add_argument('--input', default='flutter_dataset.jsonl')
+    parser.add_argument('--output', default='flutter_dataset_dedup.jsonl')
+    parser.add_argument('--threshold', type=float, default=0.85, help="Min estimated Jaccard to merge")
+    parser.add_argument('--bands', type=int, default=16)
+    parser.add_argument('--num-perm', type=int, default=NUM_PERM)
+    parser.add_argument('--cross-category', action='store_true', help="Allow merging across categories")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--report', default=None)
+    args = parser.parse_args()
+
+    dedup_dataset(args.input, args.output, threshold=args.threshold, bands=args.bands,
+                  num_perm=args.num_perm, per_category=not args.cross_category,
+                  workers=args.workers, report_file=args.report)
@@ -0,0 +1,145 @@
+import math
+import time
+import asyncio
+import logging
+import contextlib
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Deque, Dict, Sequence
+from .metrics import ADMISSION_WAIT_SECONDS, ADMISSION_REJECTED
+
+logger = logging.getLogger(__name__)
+
+# Highest first; a waiting request of a higher class is always admitted before a lower one
+PRIORITIES = ("high", "normal", "low")
+
+
+class AdmissionRejected(Exception):
+    """The queue is full or the wait timed out; ``retry_after`` is a hint in seconds"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Admission rejected: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounded, priority-aware gate in front of the provider fan-out.
+
+    At most ``max_concurrent`` generations run at once; the rest wait in one
+    queue per priority class, up to ``max_queue`` in total, and are refused
+    beyond that (or after ``max_wait`` seconds). Within a class, tenants are
+    served round-robin so one client submitting a burst cannot starve the
+    others. All methods must be called from the event loop thread.
+    """
+
+    def __init__(self, max_concurrent: int = 8, max_queue: int = 64, max_wait: float = 30.0,
+                 priorities: Sequence[str] = PRIORITIES):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.queued = 0
+        # priority -> tenant -> waiters, tenants in round-robin order
+        self._queues: Dict[str, "OrderedDict[str, Deque[asyncio.Future]]"] = {
+            priority: OrderedDict() for priority in priorities
+        }
+        # Running average of how long a slot is held, for Retry-After
+        self._average_hold = 5.0
+
+    def priority_for(self, value: str) -> str:
+        return value if value in self._queues else "normal"
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue has likely drained"""
+        return max(1, math.ceil((self.queued + 1) * self._average_hold / self.max_concurrent))
+
+    async def acquire(self, tenant: str, priority: str = "normal", bounded: bool = True) -> float:
+        """
+        Wait for a slot and return the time spent waiting.
+
+        ``bounded=False`` skips the depth limit and the wait timeout, for work
+        that was already accepted elsewhere (queued jobs).
+        """
+        priority = self.priority_for(priority)
+        enqueued = time.perf_counter()
+        if self.in_flight < self.max_concurrent and not self.queued:
+            self.in_flight += 1
+        else:
+            if bounded and self.queued >= self.max_queue:
+                ADMISSION_REJECTED.inc(priority, "queue_full")
+                logger.warning("🚦 Admission queue full (%d waiting), rejecting %s/%s", self.queued, tenant, priority)
+                raise AdmissionRejected("queue_full", self.retry_after())
+            waiter = asyncio.get_event_loop().create_future()
+            self._queues[priority].setdefault(tenant, deque()).append(waiter)
+            self.queued += 1
+            try:
+                done, _ = await asyncio.wait({waiter}, timeout=self.max_wait if bounded else None)
+            except asyncio.CancelledError:
+                self._abandon(priority, tenant, waiter)
+                raise
+            if not done:
+                self._abandon(priority, tenant, waiter)
+                ADMISSION_REJECTED.inc(priority, "timeout")
+                logger.warning("🚦 %s/%s gave up after waiting %.0fs for a slot", tenant, priority, self.max_wait)
+                raise AdmissionRejected("timeout", self.retry_after())
+        waited = time.perf_counter() - enqueued
+        ADMISSION_WAIT_SECONDS.observe(waited, priority)
+        return waited
+
+    def release(self, held_seconds: float):
+        self._average_hold += 0.2 * (held_seconds - self._average_hold)
+        self._free_slot()
+
+    @contextlib.asynccontextmanager
+    async def admit(self, tenant: str, priority: str = "normal", bounded: bool = True) -> AsyncIterator[float]:
+        """``async with controller.admit(tenant, priority):`` around one generation"""
+        waited = await self.acquire(tenant, priority, bounded)
+        start = time.perf_counter()
+        try:
+            yield waited
+        finally:
+            self.release(time.perf_counter() - start)
+
+    def _abandon(self, priority: str, tenant: str, waiter: asyncio.Future):
+        """Drop a waiter that gave up; hand its slot on if it was granted meanwhile"""
+        if waiter.done() and not waiter.cancelled():
+            self._free_slot()
+            return
+        waiter.cancel()
+        tenants = self._queues[priority]
+        waiters = tenants.get(tenant)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            self.queued -= 1
+            if not waiters:
+                del tenants[tenant]
+
+    def _free_slot(self):
+        self.in_flight -= 1
+        while self.in_flight < self.max_concurrent and self.queued:
+            tenants = next(t for t in self._queues.values() if t)
+            tenant, waiters = next(iter(tenants.items()))
+            waiter = waiters.popleft()
+            self.queued -= 1
+            if waiters:
+                tenants.move_to_end(tenant)
+            else:
+                del tenants[tenant]
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    def queue_depths(self) -> Dict[str, int]:
+        return {
+            priority: sum(len(waiters) for waiters in tenants.values())
+            for priority, tenants in self._queues.items()
+        }
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "queued": self.queue_depths(),
+            "max_queue": self.max_queue,
+            "waiting_tenants": sum(len(tenants) for tenants in self._queues.values()),
+        }
@@ -4,6 +4,7 @@ import random
 import logging
 from typing import Optional, Tuple, Callable
 from .models import RetryConfig
+from .tracing import start_span
 
 logger = logging.getLogger(__name__)
 
@@ -11,7 +12,7 @@ class CodeProcessor:
     """Handles code processing, cleaning, and parsing operations"""
     
     def __init__(self):
-        logger.info("🔧 Initializing CodeProcessor...")
+        logger.debug("🔧 Initializing CodeProcessor...")
     
     def make_request_with_retry(
         self, 
@@ -20,28 +21,27 @@ class CodeProcessor:
         retry_config: RetryConfig
     ) -> Optional[str]:
         """Make API request with exponential backoff retry logic"""
-        logger.info(f"📡 Starting API request with max {retry_config.max_retries} retries")
-        logger.info(f"📏 Prompt length: {len(prompt)} characters")
+        logger.debug("📡 Starting API request with max %d retries (prompt %d characters)",
+                     retry_config.max_retries, len(prompt))
         
         last_error = None
         
         for attempt in range(retry_config.max_retries):
             try:
-                logger.info(f"🚀 Attempt {attempt + 1}/{retry_config.max_retries}: Sending request...")
+                logger.debug("🚀 Attempt %d/%d: Sending request...", attempt + 1, retry_config.max_retries)
                 
                 response = api_call(prompt)
                 
                 if response and response.strip():
-                    logger.info(f"✅ Successfully received response on attempt {attempt + 1}")
-                    logger.info(f"📏 Response length: {len(response)} characters")
+                    logger.debug("✅ Received response on attempt %d (%d characters)", attempt + 1, len(response))
                     return response
                 else:
-                    logger.warning(f"⚠️ Empty response on attempt {attempt + 1}")
+                    logger.warning("⚠️ Empty response on attempt %d", attempt + 1)
                     last_error = "Empty response from API"
                     
             except Exception as e:
                 error_msg = str(e)
-                logger.error(f"❌ Attempt {attempt + 1} failed with error: {error_msg}")
+                logger.error("❌ Attempt %d failed with error: %s", attempt + 1, error_msg)
                 last_error = error_msg
                 
                 # Handle different types of errors
@@ -53,16 +53,17 @@ class CodeProcessor:
                     )
                     
                     if "503" in error_msg or "overloaded" in error_msg.lower():
-                        logger.info(f"⏳ Service overloaded, waiting {delay:.2f}s before retry...")
+                        logger.info("⏳ Service overloaded, waiting %.2fs before retry...", delay)
                     elif "429" in error_msg or "quota" in error_msg.lower():
                         delay = self._exponential_backoff(attempt, base_delay=5.0)
-                        logger.info(f"⏳ Rate limited, waiting {delay:.2f}s before retry...")
+                        logger.info("⏳ Rate limited, waiting %.2fs before retry...", delay)
                     else:
-                        logger.info(f"⏳ Error occurred, waiting {delay:.2f}s before retry...")
+                        logger.info("⏳ Error occurred, waiting %.2fs before retry...", delay)
                     
-                    time.sleep(delay)
+                    with start_span("retry.backoff", attempt=attempt + 1, delay_s=round(delay, 3)):
+                        time.sleep(delay)
         
-        logger.error(f"❌ All retry attempts failed. Last error: {last_error}")
+        logger.error("❌ All retry attempts failed. Last error: %s", last_error)
         return None
     
     def _exponential_backoff(self, attempt: int, base_delay: float = 1.0, max_delay: float = 60.0) -> float:
@@ -73,8 +74,7 @@ class CodeProcessor:
     
     def clean_response(self, response_text: str) -> str:
         """Clean the response by removing markdown code blocks"""
-        logger.info(f"🧹 Starting response cleanup...")
-        logger.info(f"📏 Original response length: {len(response_text)} characters")
+        logger.debug("🧹 Starting response cleanup (%d characters)", len(response_text))
         
         # Remove markdown code blocks
         response_text = re.sub(r'```dart\s*\n?', '', response_text)
@@ -83,14 +83,12 @@ class CodeProcessor:
         # Remove any leading/trailing whitespace
         response_text = response_text.strip()
         
-        logger.info(f"🧹 Cleanup complete. Final length: {len(response_text)} characters")
+        logger.debug("🧹 Cleanup complete. Final length: %d characters", len(response_text))
         return response_text
     
     def clean_code_response(self, code: str, widget_name: str = "GeneratedWidget") -> str:
       """Clean and validate the generated code for Flutter 3.27.1"""
-      logger.info(f"🧹 Starting code cleanup for Flutter 3.27.1...")
-      logger.info(f"🎯 Target widget name: {widget_name}")
-      logger.info(f"📏 Original code length: {len(code)} characters")
+      logger.debug("🧹 Starting code cleanup for %s (%d characters)", widget_name, len(code))
       
       if not code or not code.strip():
           logger.error("❌ Empty or whitespace-only code detected")
@@ -101,76 +99,48 @@ class CodeProcessor:
       code = re.sub(r'```\n?', '', code)
       code = code.strip()
       
-      # CRITICAL FIX: Log the first few lines to see what we're dealing with
-      logger.info("=" * 80)
-      logger.info("📋 ORIGINAL CODE (First 300 characters):")
-      logger.info(f"   {repr(code[:300])}")
-      logger.info("=" * 80)
+      logger.debug("📋 Original code (first 300 characters): %r", code[:300])
       
       # FIX 1: Remove ALL spaces after colons in package imports
       # This is the most aggressive fix - it handles ALL variations
-      logger.info("🔧 Fixing import statements (removing ALL spaces after 'package:')...")
-      logger.info(f"   Checking for pattern 'package:\\s+' in code...")
-      
-      # Check if the problem exists
-      space_match = re.search(r"package:\s+", code)
-      if space_match:
-          logger.warning("⚠️ FOUND SPACE ISSUE!")
-          logger.warning(f"   Matched text: {repr(space_match.group(0))}")
-          logger.warning(f"   Position: {space_match.start()} to {space_match.end()}")
-          logger.warning(f"   Context (50 chars): {repr(code[max(0, space_match.start()-10):space_match.end()+40])}")
+      if logger.isEnabledFor(logging.DEBUG):
+          space_match = re.search(r"package:\s+", code)
+          if space_match:
+              logger.debug("⚠️ Space after 'package:' at %d: %r", space_match.start(),
+                           code[max(0, space_match.start()-10):space_match.end()+40])
       
       # Pattern 1: Fix "package: " (space after colon) - MOST AGGRESSIVE
       original_code = code
       
       # Replace any whitespace (including newlines, tabs) after 'package:' in imports
       code = re.sub(r"import\s+['\"]package:\s+([^'\"]+)['\"]", r"import 'package:\1'", code)
-      logger.info(f"   After regex fix 1: {repr(code[:100])}")
       
       # Also handle cases where quotes might be inconsistent
       code = re.sub(r"'package:\s+", "'package:", code)
-      logger.info(f"   After regex fix 2: {repr(code[:100])}")
-      
       code = re.sub(r'"package:\s+', '"package:', code)
-      logger.info(f"   After regex fix 3: {repr(code[:100])}")
       
       # Extra aggressive: remove ANY whitespace between 'package:' and the next word
       code = re.sub(r'package:\s+(\w)', r'package:\1', code)
-      logger.info(f"   After regex fix 4: {repr(code[:100])}")
       
       if original_code != code:
-          logger.info("✅ Fixed spaces in package imports")
-          # Show what changed
-          import_matches = re.findall(r"import\s+['\"]package:[^'\"]+['\"];?", code)
-          for match in import_matches[:3]:
-              logger.info(f"   Fixed import: {repr(match)}")
-      else:
-          logger.info("⚠️ No changes made - pattern might not have matched")
-          logger.info(f"   First line: {repr(code.split(chr(10))[0] if chr(10) in code else code[:100])}")
+          logger.debug("✅ Fixed spaces in package imports")
       
       # FIX 2: Remove double/triple/multiple semicolons
-      logger.info("🔧 Fixing multiple semicolons...")
-      
       if re.search(r';{2,}', code):
-          logger.warning("⚠️ Found multiple semicolons in code")
           # Replace 2 or more semicolons with just one
           code = re.sub(r';{2,}', ';', code)
-          logger.info("✅ Fixed multiple semicolons")
-      else:
-          logger.info("✅ No multiple semicolon issues found")
+          logger.debug("✅ Fixed multiple semicolons")
       
       # FIX 3: Fix spaces in URLs (like 'https: //' -> 'https://')
       if re.search(r"https?:\s+//", code):
-          logger.warning("⚠️ Found space in URL after colon")
           code = re.sub(r"https?:\s+//", lambda m: m.group(0).replace(' ', ''), code)
-          logger.info("✅ Fixed spaces in URLs")
+          logger.debug("✅ Fixed spaces in URLs")
       
       # FIX 4: Fix spaces in time formats (like '10: 00' -> '10:00')
       time_pattern = r"(\d+):\s+(\d+)"
       if re.search(time_pattern, code):
-          logger.warning("⚠️ Found spaces in time formats")
           code = re.sub(time_pattern, r"\1:\2", code)
-          logger.info("✅ Fixed spaces in time formats")
+          logger.debug("✅ Fixed spaces in time formats")
       
       # FIX 5: Ensure the correct Flutter import exists
       correct_import = "import 'package:flutter/material.dart';"
@@ -179,15 +149,10 @@ class CodeProcessor:
       has_flutter_import = bool(re.search(r"import\s+['\"]package:flutter/material\.dart['\"];?", code))
       
       if not has_flutter_import:
-          logger.info("🧹 Adding missing Flutter import")
+          logger.debug("🧹 Adding missing Flutter import")
           code = correct_import + "\n\n" + code
-      else:
-          logger.info("✅ Flutter material import found")
-      
-      logger.info("✅ All import and formatting fixes completed")
       
       # Fix widget naming
-      logger.info(f"🔧 Enforcing widget name: {widget_name}")
       incorrect_names = [
           'GeneratedWidget', 'MainWidget', 'Main', 'MyWidget',
           'AppWidget', 'HomeWidget', 'CustomWidget', 'UIWidget',
@@ -215,63 +180,57 @@ class CodeProcessor:
       code = self._fix_code_formatting(code)
       
       # Verify widget name
-      if f'class {widget_name}' not in code:
-          logger.warning(f"⚠️ Widget name {widget_name} not found, attempting to fix...")
-          class_match = re.search(r'class\s+(\w+)\s+extends\s+(StatelessWidget|StatefulWidget)', code)
-          if class_match:
-              old_name = class_match.group(1)
-              logger.info(f"🔧 Replacing widget name '{old_name}' with '{widget_name}'")
-              code = code.replace(f'class {old_name}', f'class {widget_name}')
-              code = code.replace(f'const {old_name}(', f'const {widget_name}(')
+      code = self.rename_widget(code, widget_name)
       
       # FINAL VERIFICATION: Check if the space issue is STILL there
-      logger.info("=" * 80)
-      logger.info("🔍 FINAL VERIFICATION:")
       space_check = re.search(r"package:\s+\w", code)
       
       if space_check:
-          logger.error("❌ CRITICAL: Space after 'package:' STILL EXISTS after all fixes!")
-          logger.error(f"   Matched text: {repr(space_check.group(0))}")
-          logger.error(f"   Position: {space_check.start()} to {space_check.end()}")
-          
-          # Show the problematic line
-          problem_line_match = re.search(r'import[^;]+package:[^;]+;', code)
-          if problem_line_match:
-              logger.error(f"   Full import line: {repr(problem_line_match.group(0))}")
+          logger.warning("⚠️ Space after 'package:' survived the regex fixes: %r", space_check.group(0))
           
           # One last desperate attempt - simple string replacement
-          logger.info("🔧 Applying FINAL string replacement fix...")
           code = code.replace("package: ", "package:")
-          logger.info(f"   After string replacement: {repr(code[:100])}")
           
           # Check again
           final_check = re.search(r"package:\s+\w", code)
           if final_check:
-              logger.error("❌ STILL FAILED! Space persists even after string replacement!")
-              logger.error(f"   The space character might be: {repr(code[final_check.start()+8:final_check.start()+10])}")
-          else:
-              logger.info("✅ String replacement fixed it!")
-      else:
-          logger.info("✅ No spaces found after 'package:' - code is clean!")
+              logger.error("❌ Space after 'package:' persists even after string replacement: %r",
+                           code[final_check.start()+8:final_check.start()+10])
       
-      logger.info("=" * 80)
-      
-      logger.info(f"✅ Code cleanup complete")
-      logger.info(f"📏 Final code length: {len(code)} characters")
-      
-      # Log the first 3 lines to verify
-      logger.info("=" * 80)
-      logger.info("📋 FINAL CODE - First 3 lines:")
-      lines = code.split('\n')
-      for i, line in enumerate(lines[:3], 1):
-          logger.info(f"   Line {i}: {repr(line)}")
-      logger.info("=" * 80)
+      logger.debug("✅ Code cleanup complete (%d characters), first line: %r",
+                   len(code), code[:code.find('\n')] if '\n' in code else code[:100])
       
       return code
     
+    @staticmethod
+    def rename_widget(code: str, widget_name: str) -> str:
+        """
+        Rename the first widget class to ``widget_name``.
+
+        Only the declaration and code references are rewritten: constructor
+        declarations and calls, type arguments (State<...>) and the private
+        state class (_...State). Text in strings and comments, and other
+        identifiers containing the name, are left alone.
+        """
+        if re.search(rf'\bclass\s+{widget_name}\b', code):
+            return code
+        class_match = re.search(r'class\s+(\w+)\s+extends\s+(StatelessWidget|StatefulWidget)', code)
+        if not class_match:
+            logger.warning("⚠️ Widget name %s not found", widget_name)
+            return code
+        old_name = class_match.group(1)
+        logger.info("🔧 Replacing widget name '%s' with '%s'", old_name, widget_name)
+        code = re.sub(rf'\bclass\s+{old_name}\b', f'class {widget_name}', code)
+        # The private state class: declaration, createState's return type and call
+        code = re.sub(rf'(?<![\w.$\'"])_{old_name}State\b', f'_{widget_name}State', code)
+        # Constructor declaration and calls: Name( / const Name( / Name.named(, not obj.Name( or 'Name ('
+        code = re.sub(rf'(?<![\w.$\'"]){old_name}(?=\(|\.\w+\()', widget_name, code)
+        # Type arguments: State<Name>, List<Name>, Map<String, Name>
+        code = re.sub(rf'(?<=[<,])(\s*){old_name}(?=\s*[>,])', rf'\g<1>{widget_name}', code)
+        return code
+    
     def _apply_flutter_3_27_fixes(self, code: str) -> str:
         """Apply Flutter 3.27.1 specific fixes"""
-        logger.info("🔧 Applying Flutter 3.27.1 compatibility fixes...")
         
         # Fix deprecated constructors
         code = re.sub(r'MediaQuery\.of\(context\)\.size\.width', 'MediaQuery.sizeOf(context).width', code)
@@ -284,7 +243,6 @@ class CodeProcessor:
         # Fix Scaffold backgroundColor (ensure proper syntax)
         code = re.sub(r'backgroundColor:\s*Color\(0x[fF]{2}([0-9a-fA-F]{6})\)', r'backgroundColor: Color(0xFF\1)', code)
         
-        logger.info("✅ Flutter 3.27.1 compatibility fixes applied")
         return code
     
     def _fix_code_formatting(self, code: str) -> str:
@@ -330,8 +288,7 @@ class CodeProcessor:
     
     def get_professional_fallback_widget(self, error: str, widget_name: str = "GeneratedWidget") -> str:
         """Return a professional fallback widget for Flutter 3.27.1"""
-        logger.warning(f"🛡️ Generating professional fallback widget due to error: {error}")
-        logger.info(f"🎯 Using widget name: {widget_name}")
+        logger.warning("🛡️ Generating professional fallback widget %s due to error: %s", widget_name, error)
         
         fallback_code = f"""import 'package:flutter/material.dart';
 
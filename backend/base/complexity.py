@@ -0,0 +1,64 @@
+import re
+from typing import Any, Dict, Iterable, NamedTuple
+
+# UI structures that take a large model to lay out well
+STRUCTURE_KEYWORDS = (
+    "navigation", "tab", "drawer", "list", "grid", "carousel", "chart", "graph", "table",
+    "form", "stepper", "calendar", "map", "cart", "checkout", "filter", "search", "feed",
+    "chat", "animation", "animated", "dialog", "bottom sheet", "dashboard", "timeline",
+)
+COMPLEX_CATEGORIES = {
+    "ecommerce", "e-commerce", "social", "messaging", "finance", "media", "productivity",
+    "navigation", "dashboard", "analytics",
+}
+SIMPLE_CATEGORIES = {"error_pages", "loading", "feedback", "splash", "empty_state"}
+
+_WORD_RE = re.compile(r"\w+")
+_STRUCTURE_RES = [(keyword, re.compile(rf"\b{keyword}s?\b")) for keyword in STRUCTURE_KEYWORDS]
+
+
+class PromptComplexity(NamedTuple):
+    route: str  # "simple" or "complex"
+    score: float
+    features: Dict[str, Any]
+
+
+def classify_prompt(prompt: str, neighbours: Iterable[Dict[str, Any]] = (),
+                    threshold: float = 1.0) -> PromptComplexity:
+    """
+    Score how much UI a prompt asks for, from features that are already at hand.
+
+    Longer prompts, more distinct structural widgets (lists, tabs, charts...),
+    retriever neighbours built from many components and categories such as
+    e-commerce all push towards "complex"; a score under ``threshold`` is
+    "simple". ``neighbours`` are retriever matches (``components``, ``category``).
+    """
+    text = prompt.lower()
+    words = len(_WORD_RE.findall(text))
+    structures = [keyword for keyword, pattern in _STRUCTURE_RES if pattern.search(text)]
+
+    neighbours = list(neighbours)
+    components = [len(n.get("components") or []) for n in neighbours]
+    mean_components = sum(components) / len(components) if components else 0.0
+    categories = [str(n.get("category", "")).lower() for n in neighbours]
+    category = max(set(categories), key=categories.count) if categories else None
+
+    score = min(words / 40.0, 1.5)
+    score += min(0.4 * len(structures), 1.6)
+    # Dataset screens average ~7 components; only well above that counts
+    score += min(max((mean_components - 5.0) / 4.0, 0.0), 1.0)
+    if category in COMPLEX_CATEGORIES:
+        score += 0.5
+    elif category in SIMPLE_CATEGORIES:
+        score -= 0.5
+
+    return PromptComplexity(
+        route="complex" if score >= threshold else "simple",
+        score=round(score, 3),
+        features={
+            "words": words,
+            "structures": structures,
+            "neighbour_components": round(mean_components, 2),
+            "category": category,
+        },
+    )
@@ -0,0 +1,100 @@
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .usage import CHARS_PER_TOKEN
+
+# Widget-tree depths (in 2-space indentation columns) tried before falling back to signatures
+TRIM_DEPTHS = (20, 16, 12, 8)
+
+_LINE_COMMENT_RE = re.compile(r"^\s*//.*$")
+_BLOCK_COMMENT_RE = re.compile(r"/\*.*?\*/", re.DOTALL)
+_SIGNATURE_RE = re.compile(
+    r"^\s*(import |class |const \w+\(\{|@override|Widget build\(|(final|late) \w|return \w+\()"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def strip_noise(code: str) -> str:
+    """Drop comments and blank lines"""
+    code = _BLOCK_COMMENT_RE.sub("", code)
+    return "\n".join(
+        line.rstrip() for line in code.splitlines()
+        if line.strip() and not _LINE_COMMENT_RE.match(line)
+    )
+
+
+def trim_depth(code: str, max_indent: int) -> str:
+    """Collapse everything indented deeper than ``max_indent`` columns into one ``...`` line"""
+    lines = []
+    collapsed = False
+    for line in code.splitlines():
+        indent = len(line) - len(line.lstrip(" "))
+        if indent > max_indent:
+            if not collapsed:
+                lines.append(" " * (max_indent + 2) + "...")
+                collapsed = True
+            continue
+        collapsed = False
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def signature_only(code: str) -> str:
+    """Imports, class and field declarations, constructors and the top widget of each build"""
+    return "\n".join(line for line in code.splitlines() if _SIGNATURE_RE.match(line))
+
+
+def compress_example(code: str, max_tokens: int) -> Tuple[Optional[str], str]:
+    """
+    Shrink one dataset widget to at most ``max_tokens``, keeping as much tree as fits.
+
+    Tries the comment-free code, then the widget tree cut at decreasing depths,
+    then declarations only. Returns (text, mode) with mode "full", "trimmed" or
+    "signature"; text is None when not even the signatures fit.
+    """
+    code = strip_noise(code)
+    if estimate_tokens(code) <= max_tokens:
+        return code, "full"
+    for depth in TRIM_DEPTHS:
+        trimmed = trim_depth(code, depth)
+        if estimate_tokens(trimmed) <= max_tokens:
+            return trimmed, "trimmed"
+    signatures = signature_only(code)
+    if signatures and estimate_tokens(signatures) <= max_tokens:
+        return signatures, "signature"
+    return None, "dropped"
+
+
+def few_shot_block(examples: Sequence[Dict[str, Any]], max_tokens: int) -> Tuple[str, Dict[str, Any]]:
+    """
+    Prompt section with retrieved examples (``prompt``/``code`` dicts, best first) within ``max_tokens``.
+
+    The budget is shared evenly; what one example leaves unused goes to the
+    next ones. Returns the text ("" when nothing fits) and its stats.
+    """
+    header = ("Reference implementations of similar screens from our dataset. Reuse their structure "
+              "and idioms where they fit the request; do not copy their class names.")
+    remaining = max_tokens - estimate_tokens(header)
+    parts: List[str] = []
+    modes: List[str] = []
+    usable = [example for example in examples if example.get("code")]
+    for position, example in enumerate(usable):
+        label = f"--- Example {len(parts) + 1}: {example.get('prompt') or 'similar screen'} ---"
+        share = remaining // (len(usable) - position) - estimate_tokens(label)
+        if share <= 0:
+            break
+        text, mode = compress_example(example["code"], share)
+        modes.append(mode)
+        if text is None:
+            continue
+        part = f"{label}\n{text}"
+        parts.append(part)
+        remaining -= estimate_tokens(part)
+
+    if not parts:
+        return "", {"examples": 0, "tokens": 0, "modes": modes}
+    block = "\n\n".join([header] + parts)
+    return block, {"examples": len(parts), "tokens": estimate_tokens(block), "modes": modes}
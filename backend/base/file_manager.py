@@ -1,4 +1,6 @@
+import os
 import logging
+import threading
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
@@ -8,16 +10,13 @@ class FileManager:
     
     def __init__(self, service_type: str = "general"):
         self.service_type = service_type.lower()
-        logger.info(f"📁 Initializing FileManager for service: {self.service_type}")
+        logger.debug("📁 Initializing FileManager for service: %s", self.service_type)
         self._setup_file_paths()
     
     def _setup_file_paths(self):
         """Set up file paths for writing generated code"""
-        logger.info("📁 Setting up file paths...")
-        
         # Get the current directory (backend)
         current_dir = Path(__file__).parent.parent
-        logger.info(f"📍 Current directory: {current_dir}")
         
         # Navigate to the frontend/lib/widgets directory
         self.frontend_dir = current_dir.parent / "frontend"
@@ -28,47 +27,44 @@ class FileManager:
         filename = f"{self.service_type}_generated_widget.dart"
         self.target_file = self.widgets_dir / filename
         
-        logger.info(f"📂 Frontend directory: {self.frontend_dir}")
-        logger.info(f"📂 Target file: {self.target_file}")
+        logger.debug("📂 Target file: %s", self.target_file)
         
         # Check if directories exist
         if not self.frontend_dir.exists():
-            logger.warning(f"⚠️ Frontend directory does not exist: {self.frontend_dir}")
+            logger.warning("⚠️ Frontend directory does not exist: %s", self.frontend_dir)
         if not self.widgets_dir.exists():
-            logger.info(f"📁 Creating widgets directory: {self.widgets_dir}")
+            logger.info("📁 Creating widgets directory: %s", self.widgets_dir)
             self.widgets_dir.mkdir(parents=True, exist_ok=True)
-        
-        logger.info("✅ File paths setup complete")
     
     def write_dart_file(self, dart_code: str) -> bool:
         """Write the generated Dart code to the target file"""
-        logger.info(f"📝 Writing Dart code to file: {self.target_file}")
-        logger.info(f"📏 Code length: {len(dart_code)} characters")
+        logger.debug("📝 Writing %d characters to %s", len(dart_code), self.target_file)
         
+        # Write to a private temp file and rename it into place, so concurrent
+        # generations for the same service (batch requests) never interleave
+        tmp_file = self.widgets_dir / f".{self.target_file.name}.{os.getpid()}.{threading.get_ident()}.tmp"
         try:
             # Ensure the widgets directory exists
             self.widgets_dir.mkdir(parents=True, exist_ok=True)
             
-            # Write the Dart code to the file
-            with open(self.target_file, 'w', encoding='utf-8') as f:
-                f.write(dart_code)
-            
-            logger.info(f"✅ Successfully wrote Dart code to: {self.target_file}")
-            
-            # Verify the file was written correctly
-            if self.target_file.exists():
-                with open(self.target_file, 'r', encoding='utf-8') as f:
+            try:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    f.write(dart_code)
+                
+                # Verify the file was written correctly
+                with open(tmp_file, 'r', encoding='utf-8') as f:
                     written_content = f.read()
-                if len(written_content) == len(dart_code):
-                    logger.info(f"✅ File verification successful")
-                    return True
-                else:
-                    logger.warning(f"⚠️ File verification warning - length mismatch")
-                    return True  # Still consider it successful
+                os.replace(tmp_file, self.target_file)
+            except Exception:
+                # Don't leave the partial temp file in the Flutter project
+                tmp_file.unlink(missing_ok=True)
+                raise
+            if len(written_content) == len(dart_code):
+                logger.debug("✅ File verification successful")
             else:
-                logger.error(f"❌ File verification failed - file does not exist after write")
-                return False
+                logger.warning("⚠️ File verification warning - length mismatch for %s", self.target_file)
+            return True  # Still consider it successful
                 
         except Exception as e:
-            logger.error(f"❌ Error writing Dart file: {str(e)}")
+            logger.error("❌ Error writing Dart file %s: %s", self.target_file, e)
             return False
\ No newline at end of file
@@ -0,0 +1,326 @@
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from urllib.parse import urlparse
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import requests
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    filters TEXT,
+    services TEXT NOT NULL,
+    callback_url TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    summary TEXT,
+    error TEXT,
+    callback_status TEXT,
+    owner TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_workers (
+    id TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    heartbeat_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_results (
+    job_id TEXT NOT NULL REFERENCES jobs (id) ON DELETE CASCADE,
+    service TEXT NOT NULL,
+    result TEXT NOT NULL,
+    completed_at REAL NOT NULL,
+    PRIMARY KEY (job_id, service)
+);
+"""
+
+
+class JobStore:
+    """
+    SQLite-backed job state shared by every worker process on the host.
+
+    Each thread gets its own connection; WAL mode lets pollers in other
+    processes read while a worker writes. Per-service results are stored as
+    they complete, so a poll sees partial progress.
+
+    Queues are in memory, so every job records the process that owns it
+    (``owner``) and each process heartbeats into ``job_workers``;
+    ``fail_orphaned`` fails the unfinished jobs of owners that are gone.
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.host = socket.gethostname()
+        self.pid = os.getpid()
+        self.owner = f"{self.host}:{self.pid}:{uuid.uuid4().hex[:8]}"
+        self._local = threading.local()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connection()
+        conn.executescript(_SCHEMA)
+        # Databases created before jobs had owners
+        if "owner" not in {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}:
+            conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def create(self, prompt: str, filters: Optional[Dict[str, Any]], services: List[str],
+               callback_url: Optional[str] = None) -> str:
+        job_id = uuid.uuid4().hex
+        self._connection().execute(
+            "INSERT INTO jobs (id, status, prompt, filters, services, callback_url, created_at, owner) "
+            "VALUES (?, 'queued', ?, ?, ?, ?, ?, ?)",
+            (job_id, prompt, json.dumps(filters) if filters else None, json.dumps(services),
+             callback_url, time.time(), self.owner),
+        )
+        return job_id
+
+    def mark_running(self, job_id: str):
+        self._connection().execute(
+            "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (time.time(), job_id)
+        )
+
+    def add_result(self, job_id: str, result: Dict[str, Any]):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO job_results (job_id, service, result, completed_at) VALUES (?, ?, ?, ?)",
+            (job_id, result.get("service", "unknown"), json.dumps(result, default=str), time.time()),
+        )
+
+    def finish(self, job_id: str, status: str, summary: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None):
+        if status not in JOB_STATUSES:
+            raise ValueError(f"Unknown job status: {status}")
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, summary = ?, error = ? WHERE id = ?",
+            (status, time.time(), json.dumps(summary) if summary else None, error, job_id),
+        )
+
+    def set_callback_status(self, job_id: str, callback_status: str):
+        self._connection().execute(
+            "UPDATE jobs SET callback_status = ? WHERE id = ?", (callback_status, job_id)
+        )
+
+    def get(self, job_id: str, include_code: bool = True) -> Optional[Dict[str, Any]]:
+        conn = self._connection()
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        results = []
+        for result_row in conn.execute(
+            "SELECT result FROM job_results WHERE job_id = ? ORDER BY completed_at", (job_id,)
+        ):
+            result = json.loads(result_row["result"])
+            if not include_code:
+                result.pop("code", None)
+            results.append(result)
+
+        services = json.loads(row["services"])
+        # Finished jobs may have skipped services (retriever-first routing)
+        done = {r.get("service") for r in results} if row["status"] in ("queued", "running") else set(services)
+        return {
+            "job_id": row["id"],
+            "status": row["status"],
+            "prompt": row["prompt"],
+            "filters": json.loads(row["filters"]) if row["filters"] else None,
+            "services": services,
+            "completed_services": [r.get("service") for r in results],
+            "pending_services": [s for s in services if s not in done],
+            "results": results,
+            "summary": json.loads(row["summary"]) if row["summary"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+            "callback_url": row["callback_url"],
+            "callback_status": row["callback_status"],
+        }
+
+    def heartbeat(self):
+        """Mark this process alive; its queued and running jobs are not orphans"""
+        self._connection().execute(
+            "INSERT OR REPLACE INTO job_workers (id, host, pid, heartbeat_at) VALUES (?, ?, ?, ?)",
+            (self.owner, self.host, self.pid, time.time()),
+        )
+
+    def _owner_dead(self, host: str, pid: int) -> bool:
+        """Whether a process on this host is gone (our own pid under another owner id is a previous run)"""
+        if host != self.host:
+            return False
+        if pid == self.pid:
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            pass
+        return False
+
+    def fail_orphaned(self, heartbeat_timeout: float) -> int:
+        """
+        Fail queued/running jobs whose owner died: processes on this host that
+        no longer exist, and any owner silent for ``heartbeat_timeout`` seconds
+        (or unknown, e.g. jobs from before owners were recorded).
+        """
+        conn = self._connection()
+        now = time.time()
+        dead = [
+            row["id"] for row in conn.execute("SELECT * FROM job_workers WHERE id != ?", (self.owner,))
+            if row["heartbeat_at"] < now - heartbeat_timeout or self._owner_dead(row["host"], row["pid"])
+        ]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("DELETE FROM job_workers WHERE id = ?", [(owner,) for owner in dead])
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, error = 'Interrupted: worker restarted' "
+                "WHERE status IN ('queued', 'running') AND owner IS NOT ? "
+                "AND (owner IS NULL OR owner NOT IN (SELECT id FROM job_workers))",
+                (now, self.owner),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount
+
+    def purge(self, older_than_seconds: float) -> int:
+        """Delete finished jobs (and their results) older than the retention window"""
+        cursor = self._connection().execute(
+            "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?",
+            (time.time() - older_than_seconds,),
+        )
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._connection().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")
+        return {row["status"]: row["n"] for row in rows}
+
+
+def callback_allowed(url: str, allowed_hosts: List[str]) -> bool:
+    """Callbacks may only go to http(s) URLs on the configured (local) hosts"""
+    parsed = urlparse(url)
+    return parsed.scheme in ("http", "https") and (parsed.hostname or "") in allowed_hosts
+
+
+class JobRunner:
+    """
+    Bounded in-process worker pool over a ``JobStore``.
+
+    ``execute(job_id, prompt, filters, budget)`` is the coroutine doing the work; it
+    records per-service results itself and returns the summary. Submissions
+    beyond ``max_queue`` waiting jobs are refused so the caller can answer 503.
+    Every ``heartbeat_interval`` seconds the runner heartbeats and fails the
+    jobs of processes that stopped heartbeating for ``heartbeat_timeout``.
+    """
+
+    def __init__(self, store: JobStore,
+                 execute: Callable[[str, str, Optional[Dict[str, Any]], Any], Awaitable[Dict[str, Any]]], workers: int = 2, max_queue: int = 100,
+                 callback_timeout: float = 10.0, callback_attempts: int = 3,
+                 heartbeat_interval: float = 15.0, heartbeat_timeout: float = 60.0):
+        self.store = store
+        self.execute = execute
+        self.workers = workers
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.callback_timeout = callback_timeout
+        self.callback_attempts = callback_attempts
+        self._queue: "asyncio.Queue" = asyncio.Queue(maxsize=max_queue)
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [asyncio.ensure_future(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.ensure_future(self._sweep()))
+        logger.info("🧵 Job runner started with %d workers", self.workers)
+
+    def sweep(self) -> int:
+        """Heartbeat, then fail jobs orphaned by dead processes"""
+        self.store.heartbeat()
+        return self.store.fail_orphaned(self.heartbeat_timeout)
+
+    async def _sweep(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                failed = await loop.run_in_executor(None, self.sweep)
+                if failed:
+                    logger.warning("⚠️ Failed %d jobs orphaned by a dead worker", failed)
+            except Exception as e:
+                logger.warning("⚠️ Job heartbeat failed: %s", e)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job_id: str, prompt: str, filters: Optional[Dict[str, Any]], budget: Any = None) -> bool:
+        """Queue a created job; False when the queue is full"""
+        try:
+            self._queue.put_nowait((job_id, prompt, filters, budget))
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    async def _worker(self, index: int):
+        loop = asyncio.get_event_loop()
+        while True:
+            job_id, prompt, filters, budget = await self._queue.get()
+            try:
+                await loop.run_in_executor(None, self.store.mark_running, job_id)
+                summary = await self.execute(job_id, prompt, filters, budget)
+                await loop.run_in_executor(None, self.store.finish, job_id, "succeeded", summary)
+            except asyncio.CancelledError:
+                await loop.run_in_executor(None, self.store.finish, job_id, "failed", None, "Cancelled: shutting down")
+                raise
+            except Exception as e:
+                logger.exception("❌ Job %s failed: %s", job_id, e)
+                await loop.run_in_executor(None, self.store.finish, job_id, "failed", None, str(e))
+            finally:
+                self._queue.task_done()
+            await loop.run_in_executor(None, self._deliver_callback, job_id)
+
+    def _deliver_callback(self, job_id: str):
+        """POST the finished job to its callback URL, retrying with backoff"""
+        job = self.store.get(job_id)
+        if not job or not job["callback_url"]:
+            return
+        for attempt in range(self.callback_attempts):
+            try:
+                response = requests.post(job["callback_url"], json=job, timeout=self.callback_timeout)
+                if response.status_code < 500:
+                    self.store.set_callback_status(job_id, f"delivered ({response.status_code})")
+                    return
+                error = f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                error = str(e)
+            logger.warning("⚠️ Job %s callback attempt %d failed: %s", job_id, attempt + 1, error)
+            time.sleep(2 ** attempt)
+        self.store.set_callback_status(job_id, f"failed: {error}")
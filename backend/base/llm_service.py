@@ -1,24 +1,56 @@
 from abc import ABC, abstractmethod
-from typing import Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import os
+import time
 import logging
+from contextvars import ContextVar
 from .models import GenerationConfig, RetryConfig
+from .prompts import (
+    SYSTEM_PROMPT, REFINE_DIFF_SYSTEM_PROMPT, widget_instructions, refine_diff_request, refine_full_request,
+)
+from .patching import PatchError, apply_unified_diff, dart_structure_problems
+from .usage import USAGE, CHARS_PER_TOKEN
+from .few_shot import few_shot_block
+from .tracing import start_span
+from .metrics import (
+    LLM_PROVIDER_CALL_SECONDS, LLM_PROVIDER_ERRORS, LLM_RETRIES,
+    LLM_POSTPROCESS_SECONDS, LLM_FILE_WRITE_SECONDS, LLM_FALLBACKS, LLM_TOKENS, LLM_COST_USD,
+    LLM_FEW_SHOT_EXAMPLES, LLM_REFINES,
+)
 
 logger = logging.getLogger(__name__)
 
+# Model of the provider call in progress, so usage reported by _make_api_request is attributed to it
+_attempt_model: ContextVar[Optional[str]] = ContextVar("llm_attempt_model", default=None)
+# System message of the request in progress when it is not the generation prompt (diff-mode refines)
+_request_system_prompt: ContextVar[Optional[str]] = ContextVar("llm_request_system_prompt", default=None)
+
 class BaseLLMService(ABC):
     """Abstract base class for LLM services"""
     
+    # Fast models for simple prompts, best first; matched against the provider's model list
+    SMALL_MODELS: Tuple[str, ...] = ()
+    # Prompt tokens for retrieved few-shot examples (<SERVICE>_FEW_SHOT_TOKENS overrides)
+    FEW_SHOT_TOKENS = 1200
+    
     def __init__(self, generation_config: GenerationConfig = None, retry_config: RetryConfig = None):
         self.generation_config = generation_config or GenerationConfig()
         self.retry_config = retry_config or RetryConfig()
         self.model = None
         self.current_model_name = None
+        # Model for prompts classified "simple" (None: every prompt uses current_model_name)
+        self.small_model_name = None
         # Get service type from class name (e.g., "GeminiService" -> "gemini")
         self.service_type = self.__class__.__name__.replace("Service", "").lower()
         # Set widget name based on service type
         self.widget_name = self._get_widget_name()
-        logger.info(f"🚀 Initializing {self.__class__.__name__} with service type: {self.service_type}")
-        logger.info(f"🎯 Widget name will be: {self.widget_name}")
+        # Built on first use, once subclasses have settled widget_name
+        self._system_prompt: Optional[str] = None
+        # prompt -> similar dataset entries ("prompt", "code"); set by the app to enable few-shot examples
+        self.example_retriever: Optional[Callable[[str], List[Dict[str, Any]]]] = None
+        self.few_shot_tokens = int(os.getenv(f"{self.service_type.upper()}_FEW_SHOT_TOKENS", self.FEW_SHOT_TOKENS))
+        logger.info("🚀 Initializing %s (service type %s, widget %s)",
+                    self.__class__.__name__, self.service_type, self.widget_name)
     
     def _get_widget_name(self) -> str:
         """Get the appropriate widget name based on service type"""
@@ -37,8 +69,8 @@ class BaseLLMService(ABC):
         pass
     
     @abstractmethod
-    def _make_api_request(self, prompt: str) -> Optional[str]:
-        """Make a single API request. Returns response text or None if failed."""
+    def _make_api_request(self, prompt: str, model_name: Optional[str] = None) -> Optional[str]:
+        """Make a single API request (``model_name`` defaults to current_model_name) with _current_system_prompt() as the system message. Returns response text or None if failed."""
         pass
     
     @abstractmethod
@@ -46,42 +78,188 @@ class BaseLLMService(ABC):
         """List all available models for the LLM service"""
         pass
     
-    def generate_flutter_code(self, prompt: str) -> Tuple[str, bool, Optional[str]]:
+    def _select_small_model(self, available_models: List[str]) -> Optional[str]:
+        """First SMALL_MODELS entry the provider offers (or <SERVICE>_SMALL_MODEL), unless it is the main model"""
+        override = os.getenv(f"{self.service_type.upper()}_SMALL_MODEL")
+        if override:
+            return override
+        for candidate in self.SMALL_MODELS:
+            for model_name in available_models:
+                if candidate in model_name and model_name != self.current_model_name:
+                    logger.info("🪶 %s small model for simple prompts: %s", self.service_type, model_name)
+                    return model_name
+        return None
+    
+    def model_for(self, complexity: Optional[str] = None) -> Optional[str]:
+        """Model that serves a prompt of the given complexity route"""
+        if complexity == "simple" and self.small_model_name:
+            return self.small_model_name
+        return self.current_model_name
+    
+    def estimate_prompt_tokens(self, prompt: str) -> int:
+        """Approximate input tokens of a generation call, system prompt and few-shot examples included"""
+        examples = self.few_shot_tokens if self.example_retriever else 0
+        return (len(self._get_system_prompt()) + len(prompt) + len("User request: ")) // CHARS_PER_TOKEN + examples
+    
+    def generate_flutter_code(self, prompt: str, complexity: Optional[str] = None,
+                              examples: Optional[Sequence[Dict[str, Any]]] = None) -> Tuple[str, bool, Optional[str]]:
         """
         Generate Flutter/Dart code based on natural language prompt.
+        
+        ``complexity`` ("simple"/"complex", see base/complexity.py) picks the model;
+        a simple prompt whose first attempt fails is retried on the main model.
+        ``examples`` (default: from example_retriever, if set) are similar
+        dataset screens, compressed into few_shot_tokens ahead of the request.
         Returns: (code, success, error_message)
         """
-        logger.info(f"🎨 Starting Flutter code generation with {self.__class__.__name__}")
-        logger.info(f"🔍 Received prompt: {prompt}")
+        logger.debug("🎨 Starting Flutter code generation with %s, prompt: %r", self.__class__.__name__, prompt)
         
         if not self.model:
             logger.error("❌ Model not initialized")
-            return self._get_fallback_response("Model not initialized")
+            return self._get_fallback_response("Model not initialized", reason="not_initialized")
         
-        # Generate the system prompt with social-ethical considerations
-        system_prompt = self._get_system_prompt()
-        full_prompt = f"{system_prompt}\n\nUser request: {prompt}"
+        # Providers send _get_system_prompt() as the (cacheable) system message
+        user_prompt = f"User request: {prompt}"
+        few_shot = self._few_shot_examples(prompt, examples)
+        if few_shot:
+            user_prompt = f"{few_shot}\n\n{user_prompt}"
         
         # Make API request with retry logic
-        response_text = self._make_request_with_retry(full_prompt)
+        response_text = self._make_request_with_retry(user_prompt, self.model_for(complexity))
         
         if not response_text:
             logger.error("❌ Failed to get response from LLM")
-            return self._get_fallback_response("Failed to get response from LLM")
+            return self._get_fallback_response("Failed to get response from LLM", reason="no_response")
         
         # Process the response
         return self._process_response(response_text)
     
-    def _make_request_with_retry(self, prompt: str) -> Optional[str]:
+    def refine_flutter_code(self, code: str, instruction: str) -> Tuple[str, bool, Optional[str], str]:
+        """
+        Apply ``instruction`` to previously generated ``code``.
+        
+        The model is asked for a unified diff, which is applied locally and
+        structure-checked (base/patching.py); output is then proportional to
+        the change rather than the screen. A diff that does not apply, or
+        leaves the code broken, falls back to regenerating the whole widget
+        with the previous code in context.
+        Returns: (code, success, error_message, mode) with mode "patch", "regenerate" or "failed"
+        """
+        if not self.model:
+            logger.error("❌ Model not initialized")
+            return (*self._get_fallback_response("Model not initialized", reason="not_initialized"), "failed")
+        
+        with start_span("llm.refine", service=self.service_type) as span:
+            system_token = _request_system_prompt.set(REFINE_DIFF_SYSTEM_PROMPT)
+            try:
+                diff = self._make_request_with_retry(refine_diff_request(code, instruction))
+            finally:
+                _request_system_prompt.reset(system_token)
+            if diff:
+                try:
+                    patched = apply_unified_diff(code, diff)
+                    problems = dart_structure_problems(patched)
+                    if problems:
+                        raise PatchError(", ".join(problems))
+                    span.set_attribute("mode", "patch")
+                    LLM_REFINES.inc(self.service_type, "patch")
+                    return (*self._process_response(patched), "patch")
+                except PatchError as e:
+                    logger.info("🩹 %s diff not applied (%s), regenerating the full widget", self.service_type, e)
+            
+            span.set_attribute("mode", "regenerate")
+            response_text = self._make_request_with_retry(refine_full_request(code, instruction))
+            if not response_text:
+                logger.error("❌ Failed to get response from LLM")
+                LLM_REFINES.inc(self.service_type, "failed")
+                return (*self._get_fallback_response("Failed to get response from LLM", reason="no_response"), "failed")
+            LLM_REFINES.inc(self.service_type, "regenerate")
+            return (*self._process_response(response_text), "regenerate")
+    
+    def _few_shot_examples(self, prompt: str, examples: Optional[Sequence[Dict[str, Any]]]) -> str:
+        """Retrieved examples compressed to this provider's budget; "" when disabled or none fit"""
+        if self.few_shot_tokens <= 0:
+            return ""
+        if examples is None:
+            if not self.example_retriever:
+                return ""
+            try:
+                with start_span("llm.few_shot_retrieval", service=self.service_type):
+                    examples = self.example_retriever(prompt)
+            except Exception as e:
+                logger.warning("⚠️ Few-shot retrieval failed for %s: %s", self.service_type, e)
+                return ""
+        block, stats = few_shot_block(examples, self.few_shot_tokens)
+        for mode in stats["modes"]:
+            LLM_FEW_SHOT_EXAMPLES.inc(self.service_type, mode)
+        logger.debug("📚 %s few-shot: %d examples, ~%d tokens (%s)",
+                     self.service_type, stats["examples"], stats["tokens"], stats["modes"])
+        return block
+    
+    def _chat_messages(self, prompt: str) -> List[dict]:
+        """OpenAI-style messages: the system prompt of the current request, then the user request"""
+        return [
+            {"role": "system", "content": self._current_system_prompt()},
+            {"role": "user", "content": prompt},
+        ]
+    
+    def _make_request_with_retry(self, prompt: str, model_name: Optional[str] = None) -> Optional[str]:
         """Make API request with retry logic"""
         from .code_processor import CodeProcessor
         
         processor = CodeProcessor()
-        return processor.make_request_with_retry(
-            self._make_api_request, 
-            prompt, 
-            self.retry_config
-        )
+        service = self.service_type
+        attempts = 0
+        
+        def timed_api_request(attempt_prompt: str) -> Optional[str]:
+            nonlocal attempts
+            attempts += 1
+            # Retries escalate from a routed small model to the main one
+            attempt_model = model_name if attempts == 1 and model_name else self.current_model_name
+            start = time.perf_counter()
+            model_token = _attempt_model.set(attempt_model)
+            with start_span("llm.provider_call", service=service, model=str(attempt_model),
+                            attempt=attempts) as span:
+                try:
+                    response = self._make_api_request(attempt_prompt, attempt_model)
+                    span.set_attribute("response_chars", len(response) if response else 0)
+                    return response
+                except Exception:
+                    LLM_PROVIDER_ERRORS.inc(service)
+                    raise
+                finally:
+                    _attempt_model.reset(model_token)
+                    elapsed = time.perf_counter() - start
+                    LLM_PROVIDER_CALL_SECONDS.observe(elapsed, service)
+                    USAGE.record_latency(service, attempt_model, elapsed)
+        
+        with start_span("llm.request_with_retry", service=service, prompt_chars=len(prompt),
+                        max_retries=self.retry_config.max_retries) as span:
+            try:
+                return processor.make_request_with_retry(
+                    timed_api_request, 
+                    prompt, 
+                    self.retry_config
+                )
+            finally:
+                span.set_attribute("attempts", attempts)
+                if attempts > 1:
+                    LLM_RETRIES.inc(service, amount=attempts - 1)
+    
+    def _record_token_usage(self, prompt_tokens: Optional[int], completion_tokens: Optional[int],
+                            cached_tokens: Optional[int] = None):
+        """Count the token usage a provider reported for one call (cached tokens are part of the prompt)"""
+        cost = USAGE.record(self.service_type, _attempt_model.get() or self.current_model_name,
+                            prompt_tokens, completion_tokens, cached_tokens,
+                            self.generation_config.max_output_tokens)
+        if cost:
+            LLM_COST_USD.inc(self.service_type, amount=cost)
+        if prompt_tokens:
+            LLM_TOKENS.inc(self.service_type, "prompt", amount=prompt_tokens)
+        if cached_tokens:
+            LLM_TOKENS.inc(self.service_type, "cached_prompt", amount=cached_tokens)
+        if completion_tokens:
+            LLM_TOKENS.inc(self.service_type, "completion", amount=completion_tokens)
     
     def _process_response(self, response_text: str) -> Tuple[str, bool, Optional[str]]:
         """Process the LLM response and extract code"""
@@ -91,15 +269,19 @@ class BaseLLMService(ABC):
         processor = CodeProcessor()
         file_manager = FileManager(service_type=self.service_type)
         
-        # Clean the response
-        cleaned_response = processor.clean_response(response_text)
-        
-        # Clean and validate the code
-        cleaned_code = processor.clean_code_response(cleaned_response, self.widget_name)
+        with LLM_POSTPROCESS_SECONDS.time(self.service_type):
+            # Clean the response
+            with start_span("postprocess.clean_response", input_chars=len(response_text)):
+                cleaned_response = processor.clean_response(response_text)
+            
+            # Clean and validate the code
+            with start_span("postprocess.clean_code_response", input_chars=len(cleaned_response)):
+                cleaned_code = processor.clean_code_response(cleaned_response, self.widget_name)
         
         # Check if we got fallback code (which means there was an error)
         if "Professional UI Generator" in cleaned_code and "Ready to create beautiful" in cleaned_code:
             logger.warning("⚠️ Received fallback code, generation may have failed")
+            LLM_FALLBACKS.inc(self.service_type, "validation")
             success = False
             error = "Generated code failed validation, using fallback"
         else:
@@ -108,24 +290,31 @@ class BaseLLMService(ABC):
         
         # Write to file
         if cleaned_code:
-            file_written = file_manager.write_dart_file(cleaned_code)
-            logger.info(f"📄 File write result: {'✅ Success' if file_written else '❌ Failed'}")
+            with start_span("file_write", chars=len(cleaned_code)):
+                with LLM_FILE_WRITE_SECONDS.time(self.service_type):
+                    file_written = file_manager.write_dart_file(cleaned_code)
+            if not file_written:
+                logger.warning("📄 Failed to write %s widget file", self.service_type)
         
         return cleaned_code, success, error
     
-    def _get_fallback_response(self, error: str) -> Tuple[str, bool, Optional[str]]:
+    def _get_fallback_response(self, error: str, reason: str = "error") -> Tuple[str, bool, Optional[str]]:
         """Get fallback response when generation fails"""
         from .code_processor import CodeProcessor
         from .file_manager import FileManager
         
+        LLM_FALLBACKS.inc(self.service_type, reason)
         processor = CodeProcessor()
         file_manager = FileManager(service_type=self.service_type)
         
         fallback_code = processor.get_professional_fallback_widget(error, self.widget_name)
         
         # Still try to write the fallback code to file
-        file_written = file_manager.write_dart_file(fallback_code)
-        logger.info(f"📄 Fallback code file write: {'✅ Success' if file_written else '❌ Failed'}")
+        with start_span("file_write", chars=len(fallback_code), fallback=True):
+            with LLM_FILE_WRITE_SECONDS.time(self.service_type):
+                file_written = file_manager.write_dart_file(fallback_code)
+        if not file_written:
+            logger.warning("📄 Failed to write %s fallback widget file", self.service_type)
         
         return fallback_code, False, error
     
@@ -133,221 +322,16 @@ class BaseLLMService(ABC):
         """
         Get the system prompt for Flutter code generation.
         
-        ENHANCED WITH SOCIAL AND ETHICAL CONSIDERATIONS (RO4 Research Validation)
-        
-        This prompt addresses critical accessibility and ethical issues identified through research:
-        - Design homogeneity and pattern repetition (45.45% of respondents)
-        - Poor color contrast violating WCAG standards (38.64%)
-        - Confusing navigation patterns (30.45%)
-        - Unclear labeling (26.82%)
-        - Small font sizes (25.45%)
-        - Culturally inappropriate icons (20.91%)
-        - Reliance on color alone to convey information (20.45%)
-        - Translation challenges (20.45%)
-        - Biased or non-inclusive imagery (19.09%)
-        
-        These enhancements ensure AI-generated interfaces are accessible, inclusive, 
-        and professionally acceptable while maintaining technical accuracy.
+        The static, service-independent rules (base/prompts.py, including the RO4
+        social and ethical requirements) come first so providers can cache them as
+        a shared prefix; only the short widget-name suffix differs per service.
+        Built once per service and sent as the system message, apart from the
+        user request.
         """
-        return f"""You are an expert Flutter/Dart developer specializing in creating beautiful, professional, modern mobile applications using Flutter 3.27.1.
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-⚠️  ABSOLUTE CRITICAL OUTPUT FORMAT REQUIREMENTS ⚠️
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-YOUR RESPONSE MUST:
-✅ Start IMMEDIATELY with: import 'package:flutter/material.dart';
-✅ Contain ONLY executable Dart code
-✅ End with the final closing brace }} of the class
-
-YOUR RESPONSE MUST NOT CONTAIN:
-❌ ANY text before the import statement
-❌ ANY explanations, descriptions, or notes
-❌ ANY markdown code blocks (```, ```dart, etc.)
-❌ ANY comments about design decisions or compliance
-❌ ANY "Key design decisions", "compliance notes", or documentation
-❌ ANY text after the final closing brace
-❌ JSON, YAML, or any other format
-
-WRONG EXAMPLE (DO NOT DO THIS):
-Below is the complete solution that satisfies all requirements.
-**Key design decisions:**
-1. Diverse layout...
-```dart
-import 'package:flutter/material.dart';
-...
-
-CORRECT EXAMPLE (DO THIS):
-import 'package:flutter/material.dart';
-
-class {self.widget_name} extends StatelessWidget {{
-  const {self.widget_name}({{super.key}});
-  ...
-}}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-CRITICAL REQUIREMENTS:
-1. Generate ONLY pure Dart code - NO JSON, NO explanations, NO markdown
-2. Use Flutter 3.27.1 syntax and best practices ONLY
-3. The main widget class MUST be named exactly: {self.widget_name}
-4. Return ONLY the complete Dart code, nothing else
-5. NO text before 'import' statement and NO text after final closing brace
-
-FLUTTER 3.27.1 COMPATIBILITY RULES:
-✅ USE THESE (Flutter 3.27.1 compatible):
-- super.key instead of Key? key in constructors: const {self.widget_name}({{super.key}})
-- MediaQuery.sizeOf(context) instead of MediaQuery.of(context).size
-- Theme.of(context).colorScheme.primary instead of Theme.of(context).primaryColor
-- Theme.of(context).colorScheme.secondary instead of Theme.of(context).accentColor
-- ElevatedButton.styleFrom() with backgroundColor and foregroundColor parameters
-- TextButton.styleFrom() with proper color parameters
-- OutlinedButton.styleFrom() with proper color parameters
-- Icons from material.dart (Icons.home, Icons.search, etc.)
-
-❌ AVOID THESE (deprecated or problematic):
-- Old Key? key syntax: DON'T use {{Key? key}} : super(key: key)
-- MediaQuery.of(context).size - use MediaQuery.sizeOf(context) instead
-- primaryColor, accentColor - use colorScheme instead
-- RaisedButton, FlatButton (removed) - use ElevatedButton, TextButton instead
-- Old button styling syntax
-
-═══════════════════════════════════════════════════════════════════════════════
-🌍 SOCIAL & ETHICAL REQUIREMENTS (RO4 Research-Validated - 9 Critical Issues)
-═══════════════════════════════════════════════════════════════════════════════
-
-1️⃣ DESIGN DIVERSITY (45.45% concern): Use varied layouts, unique cards, diverse colors, different navigation patterns. Avoid repetitive template designs.
-
-2️⃣ WCAG COLOR CONTRAST (38.64%): Text contrast ≥4.5:1 (normal) or ≥3:1 (large). Dark text on light backgrounds, light text on dark backgrounds. No light gray on white.
-
-3️⃣ CLEAR NAVIGATION (30.45%): Standard patterns (BottomNavigationBar, Drawer), clear back buttons (Icons.arrow_back), recognizable icons, consistent placement.
-
-4️⃣ DESCRIPTIVE LABELS (26.82%): Self-explanatory text, tooltips for icon buttons, clear form labels. No generic labels like "Button" or "Item".
-
-5️⃣ ACCESSIBLE FONTS (25.45%): Body ≥16px, Headings ≥20px, Titles ≥24px, Buttons ≥16px. Use Theme.of(context).textTheme.
-
-6️⃣ NEUTRAL ICONS (20.91%): Use Material Icons (Icons.home, Icons.search, Icons.settings). Avoid religious, cultural, or region-specific symbols.
-
-7️⃣ MULTIPLE CUES (20.45%): Never use color alone. Combine color + icons + text + patterns. Example: success = green + checkmark + "Success" text.
-
-8️⃣ INTERNATIONALIZATION (20.45%): Flexible layouts for text expansion, TextOverflow.ellipsis, no fixed-width text containers, RTL-ready designs.
-
-9️⃣ INCLUSIVE DESIGN (19.09%): Abstract/geometric visuals, neutral placeholders, diverse color palettes. No stereotypes or demographic assumptions.
-
-═══════════════════════════════════════════════════════════════════════════════
-END OF SOCIAL AND ETHICAL CONSIDERATIONS
-═══════════════════════════════════════════════════════════════════════════════
-
-DESIGN PRINCIPLES:
-🎨 VISUAL DESIGN:
-- Use modern Material Design 3 with beautiful, WCAG-compliant color schemes
-- Implement proper spacing (8, 12, 16, 20, 24, 32 pixel increments) for accessibility
-- Add subtle shadows, rounded corners (BorderRadius.circular(8-16))
-- Use gradient backgrounds where appropriate (ensuring sufficient text contrast)
-- Include Material Icons (Icons.* from material.dart) - culturally neutral
-- Proper elevation with Card widgets (elevation: 2-8)
-- Ensure minimum touch target size of 48x48 pixels for interactive elements
-
-🏗️ LAYOUT & STRUCTURE:
-- Always start with Scaffold
-- Include AppBar with custom styling and clear navigation
-- Use proper padding with const EdgeInsets (minimum 16.0 for readability)
-- Implement scrollable content with SingleChildScrollView or ListView
-- Create responsive layouts that work across screen sizes
-- Use Column, Row, Stack appropriately with proper spacing
-
-🎯 INTERACTIVE ELEMENTS:
-- ElevatedButton with proper styling, clear labels, and sufficient contrast
-- TextFormField with comprehensive InputDecoration and clear labels
-- InkWell or GestureDetector with visual feedback
-- Proper const constructors everywhere possible
-- Tooltip widgets for icon-only buttons
-- Clear visual feedback for all interactive states
-
-📱 PROFESSIONAL FEATURES:
-- Beautiful Cards with elevation and border radius (varying designs)
-- ListTile for list items with clear labels and descriptions
-- Proper color schemes with WCAG-compliant combinations
-- SizedBox for proper spacing and layout
-- Center, Padding, Container for accessible layout
-- Column/Row with proper MainAxisAlignment and CrossAxisAlignment
-
-CODE STRUCTURE RULES:
-1. Start with: import 'package:flutter/material.dart';
-2. Class declaration: class {self.widget_name} extends StatelessWidget
-3. Constructor: const {self.widget_name}({{super.key}});
-4. Build method: @override Widget build(BuildContext context)
-5. Return a complete, functional widget tree
-6. Use const constructors wherever possible
-7. Proper indentation (2 spaces)
-8. Include realistic sample data where needed
-9. Make it production-ready, accessible, and error-free
-10. Apply ALL social and ethical considerations listed above
-
-EXAMPLE STRUCTURE (with accessibility enhancements):
-```dart
-import 'package:flutter/material.dart';
-
-class {self.widget_name} extends StatelessWidget {{
-  const {self.widget_name}({{super.key}});
-
-  @override
-  Widget build(BuildContext context) {{
-    return Scaffold(
-      appBar: AppBar(
-        title: const Text(
-          'Clear Descriptive Title',  // Clear labeling
-          style: TextStyle(fontSize: 20.0),  // Accessible font size
-        ),
-        backgroundColor: const Color(0xFF1976D2),  // Good contrast
-        leading: IconButton(
-          icon: const Icon(Icons.arrow_back),  // Clear navigation
-          tooltip: 'Go Back',  // Tooltip for accessibility
-          onPressed: () {{}},
-        ),
-      ),
-      body: SingleChildScrollView(
-        child: Padding(
-          padding: const EdgeInsets.all(16.0),  // Adequate spacing
-          child: Column(
-            crossAxisAlignment: CrossAxisAlignment.start,
-            children: [
-              // Diverse, creative UI components
-              // WCAG-compliant colors
-              // Clear labels and descriptions
-              // Culturally neutral icons
-              // Multiple visual cues (not just color)
-            ],
-          ),
-        ),
-      ),
-    );
-  }}
-}}
-```
-
-CRITICAL REMINDERS:
-✅ BE CREATIVE - Avoid repetitive patterns (45.45% concern)
-✅ CHECK CONTRAST - Ensure WCAG compliance (38.64% concern)
-✅ CLEAR NAVIGATION - Intuitive and consistent (30.45% concern)
-✅ DESCRIPTIVE LABELS - Clear and consistent (26.82% concern)
-✅ READABLE TEXT - Minimum 16px body text (25.45% concern)
-✅ NEUTRAL ICONS - Culturally appropriate (20.91% concern)
-✅ MULTIPLE CUES - Not color alone (20.45% concern)
-✅ FLEXIBLE LAYOUT - Support internationalization (20.45% concern)
-✅ INCLUSIVE DESIGN - Diverse and unbiased (19.09% concern)
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-⚠️  FINAL OUTPUT FORMAT REMINDER ⚠️
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-Return ONLY pure Dart code:
-- First line: import 'package:flutter/material.dart';
-- Last line: }} (final closing brace of the class)
-- NO text before import, NO text after final brace
-- NO markdown blocks (```), NO explanations, NO descriptions
-- NO "Key design decisions", NO "compliance notes", NO documentation
-- The code must implement ALL social and ethical considerations above
-
-Your entire response = executable Dart code only.
-"""
\ No newline at end of file
+        if self._system_prompt is None:
+            self._system_prompt = f"{SYSTEM_PROMPT}\n\n{widget_instructions(self.widget_name)}"
+        return self._system_prompt
+    
+    def _current_system_prompt(self) -> str:
+        """System message of the request in progress: the generation prompt unless a diff-mode refine set its own"""
+        return _request_system_prompt.get() or self._get_system_prompt()
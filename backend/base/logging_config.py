@@ -0,0 +1,145 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+# Correlation id of the request being handled ("-" outside requests)
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+# Whether DEBUG records of the current request are kept (see DebugSamplingFilter)
+debug_sampled_var: ContextVar[bool] = ContextVar("debug_sampled", default=False)
+
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_debug_sample_rate = 0.0
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the request id; runs on the logging thread, before queueing"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """
+    Keep DEBUG records only for sampled requests.
+
+    Sampling is decided once per request (``start_request``), so a sampled
+    request keeps its whole debug trail instead of scattered lines.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or debug_sampled_var.get()
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that defers message formatting to the listener thread.
+
+    The stock ``prepare`` renders the message on the calling thread; here the
+    record is queued as-is, so request threads only pay for creating it.
+    Arguments must not be mutated after the call, which holds for the
+    strings and numbers passed by this codebase.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, request id, message and extras"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def start_request(request_id: str):
+    """Bind a request id to the current context and decide its debug sampling"""
+    request_id_var.set(request_id)
+    debug_sampled_var.set(_debug_sample_rate >= 1.0 or (_debug_sample_rate > 0 and random.random() < _debug_sample_rate))
+
+
+def configure_logging(
+    level: Optional[str] = None,
+    log_format: Optional[str] = None,
+    debug_sample_rate: Optional[float] = None,
+    stream=None,
+):
+    """
+    Route all logging through a queue to a background writer thread.
+
+    Settings default to LOG_LEVEL (INFO), LOG_FORMAT (json or text) and
+    LOG_DEBUG_SAMPLE_RATE (0): the fraction of requests whose DEBUG records
+    are written even when the level is above DEBUG. Safe to call again;
+    the previous listener is stopped first.
+    """
+    global _listener, _debug_sample_rate
+
+    level_name = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    log_format = (log_format or os.getenv("LOG_FORMAT", "json")).lower()
+    _debug_sample_rate = float(
+        debug_sample_rate if debug_sample_rate is not None else os.getenv("LOG_DEBUG_SAMPLE_RATE", "0")
+    )
+
+    numeric_level = getattr(logging, level_name, logging.INFO)
+    if numeric_level == logging.DEBUG:
+        _debug_sample_rate = 1.0
+    elif _debug_sample_rate > 0:
+        # Let DEBUG records reach the handler, which drops the unsampled ones
+        numeric_level = logging.DEBUG
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    if log_format == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(
+            "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+        ))
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+    queue_handler.addFilter(DebugSamplingFilter())
+
+    if _listener is not None:
+        _listener.stop()
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=False)
+    _listener.start()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(numeric_level)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
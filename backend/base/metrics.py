@@ -0,0 +1,310 @@
+import time
+import bisect
+import weakref
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Bucket sets (seconds)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+QUEUE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PROVIDER_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+SCORE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 1.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _ShardedMetric:
+    """
+    Base for metrics whose cells live in per-thread shards.
+
+    Each thread writes to its own ``{label values tuple: cell}`` dict without
+    taking a lock; shards are registered once per thread and summed at scrape
+    time. Shards of threads that have exited (main.py creates a fresh executor
+    per request) are folded into a retired total so the list does not grow.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: List[Tuple[weakref.ref, Dict[tuple, list]]] = []
+        self._retired: Dict[tuple, list] = {}
+
+    def _new_cell(self) -> list:
+        raise NotImplementedError
+
+    def _cells(self) -> Dict[tuple, list]:
+        try:
+            return self._local.cells
+        except AttributeError:
+            cells: Dict[tuple, list] = {}
+            with self._lock:
+                self._shards.append((weakref.ref(threading.current_thread()), cells))
+            self._local.cells = cells
+            return cells
+
+    def _cell(self, labels: tuple) -> list:
+        cells = self._cells()
+        cell = cells.get(labels)
+        if cell is None:
+            if len(labels) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+            cell = cells[labels] = self._new_cell()
+        return cell
+
+    @staticmethod
+    def _merge(into: Dict[tuple, list], cells: Dict[tuple, list]):
+        for labels, cell in list(cells.items()):
+            total = into.get(labels)
+            if total is None:
+                into[labels] = list(cell)
+            else:
+                for i, value in enumerate(cell):
+                    total[i] += value
+
+    def collect(self) -> Dict[tuple, list]:
+        """Sum of all shards, keyed by label values"""
+        with self._lock:
+            live = []
+            for ref, cells in self._shards:
+                thread = ref()
+                if thread is None or not thread.is_alive():
+                    self._merge(self._retired, cells)
+                else:
+                    live.append((ref, cells))
+            self._shards = live
+            totals = {labels: list(cell) for labels, cell in self._retired.items()}
+            for _, cells in live:
+                self._merge(totals, cells)
+        return totals
+
+
+class Counter(_ShardedMetric):
+    """Monotonic counter: ``REQUESTS.inc("groq", "success")``"""
+
+    kind = "counter"
+
+    def _new_cell(self) -> list:
+        return [0.0]
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._cell(labels)[0] += amount
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(cell[0])}"
+            for labels, cell in sorted(self.collect().items())
+        ]
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: "Histogram", labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class Histogram(_ShardedMetric):
+    """
+    Fixed-bucket histogram: ``LATENCY.observe(seconds, "groq")``.
+
+    A cell is the per-bucket counts (the last one is +Inf) followed by the sum;
+    cumulative counts are only computed when rendering.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = FAST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_cell(self) -> list:
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value: float, *labels: str):
+        cell = self._cell(labels)
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def time(self, *labels: str) -> _Timer:
+        """Context manager observing the elapsed wall time"""
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        lines = []
+        bounds = self.buckets + (float("inf"),)
+        names = self.labelnames + ("le",)
+        for labels, cell in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(bounds, cell):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(cell[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Gauge read from a callback at scrape time (float, or {label values tuple: float})"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._function: Optional[Callable[[], object]] = None
+
+    def set_function(self, function: Callable[[], object]):
+        self._function = function
+
+    def render(self) -> List[str]:
+        if self._function is None:
+            return []
+        try:
+            value = self._function()
+        except Exception:
+            return []
+        if value is None:
+            return []
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}"
+            for labels, v in sorted(value.items())
+        ]
+
+
+class MetricsRegistry:
+    """Holds the metrics and renders them in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = FAST_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# LLM providers
+LLM_REQUESTS = REGISTRY.counter(
+    "llm_requests_total", "Generation requests per service and outcome", ("service", "outcome"))
+LLM_QUEUE_SECONDS = REGISTRY.histogram(
+    "llm_queue_seconds", "Time from submission to a worker picking up the generation", ("service",), QUEUE_BUCKETS)
+LLM_GENERATION_SECONDS = REGISTRY.histogram(
+    "llm_generation_seconds", "End-to-end generation time per service", ("service",), PROVIDER_BUCKETS)
+LLM_PROVIDER_CALL_SECONDS = REGISTRY.histogram(
+    "llm_provider_call_seconds", "Single provider API call time (each retry attempt)", ("service",), PROVIDER_BUCKETS)
+LLM_PROVIDER_ERRORS = REGISTRY.counter(
+    "llm_provider_errors_total", "Provider API calls that raised", ("service",))
+LLM_RETRIES = REGISTRY.counter(
+    "llm_retries_total", "Extra attempts made by make_request_with_retry", ("service",))
+LLM_POSTPROCESS_SECONDS = REGISTRY.histogram(
+    "llm_postprocess_seconds", "CodeProcessor cleaning and validation time", ("service",))
+LLM_FILE_WRITE_SECONDS = REGISTRY.histogram(
+    "llm_file_write_seconds", "Time writing the generated widget file", ("service",))
+LLM_FALLBACKS = REGISTRY.counter(
+    "llm_fallback_total", "Responses replaced by the fallback widget", ("service", "reason"))
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "Tokens reported by the providers", ("service", "kind"))
+LLM_COST_USD = REGISTRY.counter(
+    "llm_cost_usd_total", "Provider cost at list price (base/usage.py), priced models only", ("service",))
+LLM_BUDGET_DECISIONS = REGISTRY.counter(
+    "llm_budget_decisions_total", "Per-request budget decisions per service (run, downgrade, skip)",
+    ("service", "decision"))
+LLM_FEW_SHOT_EXAMPLES = REGISTRY.counter(
+    "llm_few_shot_examples_total", "Retrieved examples per service and compression (full, trimmed, signature, dropped)",
+    ("service", "mode"))
+LLM_REFINES = REGISTRY.counter(
+    "llm_refine_total", "Refinements per service and how they were applied (patch, regenerate, failed)",
+    ("service", "mode"))
+LLM_ROUTE_REQUESTS = REGISTRY.counter(
+    "llm_route_requests_total", "Generations per service, complexity route and outcome", ("service", "route", "outcome"))
+LLM_ROUTE_SECONDS = REGISTRY.histogram(
+    "llm_route_generation_seconds", "Generation time per service and complexity route", ("service", "route"),
+    PROVIDER_BUCKETS)
+
+ROUTING_DECISIONS = REGISTRY.counter(
+    "routing_decisions_total", "Generations answered by the retriever alone or by the full fan-out", ("route",))
+SINGLE_FLIGHT = REGISTRY.counter(
+    "single_flight_requests_total", "Generation requests that started (leader) or joined (follower) a flight",
+    ("endpoint", "role"))
+
+# Admission control
+ADMISSION_WAIT_SECONDS = REGISTRY.histogram(
+    "admission_wait_seconds", "Time generations waited for an admission slot", ("priority",), QUEUE_BUCKETS)
+ADMISSION_REJECTED = REGISTRY.counter(
+    "admission_rejected_total", "Generations refused with 503 (queue_full or timeout)", ("priority", "reason"))
+
+# Retriever
+RETRIEVER_SECONDS = REGISTRY.histogram(
+    "retriever_search_seconds", "Training model retrieval time", ("mode",))
+RETRIEVER_TOP_SCORE = REGISTRY.histogram(
+    "retriever_top_score", "Cosine similarity of the best retrieved match", (), SCORE_BUCKETS)
+
+# HTTP
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "HTTP requests per route and status", ("method", "route", "status"))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_seconds", "Time to response headers per route", ("route",), QUEUE_BUCKETS)
+
+# Process
+THREADS = REGISTRY.gauge("process_threads", "Live Python threads")
+THREADS.set_function(threading.active_count)
@@ -1,18 +1,97 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Union
 from pydantic import BaseModel, Field
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class GenerationBudget(BaseModel):
+    """Per-request limits; providers that would exceed them are downgraded to their small model or skipped"""
+    max_tokens: Optional[int] = Field(None, ge=1, description="Estimated prompt + completion tokens across all providers")
+    max_cost_usd: Optional[float] = Field(None, gt=0, description="Estimated cost across all providers, at list price")
+    max_latency_ms: Optional[float] = Field(None, gt=0, description="Mean observed call latency allowed per provider")
+
 class PromptRequest(BaseModel):
     """Request model for UI generation prompts"""
     prompt: str = Field(..., min_length=1, description="Natural language description of the UI to generate")
+    filters: Optional[Dict[str, Union[str, List[str]]]] = Field(
+        None,
+        description="Training model metadata filters (category, layout_type, tags, components)"
+    )
+    budget: Optional[GenerationBudget] = Field(None, description="Token, cost and latency limits for this generation")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "prompt": "Create a login screen with email and password fields",
+                "budget": {"max_tokens": 12000, "max_cost_usd": 0.01}
+            }
+        }
+
+class JobRequest(PromptRequest):
+    """Request model for asynchronous generation jobs"""
+    callback_url: Optional[str] = Field(
+        None,
+        description="URL the finished job is POSTed to (hosts limited by JOB_CALLBACK_ALLOWED_HOSTS)"
+    )
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "prompt": "Create a login screen with email and password fields",
+                "callback_url": "http://localhost:9000/generation-done"
+            }
+        }
+
+class BatchRequest(BaseModel):
+    """Request model for bulk generation of many prompts in one call"""
+    requests: List[PromptRequest] = Field(..., min_length=1, description="Prompts to generate, results are keyed by index")
+    services: Optional[List[str]] = Field(
+        None,
+        description="Services to run for every prompt (default: all initialized services)"
+    )
+    include_training_model: bool = Field(True, description="Also answer each prompt from the training model")
     
     class Config:
         json_schema_extra = {
             "example": {
-                "prompt": "Create a login screen with email and password fields"
+                "requests": [
+                    {"prompt": "Create a login screen with email and password fields"},
+                    {"prompt": "Settings page with toggles for notifications and dark mode"}
+                ],
+                "services": ["groq", "gemini"]
+            }
+        }
+
+class RetrievalRequest(BaseModel):
+    """Request model for top-k training model retrieval"""
+    prompt: str = Field(..., min_length=1, description="Natural language description of the UI to find")
+    top_k: int = Field(5, ge=1, le=100, description="Number of results to return")
+    threshold: float = Field(0.0, ge=-1.0, le=1.0, description="Minimum cosine similarity")
+    filters: Optional[Dict[str, Union[str, List[str]]]] = Field(
+        None,
+        description="Metadata filters: category, layout_type (any of), tags, components (all of)"
+    )
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "prompt": "Dashboard with a bottom navigation bar",
+                "top_k": 5,
+                "filters": {"layout_type": "grid", "components": ["BottomNavigationBar"]}
+            }
+        }
+
+class RefineRequest(BaseModel):
+    """Request model for incremental edits of a previous generation"""
+    result_id: str = Field(..., min_length=1, description="result_id returned by a previous generation or refinement")
+    instruction: str = Field(..., min_length=1, description="What to change in that code")
+    service: Optional[str] = Field(None, description="Service to refine with (default: the one that produced the result)")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "result_id": "3f2b9c0e8a7d4e1f9b6c5a4d3e2f1a0b",
+                "instruction": "Make the login button full width and add a 'Forgot password?' link below it"
             }
         }
 
@@ -0,0 +1,186 @@
+import re
+from difflib import SequenceMatcher
+from typing import List, NamedTuple, Optional
+
+_HUNK_HEADER_RE = re.compile(r"^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@")
+_FENCE_RE = re.compile(r"^```")
+_WIDGET_CLASS_RE = re.compile(r"\bclass\s+\w+\s+extends\s+(StatelessWidget|StatefulWidget)\b")
+
+
+class PatchError(ValueError):
+    """The diff is malformed or does not apply to the code"""
+
+
+class Hunk(NamedTuple):
+    old: List[str]
+    new: List[str]
+    old_start: Optional[int]  # 1-based, as stated by the diff (often wrong in LLM output)
+
+
+def parse_unified_diff(diff: str) -> List[Hunk]:
+    """
+    Hunks of a unified diff, tolerating LLM habits: markdown fences, missing
+    or wrong line numbers, and context lines without their leading space.
+    Anything after a closing fence is ignored.
+    """
+    hunks: List[Hunk] = []
+    old: List[str] = []
+    new: List[str] = []
+    start: Optional[int] = None
+    in_hunk = False
+
+    def close():
+        if old or new:
+            hunks.append(Hunk(old[:], new[:], start))
+        old.clear()
+        new.clear()
+
+    for line in diff.splitlines():
+        if _FENCE_RE.match(line):
+            if in_hunk:
+                close()
+                in_hunk = False
+            continue
+        if line.startswith("\\"):
+            continue
+        header = _HUNK_HEADER_RE.match(line)
+        if header or line.startswith("@@"):
+            close()
+            start = int(header.group(1)) if header else None
+            in_hunk = True
+            continue
+        if line.startswith(("--- ", "+++ ")) and not (old or new):
+            continue
+        if line.startswith("+"):
+            new.append(line[1:])
+        elif line.startswith("-"):
+            old.append(line[1:])
+        elif line.startswith(" "):
+            old.append(line[1:])
+            new.append(line[1:])
+        elif in_hunk:
+            old.append(line)
+            new.append(line)
+    close()
+
+    # Trailing blank "context" picked up after the last change
+    hunks = [Hunk(*_trim_blank_tail(h.old, h.new), h.old_start) for h in hunks]
+    if not any(h.old != h.new for h in hunks):
+        raise PatchError("Diff contains no changes")
+    return hunks
+
+
+def _trim_blank_tail(old: List[str], new: List[str]):
+    while old and new and not old[-1].strip() and not new[-1].strip():
+        old, new = old[:-1], new[:-1]
+    return old, new
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip(" "))
+
+
+def _shift(line: str, shift: int) -> str:
+    return " " * shift + line if shift > 0 else line[min(-shift, _indent(line)):]
+
+
+def _reindent(matched: List[str], old: List[str], new: List[str]) -> List[str]:
+    """``new`` for a block matched ignoring indentation: unchanged lines keep the code's
+    text, changed ones move by the indentation offset of the old line they replace"""
+    out = []
+    shift = _indent(matched[0]) - _indent(old[0])
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+        if tag == "equal":
+            out.extend(matched[i1:i2])
+            shift = _indent(matched[i2 - 1]) - _indent(old[i2 - 1])
+            continue
+        if i2 > i1:
+            shift = _indent(matched[i1]) - _indent(old[i1])
+        out.extend(_shift(line, shift) for line in new[j1:j2])
+    return out
+
+
+def _find(lines: List[str], block: List[str], expected: int, strict: bool) -> Optional[int]:
+    """Start of the occurrence of ``block`` closest to ``expected``"""
+    normalize = (lambda s: s.rstrip()) if strict else (lambda s: s.strip())
+    target = [normalize(line) for line in block]
+    first = target[0]
+    positions = [
+        i for i in range(len(lines) - len(block) + 1)
+        if normalize(lines[i]) == first and [normalize(line) for line in lines[i:i + len(block)]] == target
+    ]
+    if not positions:
+        return None
+    return min(positions, key=lambda i: abs(i - expected))
+
+
+def apply_unified_diff(code: str, diff: str) -> str:
+    """
+    Apply a unified diff by locating each hunk's old lines in ``code``.
+
+    Hunks are matched by content (exactly, then ignoring indentation) and the
+    occurrence nearest the stated line number wins, so wrong line counts in
+    model output do not matter. After an indentation-insensitive match the
+    new lines are re-indented to the code's (see _reindent). Raises PatchError.
+    """
+    lines = code.splitlines()
+    offset = 0
+    for number, hunk in enumerate(parse_unified_diff(diff), 1):
+        if not hunk.old:
+            raise PatchError(f"Hunk {number} has no context lines to anchor it")
+        expected = (hunk.old_start - 1 + offset) if hunk.old_start else 0
+        position = _find(lines, hunk.old, expected, strict=True)
+        new = hunk.new
+        if position is None:
+            position = _find(lines, hunk.old, expected, strict=False)
+            if position is None:
+                raise PatchError(f"Hunk {number} does not match the code: {hunk.old[0].strip()[:60]!r}")
+            new = _reindent(lines[position:position + len(hunk.old)], hunk.old, new)
+        lines[position:position + len(hunk.old)] = new
+        offset += len(new) - len(hunk.old)
+    return "\n".join(lines) + ("\n" if code.endswith("\n") else "")
+
+
+def _strip_strings_and_comments(code: str) -> str:
+    """Dart source with string literals and comments blanked out"""
+    out = []
+    i, n = 0, len(code)
+    while i < n:
+        if code.startswith("//", i):
+            end = code.find("\n", i)
+            i = n if end == -1 else end
+        elif code.startswith("/*", i):
+            end = code.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+        elif code[i] in "'\"":
+            quote = code[i] * 3 if code.startswith(code[i] * 3, i) else code[i]
+            raw = i > 0 and code[i - 1] == "r"
+            j = i + len(quote)
+            while j < n and not code.startswith(quote, j):
+                j += 2 if code[j] == "\\" and not raw else 1
+            i = j + len(quote)
+        else:
+            out.append(code[i])
+            i += 1
+    return "".join(out)
+
+
+def dart_structure_problems(code: str) -> List[str]:
+    """Cheap structural checks of a patched widget; an empty list means it looks complete"""
+    problems = []
+    if "package:flutter/" not in code:
+        problems.append("missing Flutter import")
+    if not _WIDGET_CLASS_RE.search(code):
+        problems.append("no widget class")
+    depth = {"{": 0, "(": 0, "[": 0}
+    closing = {"}": "{", ")": "(", "]": "["}
+    for char in _strip_strings_and_comments(code):
+        if char in depth:
+            depth[char] += 1
+        elif char in closing:
+            depth[closing[char]] -= 1
+            if depth[closing[char]] < 0:
+                problems.append(f"unbalanced '{char}'")
+                break
+    problems.extend(f"unclosed '{opening}'" for opening, count in depth.items() if count > 0)
+    return problems
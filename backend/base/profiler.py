@@ -0,0 +1,125 @@
+import re
+import sys
+import time
+import threading
+from collections import Counter
+from typing import Any, Dict, Optional
+
+# Leaf functions of threads that are parked, not working (Condition.wait,
+# the event loop's selector, QueueListener.dequeue, Thread.join)
+IDLE_LEAVES = {"wait", "select", "dequeue", "_wait_for_tstate_lock"}
+
+_POOL_SUFFIX_RE = re.compile(r"_\d+$")
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler over every thread of the process.
+
+    A daemon thread reads ``sys._current_frames()`` every ``interval`` seconds
+    and counts each stack in collapsed form (``thread;outer;...;leaf``), which
+    flamegraph.pl and speedscope read directly. The event loop thread and the
+    executor threads are all covered; executor threads are merged per pool
+    (``ThreadPoolExecutor-3_1`` -> ``ThreadPoolExecutor-3``). Frames are
+    labelled once per code object, so a sample costs one dict lookup per frame.
+    """
+
+    def __init__(self, interval: float = 0.01, include_idle: bool = False, max_depth: int = 128):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.duration = 0.0
+        self.sampler_cpu = 0.0
+        self._labels: Dict[Any, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            filename = code.co_filename.rsplit("/", 2)
+            label = f"{code.co_name} ({'/'.join(filename[-2:])}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _sample(self):
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            if not self.include_idle and frame.f_code.co_name in IDLE_LEAVES:
+                continue
+            labels = []
+            while frame is not None and len(labels) < self.max_depth:
+                labels.append(self._label(frame.f_code))
+                frame = frame.f_back
+            labels.append(_POOL_SUFFIX_RE.sub("", names.get(ident, f"thread-{ident}")))
+            labels.reverse()
+            self.stacks[";".join(labels)] += 1
+        self.samples += 1
+
+    def _run(self):
+        cpu_start = time.thread_time()
+        next_tick = time.perf_counter()
+        while not self._stop.is_set():
+            self._sample()
+            next_tick += self.interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                next_tick = time.perf_counter()
+        self.sampler_cpu = time.thread_time() - cpu_start
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - (self.started_at or time.perf_counter())
+
+    def collapsed(self) -> str:
+        """Collapsed stacks, one ``stack count`` line each, heaviest first"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self, top: int = 25) -> Dict[str, Any]:
+        """Sample counts, the hottest leaf frames and the sampler's own CPU cost"""
+        leaves: Counter = Counter()
+        threads: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            threads[frames[0]] += count
+            leaves[frames[-1]] += count
+        total = sum(self.stacks.values())
+        return {
+            "duration_s": round(self.duration, 3),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "stack_samples": total,
+            "sampler_cpu_s": round(self.sampler_cpu, 4),
+            "threads": dict(threads.most_common()),
+            "top_leaves": [
+                {"frame": frame, "samples": count, "share": round(count / total, 4) if total else 0.0}
+                for frame, count in leaves.most_common(top)
+            ],
+        }
+
+
+_profile_lock = threading.Lock()
+
+
+def try_acquire_profile() -> bool:
+    """Only one profile runs at a time; returns False when one is in progress"""
+    return _profile_lock.acquire(blocking=False)
+
+
+def release_profile():
+    _profile_lock.release()
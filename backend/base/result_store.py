@@ -0,0 +1,82 @@
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id TEXT PRIMARY KEY,
+    service TEXT NOT NULL,
+    widget_name TEXT,
+    prompt TEXT NOT NULL,
+    code TEXT NOT NULL,
+    parent_id TEXT,
+    mode TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_created ON results (created_at);
+"""
+
+
+class ResultStore:
+    """
+    SQLite-backed generated code, addressable by result id so /refine can edit it.
+
+    Same connection handling as ``JobStore``: one connection per thread, WAL
+    mode. ``mode`` says how the code was produced ("generate", "patch" or
+    "regenerate") and ``parent_id`` links a refinement to the result it edited.
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save(self, service: str, widget_name: Optional[str], prompt: str, code: str,
+             parent_id: Optional[str] = None, mode: str = "generate") -> str:
+        result_id = uuid.uuid4().hex
+        self._connection().execute(
+            "INSERT INTO results (id, service, widget_name, prompt, code, parent_id, mode, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (result_id, service, widget_name, prompt, code, parent_id, mode, time.time()),
+        )
+        return result_id
+
+    def get(self, result_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute("SELECT * FROM results WHERE id = ?", (result_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "result_id": row["id"],
+            "service": row["service"],
+            "widget_name": row["widget_name"],
+            "prompt": row["prompt"],
+            "code": row["code"],
+            "parent_id": row["parent_id"],
+            "mode": row["mode"],
+            "created_at": row["created_at"],
+        }
+
+    def purge(self, older_than_seconds: float) -> int:
+        """Delete results older than the retention window"""
+        cursor = self._connection().execute(
+            "DELETE FROM results WHERE created_at < ?", (time.time() - older_than_seconds,)
+        )
+        return cursor.rowcount
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _Broadcast:
+    """Event history of one in-flight stream; subscribers replay it, then follow live"""
+
+    def __init__(self):
+        self.events: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Condition()
+
+    async def publish(self, event: Any):
+        self.events.append(event)
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def finish(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        position = 0
+        while True:
+            while position < len(self.events):
+                yield self.events[position]
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            async with self._changed:
+                await self._changed.wait_for(lambda: position < len(self.events) or self.done)
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical work onto one execution.
+
+    ``do`` shares the result of one coroutine among every caller that arrives
+    while it is running; ``stream`` does the same for an async iterator,
+    replaying the events already produced to late joiners. Work runs in its
+    own task, so a leader disconnecting does not cancel it for the others.
+    Nothing is cached: once the work finishes, the next caller starts afresh.
+    All methods must be called from the event loop thread.
+    """
+
+    def __init__(self, name: str = "default"):
+        self.name = name
+        self._calls: Dict[Hashable, "asyncio.Task"] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: Hashable, work: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Result of ``work()``, run once per key at a time; the flag is True for followers"""
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.followers += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(work())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(self._calls, key, done))
+        return await asyncio.shield(task), shared
+
+    async def stream(self, key: Hashable, source: Callable[[], AsyncIterator[Any]],
+                     admit: Optional[Callable[[], Awaitable[Any]]] = None) -> Tuple[AsyncIterator[Any], bool]:
+        """
+        Iterator over the events of ``source()``, produced once per key at a time.
+
+        ``admit`` (e.g. taking an admission slot) runs only for the caller that
+        becomes the leader, in the producing task before ``source`` starts;
+        the leader waits for it and gets its exception, followers that joined
+        meanwhile get that exception as the stream's error.
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is not None:
+            self.followers += 1
+            return broadcast.subscribe(), True
+
+        self.leaders += 1
+        broadcast = _Broadcast()
+        self._streams[key] = broadcast
+        admitted = asyncio.get_event_loop().create_future()
+        task = asyncio.ensure_future(self._produce(broadcast, source, admit, admitted))
+        task.add_done_callback(lambda done: self._forget(self._streams, key, broadcast))
+        await asyncio.shield(admitted)
+        return broadcast.subscribe(), False
+
+    @staticmethod
+    async def _produce(broadcast: _Broadcast, source: Callable[[], AsyncIterator[Any]],
+                       admit: Optional[Callable[[], Awaitable[Any]]], admitted: "asyncio.Future"):
+        try:
+            if admit is not None:
+                await admit()
+        except Exception as e:
+            if not admitted.cancelled():
+                admitted.set_exception(e)
+                # Retrieved by the leader unless it went away while waiting
+                admitted.add_done_callback(lambda future: future.exception())
+            await broadcast.finish(e)
+            return
+        if not admitted.cancelled():
+            admitted.set_result(None)
+
+        try:
+            async for event in source():
+                await broadcast.publish(event)
+        except Exception as e:
+            logger.error("❌ Coalesced stream failed: %s", e)
+            await broadcast.finish(e)
+            return
+        await broadcast.finish()
+
+    @staticmethod
+    def _forget(registry: Dict[Hashable, Any], key: Hashable, entry: Any):
+        if registry.get(key) is entry:
+            del registry[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._calls) + len(self._streams),
+            "leaders": self.leaders,
+            "followers": self.followers,
+        }
@@ -0,0 +1,302 @@
+import os
+import json
+import time
+import queue
+import random
+import logging
+import threading
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Span being recorded in the current context (None outside traced work)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    A timed operation with attributes, in the OpenTelemetry data model.
+
+    Ids are kept as ints and only hex-encoded on export; ``to_otlp`` emits the
+    OTLP/JSON span shape so exported files can be replayed into a collector.
+    """
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+                 "attributes", "events", "status", "status_message", "_token")
+
+    def __init__(self, name: str, trace_id: int, parent_id: Optional[int], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = random.getrandbits(64)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.events: List[Tuple[int, str, Dict[str, Any]]] = []
+        self.status = "UNSET"
+        self.status_message: Optional[str] = None
+        self._token = None
+
+    @property
+    def is_recording(self) -> bool:
+        return True
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def add_event(self, name: str, **attributes: Any):
+        self.events.append((time.time_ns(), name, attributes))
+
+    def record_exception(self, exc: BaseException):
+        self.status = "ERROR"
+        self.status_message = str(exc)
+        self.add_event("exception", **{"exception.type": type(exc).__name__, "exception.message": str(exc)})
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.record_exception(exc)
+        self.end_ns = time.time_ns()
+        _current_span.reset(self._token)
+        TRACER.export(self)
+        return False
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": f"{self.trace_id:032x}",
+            "spanId": f"{self.span_id:016x}",
+            "name": self.name,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": {"UNSET": 0, "OK": 1, "ERROR": 2}[self.status]},
+        }
+        if self.parent_id is not None:
+            span["parentSpanId"] = f"{self.parent_id:016x}"
+        if self.status_message:
+            span["status"]["message"] = self.status_message
+        if self.events:
+            span["events"] = [
+                {"timeUnixNano": str(ts), "name": name,
+                 "attributes": [_otlp_attribute(k, v) for k, v in attrs.items()]}
+                for ts, name, attrs in self.events
+            ]
+        return span
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Compact form for the debug endpoint"""
+        return {
+            "span_id": f"{self.span_id:016x}",
+            "parent_id": f"{self.parent_id:016x}" if self.parent_id is not None else None,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+            "events": [{"name": name, **attrs} for _, name, attrs in self.events],
+        }
+
+
+class _NonRecordingSpan:
+    """Stand-in for spans of unsampled traces; keeps the parent context so children stay unsampled"""
+
+    __slots__ = ("_token",)
+    is_recording = False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def add_event(self, name: str, **attributes: Any):
+        pass
+
+    def record_exception(self, exc: BaseException):
+        pass
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        return False
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        wrapped = {"boolValue": value}
+    elif isinstance(value, int):
+        wrapped = {"intValue": str(value)}
+    elif isinstance(value, float):
+        wrapped = {"doubleValue": value}
+    else:
+        wrapped = {"stringValue": str(value)}
+    return {"key": key, "value": wrapped}
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[int, int, bool]]:
+    """(trace id, parent span id, sampled) from a W3C ``traceparent`` header"""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        trace_id, parent_id, flags = int(parts[1], 16), int(parts[2], 16), int(parts[3], 16)
+    except ValueError:
+        return None
+    if not trace_id or not parent_id:
+        return None
+    return trace_id, parent_id, bool(flags & 1)
+
+
+class RingBufferExporter:
+    """Keeps the most recent finished spans in memory for /debug/traces"""
+
+    def __init__(self, max_spans: int = 4096):
+        self._spans: "deque[Span]" = deque(maxlen=max_spans)
+
+    def export(self, span: Span):
+        self._spans.append(span)
+
+    def traces(self, limit: int = 20, min_duration_ms: float = 0.0) -> List[Dict[str, Any]]:
+        """Most recent traces first, each with its spans in start order"""
+        grouped: Dict[int, List[Span]] = {}
+        for span in list(self._spans):
+            grouped.setdefault(span.trace_id, []).append(span)
+
+        traces = []
+        for trace_id, spans in grouped.items():
+            spans.sort(key=lambda s: s.start_ns)
+            start = spans[0].start_ns
+            end = max(s.end_ns for s in spans)
+            root = next((s for s in spans if s.parent_id is None), spans[0])
+            duration_ms = (end - start) / 1e6
+            if duration_ms < min_duration_ms:
+                continue
+            traces.append({
+                "trace_id": f"{trace_id:032x}",
+                "root": root.name,
+                "start_ns": start,
+                "duration_ms": round(duration_ms, 3),
+                "span_count": len(spans),
+                "spans": [s.to_dict() for s in spans],
+            })
+        traces.sort(key=lambda t: t["start_ns"], reverse=True)
+        return traces[:limit]
+
+    def trace(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            wanted = int(trace_id, 16)
+        except ValueError:
+            return None
+        spans = sorted((s for s in list(self._spans) if s.trace_id == wanted), key=lambda s: s.start_ns)
+        if not spans:
+            return None
+        return {
+            "trace_id": f"{wanted:032x}",
+            "duration_ms": round((max(s.end_ns for s in spans) - spans[0].start_ns) / 1e6, 3),
+            "span_count": len(spans),
+            "spans": [s.to_dict() for s in spans],
+        }
+
+
+class JsonlFileExporter:
+    """Appends OTLP/JSON spans to a file from a background thread"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: "queue.SimpleQueue[Optional[Span]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span):
+        self._queue.put(span)
+
+    def _run(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                span = self._queue.get()
+                if span is None:
+                    return
+                f.write(json.dumps(span.to_otlp(), default=str) + "\n")
+                if self._queue.empty():
+                    f.flush()
+
+    def shutdown(self, timeout: float = 5.0):
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+class Tracer:
+    """
+    Creates spans and hands finished ones to the exporters.
+
+    Configured from TRACE_SAMPLE_RATE (fraction of new traces recorded, 1.0),
+    TRACE_BUFFER_SIZE (spans kept for /debug/traces, 4096) and
+    TRACE_EXPORT_PATH (optional JSONL file of OTLP spans).
+    """
+
+    def __init__(self, sample_rate: float = 1.0, buffer_size: int = 4096, export_path: Optional[str] = None):
+        self.sample_rate = sample_rate
+        self.buffer = RingBufferExporter(buffer_size)
+        self.exporters: List[Any] = [self.buffer]
+        if export_path:
+            self.exporters.append(JsonlFileExporter(export_path))
+
+    def start_span(self, name: str, **attributes: Any):
+        """Child of the current span, or the root of a new (possibly unsampled) trace"""
+        parent = _current_span.get()
+        if parent is None:
+            if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+                return _NonRecordingSpan()
+            return Span(name, random.getrandbits(128) or 1, None, attributes)
+        if not parent.is_recording:
+            return _NonRecordingSpan()
+        return Span(name, parent.trace_id, parent.span_id, attributes)
+
+    def start_remote_child(self, name: str, traceparent: Optional[str], **attributes: Any):
+        """Span continuing a caller's trace from its ``traceparent`` header, else a new root"""
+        remote = parse_traceparent(traceparent)
+        if remote is None:
+            return self.start_span(name, **attributes)
+        trace_id, parent_id, sampled = remote
+        if not sampled:
+            return _NonRecordingSpan()
+        return Span(name, trace_id, parent_id, attributes)
+
+    def export(self, span: Span):
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                logger.debug("⚠️ Span export failed: %s", e)
+
+
+def current_span():
+    """The span recording in this context, or None"""
+    return _current_span.get()
+
+
+def traceparent(span) -> Optional[str]:
+    """W3C ``traceparent`` value for a recording span"""
+    if span is None or not span.is_recording:
+        return None
+    return f"00-{span.trace_id:032x}-{span.span_id:016x}-01"
+
+
+TRACER = Tracer(
+    sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "1.0")),
+    buffer_size=int(os.getenv("TRACE_BUFFER_SIZE", "4096")),
+    export_path=os.getenv("TRACE_EXPORT_PATH") or None,
+)
+start_span = TRACER.start_span
@@ -0,0 +1,268 @@
+import os
+import threading
+import contextlib
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# Prompt size estimate before a call; providers report the exact count afterwards
+CHARS_PER_TOKEN = 4
+
+# USD per million (input, output) tokens at list price; the longest key contained
+# in a model name wins. Override or extend with LLM_PRICES="model=in/out,..."
+DEFAULT_PRICES: Dict[str, Tuple[float, float]] = {
+    'gemini-1.5-flash-8b': (0.0375, 0.15),
+    'gemini-1.5-flash': (0.075, 0.30),
+    'gemini-1.5-pro': (1.25, 5.00),
+    'gemini-2.0-flash-lite': (0.075, 0.30),
+    'gemini-2.0-flash': (0.10, 0.40),
+    'llama-3.3-70b-versatile': (0.59, 0.79),
+    'llama-3.1-8b-instant': (0.05, 0.08),
+    'command-r-plus-08-2024': (2.50, 10.00),
+    'command-r-08-2024': (0.15, 0.60),
+    'command-r7b': (0.0375, 0.15),
+}
+
+# Budget decisions for one provider
+RUN, DOWNGRADE, SKIP = "run", "downgrade", "skip"
+
+
+def parse_prices(spec: str) -> Dict[str, Tuple[float, float]]:
+    """"llama-3.3-70b=0.59/0.79,command-r=0.15/0.6" -> {model: (input, output)} per million tokens"""
+    prices = {}
+    for item in spec.split(","):
+        model, _, price = item.partition("=")
+        if model.strip() and price.strip():
+            prompt_price, _, completion_price = price.partition("/")
+            prices[model.strip()] = (float(prompt_price), float(completion_price or prompt_price))
+    return prices
+
+
+class RequestUsage:
+    """Tokens and cost of the provider calls made for one generation (retries included)"""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.cost_usd = 0.0
+        self.unpriced_calls = 0
+
+    def add(self, prompt_tokens: int, completion_tokens: int, cached_tokens: int, cost: Optional[float]):
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cached_tokens += cached_tokens
+        if cost is None:
+            self.unpriced_calls += 1
+        else:
+            self.cost_usd += cost
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            # Unknown as soon as one call's model has no price
+            "cost_usd": None if self.unpriced_calls else round(self.cost_usd, 6),
+        }
+
+
+_request_usage: ContextVar[Optional[RequestUsage]] = ContextVar("request_usage", default=None)
+
+
+@contextlib.contextmanager
+def track_usage() -> Iterator[RequestUsage]:
+    """Collect the usage recorded by the provider calls made inside the block"""
+    usage = RequestUsage()
+    token = _request_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _request_usage.reset(token)
+
+
+class UsageTracker:
+    """
+    Running token, cost and latency totals per service and model.
+
+    Every provider call is recorded here (and in the ``track_usage`` block it
+    runs in, if any). The observed means drive the budget estimates of later
+    requests, and ``snapshot`` feeds /service-info: ``at_output_limit`` counts
+    completions that hit ``max_output_tokens`` and were probably truncated.
+    """
+
+    def __init__(self, prices: Dict[str, Tuple[float, float]]):
+        self.prices = prices
+        self._lock = threading.Lock()
+        self._totals: Dict[Tuple[str, str], Dict[str, float]] = {}
+
+    def _entry(self, service: str, model: Optional[str]) -> Dict[str, float]:
+        return self._totals.setdefault((service, model or "unknown"), {
+            "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0,
+            "cost_usd": 0.0, "unpriced_calls": 0, "max_completion_tokens": 0, "at_output_limit": 0,
+            "timed_calls": 0, "latency_seconds": 0.0,
+        })
+
+    def price_for(self, model: Optional[str]) -> Optional[Tuple[float, float]]:
+        matches = [key for key in self.prices if model and key in model]
+        return self.prices[max(matches, key=len)] if matches else None
+
+    def cost(self, model: Optional[str], prompt_tokens: float, completion_tokens: float) -> Optional[float]:
+        """USD for a call, None when the model has no price (cached tokens are billed at full price)"""
+        price = self.price_for(model)
+        if price is None:
+            return None
+        return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+    def record(self, service: str, model: Optional[str], prompt_tokens: Optional[int],
+               completion_tokens: Optional[int], cached_tokens: Optional[int] = None,
+               max_output_tokens: Optional[int] = None) -> Optional[float]:
+        """Account one call's reported usage; returns its cost"""
+        prompt_tokens, completion_tokens, cached_tokens = prompt_tokens or 0, completion_tokens or 0, cached_tokens or 0
+        cost = self.cost(model, prompt_tokens, completion_tokens)
+        with self._lock:
+            totals = self._entry(service, model)
+            totals["calls"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["cached_tokens"] += cached_tokens
+            totals["max_completion_tokens"] = max(totals["max_completion_tokens"], completion_tokens)
+            if max_output_tokens and completion_tokens >= max_output_tokens * 0.98:
+                totals["at_output_limit"] += 1
+            if cost is None:
+                totals["unpriced_calls"] += 1
+            else:
+                totals["cost_usd"] += cost
+        usage = _request_usage.get()
+        if usage is not None:
+            usage.add(prompt_tokens, completion_tokens, cached_tokens, cost)
+        return cost
+
+    def record_latency(self, service: str, model: Optional[str], seconds: float):
+        with self._lock:
+            totals = self._entry(service, model)
+            totals["timed_calls"] += 1
+            totals["latency_seconds"] += seconds
+
+    def estimate(self, service: str, model: Optional[str], prompt_tokens: int,
+                 max_output_tokens: int) -> Tuple[int, Optional[float], Optional[float]]:
+        """
+        Expected (tokens, cost_usd, latency_s) of one call to ``model``.
+
+        The completion is the model's mean so far, or ``max_output_tokens``
+        before it has answered once; latency is None until a call was timed.
+        """
+        with self._lock:
+            totals = self._totals.get((service, model or "unknown"))
+            completion = max_output_tokens
+            latency = None
+            if totals and totals["calls"]:
+                completion = min(totals["completion_tokens"] / totals["calls"], max_output_tokens)
+            if totals and totals["timed_calls"]:
+                latency = totals["latency_seconds"] / totals["timed_calls"]
+        return int(prompt_tokens + completion), self.cost(model, prompt_tokens, completion), latency
+
+    def snapshot(self, service: str) -> Dict[str, Dict[str, Any]]:
+        """Totals and means per model of one service"""
+        with self._lock:
+            items = [(model, dict(totals)) for (name, model), totals in self._totals.items() if name == service]
+        snapshot = {}
+        for model, totals in items:
+            calls = totals["calls"]
+            snapshot[model] = {
+                "calls": calls,
+                "prompt_tokens": totals["prompt_tokens"],
+                "completion_tokens": totals["completion_tokens"],
+                "cached_tokens": totals["cached_tokens"],
+                "cost_usd": None if totals["unpriced_calls"] else round(totals["cost_usd"], 6),
+                "mean_prompt_tokens": round(totals["prompt_tokens"] / calls, 1) if calls else None,
+                "mean_completion_tokens": round(totals["completion_tokens"] / calls, 1) if calls else None,
+                "max_completion_tokens": totals["max_completion_tokens"],
+                "at_output_limit": totals["at_output_limit"],
+                "mean_latency_ms": (round(totals["latency_seconds"] / totals["timed_calls"] * 1000, 1)
+                                    if totals["timed_calls"] else None),
+            }
+        return snapshot
+
+
+USAGE = UsageTracker({**DEFAULT_PRICES, **parse_prices(os.getenv("LLM_PRICES", ""))})
+
+
+def plan_budget(services: Dict[str, Any], prompt: str, route: Optional[str], budget: Any,
+                tracker: UsageTracker = USAGE) -> Dict[str, str]:
+    """
+    Decide, per service, whether a generation fits its request budget.
+
+    ``budget`` has ``max_tokens``, ``max_cost_usd`` and ``max_latency_ms``
+    (None: unlimited). Latency is a per-provider cap, since providers run in
+    parallel: a model whose latency history exceeds it is not considered.
+
+    Token and cost limits apply to the request as a whole, and the result does
+    not depend on the order of ``services`` (ties go by service name). Every
+    service starts on the
+    model ``route`` picks. While the total estimate is over budget, the
+    service with the largest estimate is downgraded to its small model
+    (DOWNGRADE). Only once no service can be downgraded further
+    is the largest one skipped (SKIP), again until the rest fit, so no
+    provider is skipped while another still runs on its large model.
+    "Largest" is measured in whichever limit is exceeded; finally, downgrades
+    the remaining budget has room for are undone, smallest first. Models
+    without a price or latency history only count against the token budget.
+    """
+    # Per service, the estimates (decision, tokens, cost) it may run with, most preferred first
+    options: Dict[str, list] = {}
+    for name, service in services.items():
+        if service is None:
+            continue
+        models = [(RUN, service.model_for(route))]
+        if service.small_model_name and service.small_model_name != models[0][1]:
+            models.append((DOWNGRADE, service.small_model_name))
+
+        prompt_tokens = service.estimate_prompt_tokens(prompt)
+        options[name] = []
+        for decision, model in models:
+            tokens, cost, latency = tracker.estimate(
+                service.service_type, model, prompt_tokens, service.generation_config.max_output_tokens
+            )
+            if budget.max_latency_ms is not None and latency is not None and latency * 1000 > budget.max_latency_ms:
+                continue
+            options[name].append((decision, tokens, cost))
+
+    chosen = {name: 0 for name, fits in options.items() if fits}
+
+    def over_budget() -> Optional[int]:
+        """Field of the estimates (1: tokens, 2: cost) whose total exceeds the budget, if any"""
+        if budget.max_tokens is not None and sum(options[n][i][1] for n, i in chosen.items()) > budget.max_tokens:
+            return 1
+        if budget.max_cost_usd is not None and sum(options[n][i][2] or 0.0 for n, i in chosen.items()) > budget.max_cost_usd:
+            return 2
+        return None
+
+    field = over_budget()
+    while chosen and field is not None:
+        def largest(name: str, field: int = field) -> Tuple[float, str]:
+            # Ties (e.g. equal token estimates before any usage history) go by name, not by dict order
+            return options[name][chosen[name]][field] or 0.0, name
+
+        downgradable = [name for name, i in chosen.items() if i + 1 < len(options[name])]
+        if downgradable:
+            chosen[max(downgradable, key=largest)] += 1
+        else:
+            del chosen[max(chosen, key=largest)]
+        field = over_budget()
+
+    # Restore downgrades the final set still has room for (e.g. when the small model saves no tokens)
+    def run_estimate(name: str) -> Tuple[int, float, str]:
+        _, tokens, cost = options[name][0]
+        return tokens, cost if cost is not None else 0.0, name
+
+    for name in sorted((n for n, i in chosen.items() if i), key=run_estimate):
+        chosen[name] = 0
+        if over_budget() is not None:
+            chosen[name] = 1
+
+    plan = {name: SKIP for name in options}
+    plan.update({name: options[name][i][0] for name, i in chosen.items()})
+    return plan
@@ -0,0 +1,203 @@
+"""
+Micro-benchmarks for CodeProcessor post-processing.
+
+Run from backend/:
+
+    python benchmark_code_processor.py --save-baseline code_processor_baseline.json
+    python benchmark_code_processor.py --baseline code_processor_baseline.json   # exit 1 on regression
+
+Every flutter_code body in the dataset (wrapped the way LLMs return it) plus
+synthetic 50/100/200 KB responses are pushed through clean_response,
+clean_code_response, _fix_basic_indentation and _apply_flutter_3_27_fixes.
+Per-call latency percentiles come from perf_counter_ns; allocations (peak and
+total bytes per call) from tracemalloc on a separate pass, so tracing does not
+skew the timings. Logging goes to os.devnull at INFO, so the cost of the log
+calls on the request path is included unless --no-logging is given.
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from base.code_processor import CodeProcessor
+from stubs.stub_services import load_sample_outputs
+
+WIDGET_NAME = "GroqGeneratedWidget"
+SYNTHETIC_SIZES_KB = (50, 100, 200)
+LATENCY_KEYS = ("p50_us", "p95_us", "p99_us", "mean_us")
+ALLOCATION_KEYS = ("peak_bytes", "allocated_bytes")
+
+
+def as_llm_response(code: str, rng: random.Random) -> str:
+    """Wrap code the way providers tend to return it"""
+    preamble = rng.choice(["", "Here is the widget:\n\n", "Below is the complete solution.\n"])
+    return f"{preamble}```dart\n{code}\n```\n"
+
+
+def synthetic_response(samples: List[str], size_kb: int, rng: random.Random) -> str:
+    """A single oversized response built from dataset bodies, with the usual defects"""
+    parts, size = [], 0
+    while size < size_kb * 1024:
+        code = rng.choice(samples)
+        # Defects the fixes target: spaced imports, URLs and times, double semicolons
+        code = code.replace("package:", "package: ", 1).replace(";\n", ";;\n", 3)
+        code += "\n// https: //example.com opens at 10: 00\nfinal w = MediaQuery.of(context).size.width;\n"
+        parts.append(code)
+        size += len(code)
+    return "```dart\n" + "\n".join(parts) + "\n```"
+
+
+def build_cases(limit: int, seed: int) -> Dict[str, List[str]]:
+    rng = random.Random(seed)
+    samples = load_sample_outputs(limit=limit)
+    if not samples:
+        raise SystemExit("❌ No dataset samples found (build Training_Model/flutter_dataset.jsonl first)")
+    cases = {"dataset": [as_llm_response(code, rng) for code in samples]}
+    for size_kb in SYNTHETIC_SIZES_KB:
+        cases[f"synthetic_{size_kb}kb"] = [synthetic_response(samples, size_kb, rng)]
+    return cases
+
+
+def benchmark_functions(processor: CodeProcessor) -> Dict[str, Tuple[Callable[[str], str], Callable[[str], Any]]]:
+    """(prepare, fn) pairs; stages after clean_response get pre-cleaned input, as in production"""
+    def cleaned(text: str) -> str:
+        return processor.clean_response(text)
+
+    return {
+        "clean_response": (lambda text: text, processor.clean_response),
+        "clean_code_response": (cleaned, lambda code: processor.clean_code_response(code, WIDGET_NAME)),
+        "_fix_basic_indentation": (cleaned, processor._fix_basic_indentation),
+        "_apply_flutter_3_27_fixes": (cleaned, processor._apply_flutter_3_27_fixes),
+    }
+
+
+def time_calls(fn: Callable[[str], Any], inputs: List[str], min_calls: int) -> Dict[str, float]:
+    """Per-call latency in microseconds; small input sets are repeated up to ``min_calls``"""
+    repeats = max(1, -(-min_calls // len(inputs)))
+    timings = []
+    for _ in range(repeats):
+        for text in inputs:
+            start = time.perf_counter_ns()
+            fn(text)
+            timings.append((time.perf_counter_ns() - start) / 1000)
+    data = np.asarray(timings)
+    return {
+        "calls": int(data.size),
+        "p50_us": round(float(np.percentile(data, 50)), 2),
+        "p95_us": round(float(np.percentile(data, 95)), 2),
+        "p99_us": round(float(np.percentile(data, 99)), 2),
+        "mean_us": round(float(data.mean()), 2),
+        "total_ms": round(float(data.sum()) / 1000, 2),
+    }
+
+
+def trace_allocations(fn: Callable[[str], Any], inputs: List[str], max_inputs: int) -> Dict[str, float]:
+    """Mean peak and total allocated bytes per call, under tracemalloc"""
+    peaks, totals = [], []
+    for text in inputs[:max_inputs]:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        fn(text)
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        peaks.append(peak)
+        totals.append(sum(stat.size_diff for stat in after.compare_to(before, "filename") if stat.size_diff > 0))
+    return {
+        "peak_bytes": int(np.mean(peaks)),
+        "allocated_bytes": int(np.mean(totals)),
+    }
+
+
+def run_suite(limit: int, min_calls: int, alloc_samples: int, seed: int) -> Dict[str, Any]:
+    cases = build_cases(limit, seed)
+    processor = CodeProcessor()
+    results: Dict[str, Any] = {}
+
+    for fn_name, (prepare, fn) in benchmark_functions(processor).items():
+        for case_name, raw_inputs in cases.items():
+            inputs = [prepare(text) for text in raw_inputs]
+            key = f"{fn_name}/{case_name}"
+            stats = time_calls(fn, inputs, min_calls if case_name != "dataset" else 1)
+            stats.update(trace_allocations(fn, inputs, alloc_samples))
+            stats["input_kb"] = round(sum(map(len, inputs)) / len(inputs) / 1024, 1)
+            results[key] = stats
+            print(f"   {key:<45} p50 {stats['p50_us']:>10.1f}µs  p99 {stats['p99_us']:>10.1f}µs  "
+                  f"peak {stats['peak_bytes'] / 1024:>8.1f} KB  ({stats['calls']} calls, {stats['input_kb']} KB in)")
+
+    return {
+        "metadata": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "dataset_samples": len(cases["dataset"]),
+            "synthetic_kb": list(SYNTHETIC_SIZES_KB),
+            "logging": logging.getLogger().isEnabledFor(logging.INFO),
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def find_regressions(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """Benchmarks whose latency or allocations grew by more than ``threshold``"""
+    regressions = []
+    for key, now in current["results"].items():
+        before = baseline.get("results", {}).get(key)
+        if not before:
+            continue
+        for metric in LATENCY_KEYS + ALLOCATION_KEYS:
+            if before.get(metric) and now[metric] > before[metric] * (1 + threshold):
+                regressions.append(f"{key} {metric}: {before[metric]} -> {now[metric]} "
+                                   f"(+{(now[metric] / before[metric] - 1) * 100:.0f}%)")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CodeProcessor post-processing")
+    parser.add_argument("--limit", type=int, default=100000, help="Max dataset samples")
+    parser.add_argument("--min-calls", type=int, default=20, help="Min timed calls per synthetic input")
+    parser.add_argument("--alloc-samples", type=int, default=50, help="Inputs traced for allocations")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-logging", action="store_true", help="Disable logging entirely")
+    parser.add_argument("--output", default=None, help="Write the JSON results here")
+    parser.add_argument("--save-baseline", default=None, help="Write the results as a baseline")
+    parser.add_argument("--baseline", default=None, help="Compare against a baseline; exit 1 on regression")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    if args.no_logging:
+        logging.disable(logging.CRITICAL)
+    else:
+        logging.basicConfig(level=logging.INFO, stream=open(os.devnull, "w"), force=True)
+
+    print("=" * 70)
+    print("⏱️  CODEPROCESSOR BENCHMARK")
+    print("=" * 70)
+    report = run_suite(args.limit, args.min_calls, args.alloc_samples, args.seed)
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results saved to: {path}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = find_regressions(json.load(f), report, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"   • {line}")
+            sys.exit(1)
+        print(f"\n✅ No regressions over {args.threshold:.0%}")
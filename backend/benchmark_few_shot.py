@@ -0,0 +1,177 @@
+"""
+A/B benchmark of retrieval-augmented few-shot prompting.
+
+Run from backend/:
+
+    python benchmark_few_shot.py --prompts 40 --services groq gemini --output few_shot_report.json
+
+    # Plumbing check without API quota (stubs ignore the prompt, so expect no quality change):
+    USE_STUB_PROVIDERS=1 python benchmark_few_shot.py --prompts 10
+
+Dataset prompts are sent to each provider twice, without examples and with
+the top-k retrieved dataset screens compressed into the provider's
+FEW_SHOT_TOKENS budget; the arm order alternates per prompt so provider drift
+cancels out. Retrieval is leave-one-out (the prompt's own dataset entry is
+never an example) and uses the training model when it loads, otherwise BM25
+over the dataset. Reported per service and arm: validity (no fallback widget),
+first-try validity, retries per generation, latency percentiles and token usage.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+# Benchmark outputs must not end up in the retriever
+os.environ.setdefault("ONLINE_INDEXING", "0")
+
+from base.usage import track_usage
+from training_model.bm25_index import BM25Index, document_text
+
+DATASET_PATH = Path(__file__).parent.parent / "Training_Model" / "flutter_dataset.jsonl"
+ARMS = ("baseline", "few_shot")
+
+
+def load_dataset(limit: int = 5000) -> List[Dict[str, Any]]:
+    entries = []
+    with open(DATASET_PATH, 'r', encoding='utf-8') as f:
+        for line in f:
+            if len(entries) >= limit:
+                break
+            if line.strip():
+                entry = json.loads(line)
+                if entry.get('prompt') and entry.get('flutter_code'):
+                    entries.append(entry)
+    return entries
+
+
+def build_retriever(entries: List[Dict[str, Any]], training_model_service, top_k: int) -> Callable:
+    """prompt -> top_k examples, excluding the dataset entry the prompt came from"""
+    if training_model_service:
+        def retrieve(prompt: str) -> List[Dict[str, Any]]:
+            matches = training_model_service.search(prompt, top_k=top_k + 1)
+            return [m for m in matches if m.get("prompt") != prompt][:top_k]
+        return retrieve
+
+    index = BM25Index.build(document_text(entry) for entry in entries)
+
+    def retrieve(prompt: str) -> List[Dict[str, Any]]:
+        scores = index.score(prompt)
+        order = np.argsort(-scores)[:top_k + 1]
+        return [
+            {"prompt": entries[i]["prompt"], "code": entries[i]["flutter_code"], "score": float(scores[i])}
+            for i in order if entries[i]["prompt"] != prompt
+        ][:top_k]
+    return retrieve
+
+
+def run_service(name: str, service, prompts: List[str], retrieve: Callable) -> Dict[str, List[Dict[str, Any]]]:
+    """Generate every prompt in both arms; one record per generation"""
+    attempts = 0
+    api_request = service._make_api_request
+
+    def counting_request(*args, **kwargs):
+        nonlocal attempts
+        attempts += 1
+        return api_request(*args, **kwargs)
+    service._make_api_request = counting_request
+
+    runs = {arm: [] for arm in ARMS}
+    try:
+        for i, prompt in enumerate(prompts):
+            examples = retrieve(prompt)
+            for arm in (ARMS if i % 2 == 0 else ARMS[::-1]):
+                attempts = 0
+                start = time.perf_counter()
+                with track_usage() as usage:
+                    _, success, _ = service.generate_flutter_code(prompt, examples=examples if arm == "few_shot" else [])
+                runs[arm].append({
+                    "success": success,
+                    "attempts": attempts,
+                    "latency_s": time.perf_counter() - start,
+                    "prompt_tokens": usage.prompt_tokens,
+                    "completion_tokens": usage.completion_tokens,
+                })
+            print(f"   {name}: {i + 1}/{len(prompts)}", end="\r", flush=True)
+    finally:
+        del service._make_api_request
+    return runs
+
+
+def summarize(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    latencies = np.array([r["latency_s"] for r in records]) * 1000
+    return {
+        "runs": len(records),
+        "valid_rate": round(float(np.mean([r["success"] for r in records])), 4),
+        "first_try_valid_rate": round(float(np.mean([r["success"] and r["attempts"] == 1 for r in records])), 4),
+        "retries_per_generation": round(float(np.mean([max(r["attempts"] - 1, 0) for r in records])), 4),
+        "latency_ms": {
+            "p50": round(float(np.percentile(latencies, 50)), 1),
+            "p95": round(float(np.percentile(latencies, 95)), 1),
+            "mean": round(float(latencies.mean()), 1),
+        },
+        "mean_prompt_tokens": round(float(np.mean([r["prompt_tokens"] for r in records])), 1),
+        "mean_completion_tokens": round(float(np.mean([r["completion_tokens"] for r in records])), 1),
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n📊 Few-shot A/B over {report['prompts']} prompts (top {report['top_k']}, retriever: {report['retriever']})")
+    header = f"{'service':<12} {'arm':<9} {'valid':>6} {'1st-try':>8} {'retries':>8} {'p50 ms':>8} {'p95 ms':>8} {'prompt tok':>11} {'compl tok':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, arms in report["services"].items():
+        for arm in ARMS:
+            s = arms[arm]
+            print(f"{name:<12} {arm:<9} {s['valid_rate']:>6.1%} {s['first_try_valid_rate']:>8.1%} "
+                  f"{s['retries_per_generation']:>8.3f} {s['latency_ms']['p50']:>8.0f} {s['latency_ms']['p95']:>8.0f} "
+                  f"{s['mean_prompt_tokens']:>11.0f} {s['mean_completion_tokens']:>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark few-shot examples against plain prompts")
+    parser.add_argument("--prompts", type=int, default=40, help="Dataset prompts to sample")
+    parser.add_argument("--services", nargs="*", default=None, help="Services to run (default: all initialized)")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's INFO logging")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOG_LEVEL", "INFO" if args.verbose else "WARNING")
+    import main
+
+    entries = load_dataset()
+    prompts = [entry["prompt"] for entry in random.Random(args.seed).sample(entries, min(args.prompts, len(entries)))]
+    retrieve = build_retriever(entries, main.training_model_service, args.top_k)
+    selected = {
+        name: service for name, service in main.services.items()
+        if service is not None and (not args.services or name in args.services)
+    }
+    if not selected:
+        sys.exit("No services initialized")
+
+    print(f"🚀 {len(prompts)} prompts x {len(selected)} services x {len(ARMS)} arms")
+    with ThreadPoolExecutor(max_workers=len(selected)) as pool:
+        futures = {name: pool.submit(run_service, name, service, prompts, retrieve) for name, service in selected.items()}
+        runs = {name: future.result() for name, future in futures.items()}
+
+    report = {
+        "prompts": len(prompts),
+        "top_k": args.top_k,
+        "retriever": "training_model" if main.training_model_service else "bm25",
+        "few_shot_tokens": {name: service.few_shot_tokens for name, service in selected.items()},
+        "services": {name: {arm: summarize(records) for arm, records in arms.items()} for name, arms in runs.items()},
+    }
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report saved to: {args.output}")
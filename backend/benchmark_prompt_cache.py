@@ -0,0 +1,160 @@
+"""
+Input tokens, prompt caching and time to first token of the shared system prompt.
+
+Run from backend/:
+
+    python benchmark_prompt_cache.py --calls 6 --services groq gemini openrouter --output prompt_cache_report.json
+
+    # Plumbing check without API quota (stubs estimate usage and never report cached tokens):
+    USE_STUB_PROVIDERS=1 python benchmark_prompt_cache.py --calls 3
+
+Each service gets ``--calls`` requests for different dataset prompts, back to
+back, so every call after the first repeats the static SYSTEM_PROMPT prefix
+while the first may find it uncached. The services call non-streaming APIs,
+so time to first token is measured as the latency of the request capped at
+``--probe-tokens`` output tokens. Reported per service, for the first call
+and for the rest: prompt tokens and cached prompt tokens as the provider
+reported them, and time-to-first-token percentiles.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import contextlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+# Benchmark outputs must not end up in the retriever
+os.environ.setdefault("ONLINE_INDEXING", "0")
+
+from base.prompts import SYSTEM_PROMPT
+from base.usage import CHARS_PER_TOKEN, track_usage
+
+DATASET_PATH = Path(__file__).parent.parent / "Training_Model" / "flutter_dataset.jsonl"
+
+
+def load_prompts(count: int, seed: int) -> List[str]:
+    with open(DATASET_PATH, 'r', encoding='utf-8') as f:
+        prompts = [json.loads(line)["prompt"] for line in f if line.strip()]
+    return random.Random(seed).sample(prompts, min(count, len(prompts)))
+
+
+@contextlib.contextmanager
+def output_limit(service, max_tokens: int) -> Iterator[None]:
+    """Temporarily cap the service's output tokens (Gemini bakes the limit into its model object)"""
+    saved = service.generation_config.max_output_tokens
+    service.generation_config.max_output_tokens = max_tokens
+    gemini_config = getattr(service, "gemini_generation_config", None)
+    if gemini_config is not None:
+        saved_model = service.model
+        service.gemini_generation_config = {**gemini_config, "max_output_tokens": max_tokens}
+        service.model = service._build_model(service.current_model_name)
+    try:
+        yield
+    finally:
+        service.generation_config.max_output_tokens = saved
+        if gemini_config is not None:
+            service.gemini_generation_config = gemini_config
+            service.model = saved_model
+
+
+def run_service(name: str, service, prompts: List[str], probe_tokens: int) -> List[Dict[str, Any]]:
+    """One capped request per prompt, in order; one record per call"""
+    records = []
+    with output_limit(service, probe_tokens):
+        for i, prompt in enumerate(prompts):
+            start = time.perf_counter()
+            error = None
+            with track_usage() as usage:
+                try:
+                    service._make_api_request(f"User request: {prompt}")
+                except Exception as e:
+                    error = str(e)
+            records.append({
+                "ttft_s": time.perf_counter() - start,
+                "prompt_tokens": usage.prompt_tokens,
+                "cached_tokens": usage.cached_tokens,
+                "error": error,
+            })
+            print(f"   {name}: {i + 1}/{len(prompts)}", end="\r", flush=True)
+    return records
+
+
+def summarize(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ok = [r for r in records if r["error"] is None]
+    if not ok:
+        return {"calls": len(records), "errors": len(records)}
+    ttft = np.array([r["ttft_s"] for r in ok]) * 1000
+    prompt_tokens = sum(r["prompt_tokens"] for r in ok)
+    cached_tokens = sum(r["cached_tokens"] for r in ok)
+    return {
+        "calls": len(records),
+        "errors": len(records) - len(ok),
+        "mean_prompt_tokens": round(prompt_tokens / len(ok), 1),
+        "mean_cached_tokens": round(cached_tokens / len(ok), 1),
+        "cached_share": round(cached_tokens / prompt_tokens, 4) if prompt_tokens else None,
+        "ttft_ms": {
+            "p50": round(float(np.percentile(ttft, 50)), 1),
+            "p95": round(float(np.percentile(ttft, 95)), 1),
+        },
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n📊 System prompt: {report['system_prompt_chars']} characters "
+          f"(~{report['system_prompt_chars'] // CHARS_PER_TOKEN} tokens at {CHARS_PER_TOKEN} chars/token)")
+    header = f"{'service':<12} {'calls':<6} {'prompt tok':>11} {'cached tok':>11} {'cached':>7} {'TTFT p50':>9} {'TTFT p95':>9} {'errors':>7}"
+    print(header)
+    print("-" * len(header))
+    for name, parts in report["services"].items():
+        for part, s in parts.items():
+            if "mean_prompt_tokens" not in s:
+                print(f"{name:<12} {part:<6} {'':>11} {'':>11} {'':>7} {'':>9} {'':>9} {s['errors']:>7}")
+                continue
+            share = f"{s['cached_share']:.0%}" if s["cached_share"] is not None else "-"
+            print(f"{name:<12} {part:<6} {s['mean_prompt_tokens']:>11.0f} {s['mean_cached_tokens']:>11.0f} {share:>7} "
+                  f"{s['ttft_ms']['p50']:>9.0f} {s['ttft_ms']['p95']:>9.0f} {s['errors']:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure input tokens, prompt caching and TTFT per provider")
+    parser.add_argument("--calls", type=int, default=6, help="Requests per service (the first one is the cold call)")
+    parser.add_argument("--services", nargs="*", default=None, help="Services to run (default: all initialized)")
+    parser.add_argument("--probe-tokens", type=int, default=8, help="Output cap of each request")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's INFO logging")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOG_LEVEL", "INFO" if args.verbose else "WARNING")
+    import main
+
+    prompts = load_prompts(args.calls, args.seed)
+    selected = {
+        name: service for name, service in main.services.items()
+        if service is not None and (not args.services or name in args.services)
+    }
+    if not selected:
+        sys.exit("No services initialized")
+
+    print(f"🚀 {len(prompts)} calls x {len(selected)} services, sequential per service")
+    runs = {name: run_service(name, service, prompts, args.probe_tokens) for name, service in selected.items()}
+
+    report = {
+        "system_prompt_chars": len(SYSTEM_PROMPT),
+        "probe_tokens": args.probe_tokens,
+        "services": {
+            name: {"first": summarize(records[:1]), "rest": summarize(records[1:])}
+            for name, records in runs.items()
+        },
+    }
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report saved to: {args.output}")
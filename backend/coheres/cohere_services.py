@@ -18,6 +18,8 @@ logger = logging.getLogger(__name__)
 class CohereService(BaseLLMService):
     """Cohere-specific implementation of the LLM service"""
     
+    SMALL_MODELS = ('command-r-08-2024', 'command-r7b', 'command-light')
+    
     def __init__(self, generation_config: GenerationConfig = None, retry_config: RetryConfig = None):
         load_dotenv()
         
@@ -106,6 +108,7 @@ class CohereService(BaseLLMService):
                     # CRITICAL FIX: Set both model attributes
                     self.current_model_name = model_name
                     self.model = self.client  # The parent class checks for self.model
+                    self.small_model_name = self._select_small_model(available_models)
                     
                     logger.info(f"✅ self.model set to: {type(self.model)}")
                     logger.info(f"✅ self.current_model_name set to: {self.current_model_name}")
@@ -127,22 +130,28 @@ class CohereService(BaseLLMService):
         logger.error("💥 No available Cohere models could be initialized")
         return False
     
-    def _make_api_request(self, prompt: str) -> Optional[str]:
+    def _make_api_request(self, prompt: str, model_name: Optional[str] = None) -> Optional[str]:
         """Make a single API request to Cohere"""
         if not hasattr(self, 'current_model_name') or not self.current_model_name:
             raise ValueError("Model not initialized. Cannot make API request.")
+        model_name = model_name or self.current_model_name
         
         try:
-            logger.info(f"🚀 Making API request to Cohere ({self.current_model_name})...")
+            logger.info(f"🚀 Making API request to Cohere ({model_name})...")
             response = self.client.chat(
-                model=self.current_model_name,
-                messages=[{"role": "user", "content": prompt}],
+                model=model_name,
+                messages=self._chat_messages(prompt),
                 temperature=self.generation_config.temperature,
                 p=self.generation_config.top_p,
                 k=self.generation_config.top_k,
                 max_tokens=self.generation_config.max_output_tokens
             )
             
+            usage = getattr(response, 'usage', None)
+            tokens = getattr(usage, 'tokens', None) if usage else None
+            if tokens:
+                self._record_token_usage(tokens.input_tokens, tokens.output_tokens)
+            
             if response.message and response.message.content:
                 response_text = response.message.content[0].text
                 logger.info(f"✅ Received response ({len(response_text)} chars)")
@@ -18,6 +18,10 @@ logger = logging.getLogger(__name__)
 class GeminiService(BaseLLMService):
     """Gemini-specific implementation of the LLM service"""
     
+    SMALL_MODELS = ('gemini-1.5-flash-8b', 'gemini-2.0-flash-lite', 'gemini-1.5-flash')
+    # Long context and cheap input tokens: room for fuller examples
+    FEW_SHOT_TOKENS = 2000
+    
     def __init__(self, generation_config: GenerationConfig = None, retry_config: RetryConfig = None):
         load_dotenv()
         
@@ -70,6 +74,9 @@ class GeminiService(BaseLLMService):
             }
         ]
         
+        # GenerativeModel per routed (non-default) model name
+        self._routed_models = {}
+        
         # Initialize the model
         if not self._initialize_model():
             raise ValueError("Failed to initialize Gemini model")
@@ -128,6 +135,9 @@ class GeminiService(BaseLLMService):
                     logger.info(f"✅ Successfully initialized and tested model: {model_name}")
                     logger.info(f"📝 Test response received: {test_response.text[:50]}...")
                     self.current_model_name = model_name
+                    self.small_model_name = self._select_small_model(available_models)
+                    # Tested without it so "Hello" isn't answered with a whole widget
+                    self.model = self._build_model(model_name)
                     return True
                 else:
                     logger.warning(f"⚠️ Model {model_name} initialized but returned empty test response")
@@ -139,11 +149,45 @@ class GeminiService(BaseLLMService):
         logger.error("💥 No available Gemini models found")
         return False
     
-    def _make_api_request(self, prompt: str) -> Optional[str]:
+    def _model_for_request(self, model_name: Optional[str]):
+        """The initialized model, or a cached one with the same settings for a routed model name or system prompt"""
+        system_prompt = self._current_system_prompt()
+        if system_prompt != self._get_system_prompt():
+            # system_instruction is part of the model object, so a refine diff needs its own
+            key = (model_name or self.current_model_name, system_prompt)
+        elif not model_name or model_name == self.current_model_name:
+            return self.model
+        else:
+            key = model_name
+        model = self._routed_models.get(key)
+        if model is None:
+            model = self._routed_models[key] = self._build_model(model_name or self.current_model_name, system_prompt)
+        return model
+    
+    def _build_model(self, model_name: str, system_prompt: Optional[str] = None):
+        """
+        GenerativeModel for generation, with the shared system prompt as system_instruction.
+        
+        Keeping the static prompt in system_instruction, ahead of every request,
+        lets Gemini's implicit caching bill the repeated prefix as cached tokens.
+        """
+        return genai.GenerativeModel(
+            model_name,
+            generation_config=self.gemini_generation_config,
+            safety_settings=self.safety_settings,
+            system_instruction=system_prompt or self._get_system_prompt()
+        )
+    
+    def _make_api_request(self, prompt: str, model_name: Optional[str] = None) -> Optional[str]:
         """Make a single API request to Gemini"""
         try:
             logger.info("🚀 Making API request to Gemini...")
-            response = self.model.generate_content(prompt)
+            response = self._model_for_request(model_name).generate_content(prompt)
+            
+            usage = getattr(response, 'usage_metadata', None)
+            if usage:
+                self._record_token_usage(usage.prompt_token_count, usage.candidates_token_count,
+                                         getattr(usage, 'cached_content_token_count', None))
             
             if response.text:
                 logger.info(f"✅ Received response from Gemini")
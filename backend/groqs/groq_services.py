@@ -17,6 +17,10 @@ logger = logging.getLogger(__name__)
 class GroqService(BaseLLMService):
     """Groq-specific implementation of the LLM service"""
     
+    SMALL_MODELS = ('llama-3.1-8b-instant', 'gemma2-9b-it')
+    # Free-tier tokens-per-minute limits are tight
+    FEW_SHOT_TOKENS = 800
+    
     def __init__(self, generation_config: GenerationConfig = None, retry_config: RetryConfig = None):
         load_dotenv()
         
@@ -190,6 +194,7 @@ class GroqService(BaseLLMService):
                         logger.info(f"📝 Test response received successfully")
                         self.current_model_name = model_name
                         self.model = model_name
+                        self.small_model_name = self._select_small_model(available_models)
                         return True
                     else:
                         logger.warning(f"⚠️ Model {model_name} failed token test")
@@ -211,26 +216,23 @@ class GroqService(BaseLLMService):
         logger.error("💥 All models failed to initialize")
         return False
     
-    def _make_api_request(self, prompt: str) -> Optional[str]:
+    def _make_api_request(self, prompt: str, model_name: Optional[str] = None) -> Optional[str]:
         """Make a single API request to Groq with smart token handling"""
         if not self.current_model_name:
             raise ValueError("Model not initialized - current_model_name is None")
+        model_name = model_name or self.current_model_name
             
         try:
             logger.info("🚀 Making API request to Groq...")
-            logger.info(f"🎯 Using model: {self.current_model_name}")
+            logger.info(f"🎯 Using model: {model_name}")
             
             # Use configured max tokens, but clamp to reasonable limits
             max_tokens = min(self.generation_config.max_output_tokens, 8192)
             
             chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ],
-                model=self.current_model_name,
+                # Identical system prompt first, so Groq's prompt caching can reuse the prefix
+                messages=self._chat_messages(prompt),
+                model=model_name,
                 temperature=self.generation_config.temperature,
                 max_tokens=max_tokens,
                 top_p=self.generation_config.top_p
@@ -247,6 +249,9 @@ class GroqService(BaseLLMService):
                     logger.info(f"📊 Token usage - Prompt: {usage.prompt_tokens}, "
                               f"Completion: {usage.completion_tokens}, "
                               f"Total: {usage.total_tokens}")
+                    details = getattr(usage, 'prompt_tokens_details', None)
+                    self._record_token_usage(usage.prompt_tokens, usage.completion_tokens,
+                                             getattr(details, 'cached_tokens', None))
                 
                 return content
             else:
@@ -265,8 +270,8 @@ class GroqService(BaseLLMService):
                     logger.info(f"🔄 Retrying with max_tokens={reduced_tokens}")
                     
                     chat_completion = self.client.chat.completions.create(
-                        messages=[{"role": "user", "content": prompt}],
-                        model=self.current_model_name,
+                        messages=self._chat_messages(prompt),
+                        model=model_name,
                         temperature=self.generation_config.temperature,
                         max_tokens=reduced_tokens,
                         top_p=self.generation_config.top_p
@@ -19,6 +19,9 @@ logger = logging.getLogger(__name__)
 class HuggingFaceService(BaseLLMService):
     """Hugging Face-specific implementation of the LLM service"""
     
+    # Serverless models often have 8k-token contexts
+    FEW_SHOT_TOKENS = 800
+    
     def __init__(self, generation_config: GenerationConfig = None, retry_config: RetryConfig = None):
         load_dotenv()
         
@@ -202,7 +205,7 @@ class HuggingFaceService(BaseLLMService):
         
         return False
     
-    def _make_api_request(self, prompt: str) -> Optional[str]:
+    def _make_api_request(self, prompt: str, model_name: Optional[str] = None) -> Optional[str]:
         """Make a single API request to Hugging Face using chat completion
         
         Optimized for code generation with proper error handling
@@ -217,31 +220,25 @@ class HuggingFaceService(BaseLLMService):
             error_msg = "Client not initialized. Cannot make API request."
             logger.error(f"❌ {error_msg}")
             raise RuntimeError(error_msg)
+        model_name = model_name or self.current_model_name
         
         try:
             logger.info("🚀 Making API request...")
-            logger.info(f"📤 Model: {self.current_model_name}")
+            logger.info(f"📤 Model: {model_name}")
             logger.info(f"📏 Prompt length: {len(prompt)} characters")
             
-            # Format prompt for better code generation
-            system_prompt = """You are an expert Flutter/Dart code generator. 
-Generate clean, well-formatted, and production-ready code. 
-Follow Flutter best practices and use modern Dart syntax.
-Ensure all imports are correct and code is properly structured."""
-            
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ]
-            
             response = self.model.chat_completion(
-                messages=messages,
-                model=self.current_model_name,
+                messages=self._chat_messages(prompt),
+                model=model_name,
                 max_tokens=self.generation_config.max_output_tokens,
                 temperature=self.generation_config.temperature,
                 top_p=self.generation_config.top_p,
             )
             
+            usage = getattr(response, 'usage', None)
+            if usage:
+                self._record_token_usage(usage.prompt_tokens, usage.completion_tokens)
+            
             if response and hasattr(response, 'choices') and len(response.choices) > 0:
                 content = response.choices[0].message.content
                 if content and len(content.strip()) > 0:
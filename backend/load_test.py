@@ -0,0 +1,307 @@
+"""
+Load generator for /generate-ui and /generate-ui-stream.
+
+Run from backend/:
+
+    # Against the app in this process, with stub providers (no API quota):
+    python load_test.py --in-process --concurrency 20 --requests 200
+
+    # Against a running server:
+    python load_test.py --url http://localhost:8000 --endpoint generate-ui-stream
+
+Reports throughput, latency percentiles (and time to first event for the
+stream endpoint), status counts and, in-process, the server event-loop lag and
+thread counts. Results are printed and optionally written as JSON.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import random
+import asyncio
+import argparse
+import logging
+import platform
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+import httpx
+import numpy as np
+
+DATASET_PATH = Path(__file__).parent.parent / "Training_Model" / "flutter_dataset.jsonl"
+FALLBACK_PROMPTS = [
+    "Create a login screen with email and password fields",
+    "Dashboard with a bottom navigation bar and summary cards",
+    "Settings page with toggles grouped into sections",
+    "Product grid with images, prices and an add to cart button",
+]
+ENDPOINTS = ("generate-ui", "generate-ui-stream")
+
+
+def load_prompts(limit: int = 1000) -> List[str]:
+    """Prompts from the JSONL dataset, or a small built-in list"""
+    if not DATASET_PATH.exists():
+        return FALLBACK_PROMPTS
+    prompts = []
+    with open(DATASET_PATH, 'r', encoding='utf-8') as f:
+        for line in f:
+            if len(prompts) >= limit:
+                break
+            if line.strip():
+                prompt = json.loads(line).get('prompt')
+                if prompt:
+                    prompts.append(prompt)
+    return prompts or FALLBACK_PROMPTS
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    data = np.asarray(values, dtype=np.float64)
+    return {
+        "p50": round(float(np.percentile(data, 50)), 2),
+        "p95": round(float(np.percentile(data, 95)), 2),
+        "p99": round(float(np.percentile(data, 99)), 2),
+        "max": round(float(data.max()), 2),
+        "mean": round(float(data.mean()), 2),
+    }
+
+
+async def lag_probe(samples: List[float], stop: asyncio.Event, interval: float = 0.05):
+    """Record how late the event loop wakes up from a fixed sleep (ms)"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append((loop.time() - start - interval) * 1000)
+
+
+class InProcessServer:
+    """Runs the FastAPI app under uvicorn on its own thread and event loop"""
+
+    def __init__(self, verbose: bool = False):
+        import uvicorn
+
+        os.environ.setdefault("USE_STUB_PROVIDERS", "1")
+        os.environ.setdefault("ONLINE_INDEXING", "0")
+        sys.path.insert(0, str(Path(__file__).parent))
+        import main
+
+        if not verbose:
+            logging.getLogger().setLevel(logging.WARNING)
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+
+        self.server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._serve, name="load-test-server", daemon=True)
+        self.lag_samples: List[float] = []
+        self.thread_samples: List[int] = []
+        self._stop_probe: Optional[asyncio.Event] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def _serve(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.server.serve())
+
+    def start(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+
+        async def install_probe():
+            self._stop_probe = asyncio.Event()
+            asyncio.get_running_loop().create_task(lag_probe(self.lag_samples, self._stop_probe))
+        asyncio.run_coroutine_threadsafe(install_probe(), self.loop).result()
+
+    def sample_threads(self):
+        self.thread_samples.append(threading.active_count())
+
+    def stop(self):
+        if self._stop_probe:
+            self.loop.call_soon_threadsafe(self._stop_probe.set)
+        self.server.should_exit = True
+        self.thread.join(10)
+
+
+async def _one_request(client: httpx.AsyncClient, endpoint: str, prompt: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    first_event = None
+    try:
+        if endpoint == "generate-ui-stream":
+            status = None
+            async with client.stream("POST", f"/{endpoint}", json={"prompt": prompt}) as response:
+                status = response.status_code
+                async for line in response.aiter_lines():
+                    if line.startswith("data:"):
+                        if first_event is None:
+                            first_event = time.perf_counter() - start
+                        event = json.loads(line[5:])
+                        if event.get("type") == "error":
+                            status = "stream_error"
+        else:
+            response = await client.post(f"/{endpoint}", json={"prompt": prompt})
+            status = response.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+
+    return {
+        "endpoint": endpoint,
+        "status": status,
+        "latency_ms": (time.perf_counter() - start) * 1000,
+        "first_event_ms": first_event * 1000 if first_event is not None else None,
+    }
+
+
+async def run_load(base_url: str, endpoints: List[str], concurrency: int, total: int,
+                   duration: Optional[float], timeout: float, server: Optional[InProcessServer] = None,
+                   seed: int = 42) -> Dict[str, Any]:
+    """Drive the endpoints with ``concurrency`` workers; returns the report dict"""
+    prompts = load_prompts()
+    rng = random.Random(seed)
+    results: List[Dict[str, Any]] = []
+    issued = 0
+    deadline = time.perf_counter() + duration if duration else None
+
+    client_lag: List[float] = []
+    stop_probe = asyncio.Event()
+    probe = asyncio.create_task(lag_probe(client_lag, stop_probe))
+
+    async def sample_threads():
+        while not stop_probe.is_set():
+            if server:
+                server.sample_threads()
+            await asyncio.sleep(0.25)
+    sampler = asyncio.create_task(sample_threads())
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def worker():
+            nonlocal issued
+            while True:
+                if deadline is not None:
+                    if time.perf_counter() >= deadline:
+                        return
+                elif issued >= total:
+                    return
+                issued += 1
+                endpoint = endpoints[issued % len(endpoints)]
+                results.append(await _one_request(client, endpoint, rng.choice(prompts)))
+
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - wall_start
+
+    stop_probe.set()
+    await asyncio.gather(probe, sampler)
+
+    report: Dict[str, Any] = {
+        "config": {
+            "url": base_url,
+            "endpoints": endpoints,
+            "concurrency": concurrency,
+            "requests": len(results),
+            "duration_s": duration,
+            "in_process": server is not None,
+            "stub_providers": os.getenv("USE_STUB_PROVIDERS") == "1",
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(results) / wall, 3) if wall else 0.0,
+        "client_loop_lag_ms": percentiles(client_lag),
+        "endpoints": {},
+    }
+    for endpoint in endpoints:
+        subset = [r for r in results if r["endpoint"] == endpoint]
+        if not subset:
+            continue
+        statuses: Dict[str, int] = {}
+        for r in subset:
+            statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+        ok = [r for r in subset if r["status"] == 200]
+        report["endpoints"][endpoint] = {
+            "requests": len(subset),
+            "ok": len(ok),
+            "statuses": statuses,
+            "latency_ms": percentiles([r["latency_ms"] for r in ok]),
+            "first_event_ms": percentiles([r["first_event_ms"] for r in ok if r["first_event_ms"] is not None]),
+        }
+    if server:
+        report["server_loop_lag_ms"] = percentiles(server.lag_samples)
+        report["threads"] = {
+            "max": max(server.thread_samples, default=0),
+            "mean": round(float(np.mean(server.thread_samples)), 1) if server.thread_samples else 0,
+        }
+    return report
+
+
+def print_report(report: Dict[str, Any]):
+    print("=" * 70)
+    print("🔥 LOAD TEST RESULTS")
+    print("=" * 70)
+    config = report["config"]
+    print(f"   Target: {config['url']} | Concurrency: {config['concurrency']} | "
+          f"Stub providers: {'yes' if config['stub_providers'] else 'no'}")
+    print(f"   Requests: {config['requests']} in {report['wall_seconds']:.2f}s "
+          f"({report['throughput_rps']:.2f} req/s)")
+    for endpoint, stats in report["endpoints"].items():
+        latency = stats["latency_ms"] or {}
+        print(f"\n   /{endpoint}: {stats['ok']}/{stats['requests']} ok  statuses={stats['statuses']}")
+        if latency:
+            print(f"      latency  p50 {latency['p50']:.0f}ms  p95 {latency['p95']:.0f}ms  "
+                  f"p99 {latency['p99']:.0f}ms  max {latency['max']:.0f}ms")
+        if stats["first_event_ms"]:
+            first = stats["first_event_ms"]
+            print(f"      first event  p50 {first['p50']:.0f}ms  p99 {first['p99']:.0f}ms")
+    if "server_loop_lag_ms" in report:
+        lag = report["server_loop_lag_ms"]
+        if lag:
+            print(f"\n   Server loop lag  p50 {lag['p50']:.1f}ms  p99 {lag['p99']:.1f}ms  max {lag['max']:.1f}ms")
+        print(f"   Threads  max {report['threads']['max']}  mean {report['threads']['mean']}")
+    lag = report["client_loop_lag_ms"]
+    if lag:
+        print(f"   Client loop lag  p99 {lag['p99']:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test /generate-ui and /generate-ui-stream")
+    parser.add_argument("--url", default=None, help="Server URL (default: run the app in-process)")
+    parser.add_argument("--in-process", action="store_true", help="Run the app in this process")
+    parser.add_argument("--endpoint", choices=ENDPOINTS + ("mixed",), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=None, help="Run for N seconds instead of --requests")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's INFO logging")
+    args = parser.parse_args()
+
+    server = None
+    if args.in_process or not args.url:
+        server = InProcessServer(verbose=args.verbose)
+        server.start()
+
+    endpoints = list(ENDPOINTS) if args.endpoint == "mixed" else [args.endpoint]
+    try:
+        report = asyncio.run(run_load(
+            args.url or server.url, endpoints, args.concurrency, args.requests,
+            args.duration, args.timeout, server=server, seed=args.seed,
+        ))
+    finally:
+        if server:
+            server.stop()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report saved to: {args.output}")
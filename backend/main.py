@@ -1,25 +1,47 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Depends, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from starlette.background import BackgroundTask
 import uvicorn
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Callable, Awaitable
 import asyncio
 import json
+import os
+import time
+import hmac
+import uuid
+import contextvars
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from base.models import PromptRequest, CodeResponse
+from base.models import (
+    PromptRequest, CodeResponse, RetrievalRequest, JobRequest, BatchRequest, GenerationBudget, RefineRequest,
+)
 from gemini.gemini_services import GeminiService
 from groqs.groq_services import GroqService
 from coheres.cohere_services import CohereService
 from huggingFace.huggingFace_services import HuggingFaceService
 from openRouter.openRouter_services import OpenRouterService
 from training_model.training_model_service import TrainingModelService
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from training_model.embedding_cache import QueryEmbeddingCache, normalize_query
+from training_model.online_indexer import OnlineIndexer
+from stubs.stub_services import stub_service_from_env
+from base.logging_config import configure_logging, start_request, request_id_var
+from base.tracing import TRACER, start_span
+from base.profiler import SamplingProfiler, try_acquire_profile, release_profile
+from base.single_flight import SingleFlight
+from base.job_store import JobStore, JobRunner, callback_allowed
+from base.result_store import ResultStore
+from base.admission import AdmissionController, AdmissionRejected
+from base.complexity import PromptComplexity, classify_prompt
+from base.usage import USAGE, RUN, DOWNGRADE, SKIP, plan_budget, track_usage
+from base.metrics import (
+    REGISTRY, CONTENT_TYPE, LLM_REQUESTS, LLM_QUEUE_SECONDS, LLM_GENERATION_SECONDS,
+    HTTP_REQUESTS, HTTP_REQUEST_SECONDS, SINGLE_FLIGHT, ROUTING_DECISIONS,
+    LLM_ROUTE_REQUESTS, LLM_ROUTE_SECONDS, LLM_BUDGET_DECISIONS,
 )
+
+# Configure logging (JSON lines written by a background thread; see base/logging_config.py)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 app = FastAPI(
@@ -37,12 +59,60 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_http_metrics(request: Request, call_next):
+    """Count requests and time them to response headers, labelled by route template"""
+    start = time.perf_counter()
+    status = "500"
+    try:
+        response = await call_next(request)
+        status = str(response.status_code)
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        HTTP_REQUESTS.inc(request.method, path, status)
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, path)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Root span per request (continuing an incoming W3C traceparent); the id is returned as X-Trace-ID"""
+    with TRACER.start_remote_child(f"{request.method} {request.url.path}", request.headers.get("traceparent"),
+                                   request_id=request_id_var.get()) as span:
+        response = await call_next(request)
+        if span.is_recording:
+            route = request.scope.get("route")
+            if route is not None:
+                span.name = f"{request.method} {route.path}"
+            span.set_attribute("http.status_code", response.status_code)
+            response.headers["X-Trace-ID"] = f"{span.trace_id:032x}"
+        return response
+
+@app.middleware("http")
+async def bind_request_id(request: Request, call_next):
+    """Tag every log record of the request with X-Request-ID (generated if absent)"""
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    start_request(request_id)
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 # Initialize all LLM services
 services: Dict[str, Any] = {}
 SERVICE_TYPES = ['gemini', 'groq', 'cohere', 'huggingface', 'openrouter']
 
 def initialize_services():
     """Initialize all available LLM services"""
+    if os.getenv("USE_STUB_PROVIDERS", "0") == "1":
+        # Load testing: fake in-process providers, no API keys or quota needed
+        for service_type in SERVICE_TYPES:
+            try:
+                services[service_type] = stub_service_from_env(service_type)
+            except Exception as e:
+                logger.warning(f"⚠️ Error initializing {service_type} stub: {e}")
+                services[service_type] = None
+        return
+    
     for service_type in SERVICE_TYPES:
         try:
             logger.info(f"🚀 Initializing {service_type.upper()} service...")
@@ -72,12 +142,29 @@ initialize_services()
 
 # Initialize training model service
 training_model_service = None
-TRAINING_MODEL_PATH = "training_model/flutter_ui_retrieval_model.pkl"
+# Prefer the memory-mappable artifact from Training_Model/build_retriever.py
+TRAINING_MODEL_PATH = os.getenv("TRAINING_MODEL_PATH") or next(
+    (path for path in ("training_model/flutter_ui_retrieval_model", "training_model/flutter_ui_retrieval_model.pkl")
+     if os.path.exists(path)),
+    "training_model/flutter_ui_retrieval_model.pkl"
+)
+
+# Shared by every component that embeds prompts
+query_embedding_cache = QueryEmbeddingCache(
+    max_size=int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "4096"))
+)
 
 try:
-    import os
     if os.path.exists(TRAINING_MODEL_PATH):
-        training_model_service = TrainingModelService(pkl_path=TRAINING_MODEL_PATH)
+        training_model_service = TrainingModelService(
+            pkl_path=TRAINING_MODEL_PATH,
+            # The manifest pins the encoder the matrix was embedded with; write one with
+            # python -m training_model.training_model_service --write-manifest, then set this to 1
+            require_manifest=os.getenv("TRAINING_MODEL_REQUIRE_MANIFEST", "0") == "1",
+            embedding_cache=query_embedding_cache,
+            retrieval_mode=os.getenv("RETRIEVAL_MODE", "hybrid"),
+            sparse_first_stage=int(os.getenv("RETRIEVER_SPARSE_FIRST_STAGE", "0")) or None
+        )
         if training_model_service.load():
             logger.info("✅ Training model loaded successfully")
         else:
@@ -89,38 +176,522 @@ except Exception as e:
     logger.error(f"❌ Error loading training model: {e}")
     training_model_service = None
 
-def generate_code_with_service(service_name: str, service: Any, prompt: str) -> Dict[str, Any]:
-    """Generate code using a single service"""
+# Feed accepted LLM generations back into the retriever (never stub outputs: random screens unrelated to the prompt)
+online_indexer = None
+if training_model_service and os.getenv("ONLINE_INDEXING", "1") == "1" and os.getenv("USE_STUB_PROVIDERS", "0") != "1":
+    try:
+        online_indexer = OnlineIndexer(
+            training_model_service,
+            log_path=os.getenv("ONLINE_INDEX_LOG", "training_model/online_entries.jsonl")
+        )
+        online_indexer.start()
+    except Exception as e:
+        logger.error(f"❌ Error starting online indexer: {e}")
+        online_indexer = None
+
+def index_accepted_results(prompt: str, results: List[Dict[str, Any]]):
+    """Queue successful provider outputs for online indexing"""
+    if not online_indexer:
+        return
+    for result in results:
+        if result.get("success") and result.get("code") and result.get("service") != "training_model":
+            online_indexer.submit(prompt, result["code"], result["service"])
+
+# Retrieval-augmented prompts: the nearest dataset screens go to every provider as few-shot examples
+RAG_FEW_SHOT_ENABLED = os.getenv("RAG_FEW_SHOT", "0") == "1"
+RAG_FEW_SHOT_K = int(os.getenv("RAG_FEW_SHOT_K", "3"))
+RAG_MIN_SCORE = float(os.getenv("RAG_MIN_SCORE", "0.3"))
+
+def retrieve_examples(prompt: str) -> List[Dict[str, Any]]:
+    """Top matches for a prompt (the query embedding is cached, so each provider's lookup is cheap)"""
+    return training_model_service.search(prompt, top_k=RAG_FEW_SHOT_K, threshold=RAG_MIN_SCORE)
+
+if RAG_FEW_SHOT_ENABLED and training_model_service:
+    for service in services.values():
+        if service is not None:
+            service.example_retriever = retrieve_examples
+    logger.info("📚 Few-shot examples enabled (top %d, min score %.2f)", RAG_FEW_SHOT_K, RAG_MIN_SCORE)
+
+@app.on_event("shutdown")
+def shutdown_online_indexer():
+    """Flush pending online index entries"""
+    if online_indexer:
+        online_indexer.stop()
+
+REGISTRY.gauge("online_index_queue", "Accepted generations waiting to be indexed").set_function(
+    lambda: online_indexer.stats()["queued"] if online_indexer else None
+)
+REGISTRY.gauge("retriever_rows", "Rows searchable by the training model").set_function(
+    lambda: training_model_service.snapshot().size if training_model_service else None
+)
+REGISTRY.gauge("embedding_cache_hit_rate", "Query embedding cache hit rate").set_function(
+    lambda: query_embedding_cache.stats()["hit_rate"]
+)
+
+# Generated code is kept by result_id so /refine can send diffs instead of regenerating the screen
+RESULT_DB_PATH = os.getenv("RESULT_DB_PATH", "jobs/results.sqlite3")
+result_store = ResultStore(RESULT_DB_PATH)
+
+@app.on_event("startup")
+def purge_results():
+    """Drop stored results past RESULT_RETENTION_HOURS"""
+    purged = result_store.purge(float(os.getenv("RESULT_RETENTION_HOURS", "168")) * 3600)
+    if purged:
+        logger.info("🧹 Results: %d expired purged", purged)
+
+def save_result(service_name: str, widget_name: Optional[str], prompt: str, code: str,
+                parent_id: Optional[str] = None, mode: str = "generate") -> Optional[str]:
+    """Store a successful generation; None (and a warning) when the store is unavailable"""
     try:
-        if service is None:
+        return result_store.save(service_name, widget_name, prompt, code, parent_id, mode)
+    except Exception as e:
+        logger.warning("⚠️ Could not store %s result: %s", service_name, e)
+        return None
+
+def generate_code_with_service(service_name: str, service: Any, prompt: str,
+                               submitted_at: Optional[float] = None,
+                               complexity: Optional[PromptComplexity] = None,
+                               budget_decision: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Generate code using a single service (on its small model when ``complexity`` says simple)
+    
+    ``budget_decision`` is the request budget's verdict for this service
+    (base/usage.py); DOWNGRADE forces the small model.
+    """
+    start = time.perf_counter()
+    route = complexity.route if complexity else "unrouted"
+    model_route = "simple" if budget_decision == DOWNGRADE else (complexity.route if complexity else None)
+    budget_fields = {"budget": budget_decision} if budget_decision else {}
+    with start_span("generate_code_with_service", service=service_name, route=route) as span:
+        if submitted_at is not None:
+            LLM_QUEUE_SECONDS.observe(start - submitted_at, service_name)
+            span.set_attribute("queue_ms", round((start - submitted_at) * 1000, 3))
+        try:
+            if service is None:
+                LLM_REQUESTS.inc(service_name, "unavailable")
+                return {
+                    "service": service_name,
+                    "success": False,
+                    "error": "Service not initialized",
+                    "code": None,
+                    "widget_name": None
+                }
+            
+            logger.debug("🔄 Generating code with %s...", service_name)
+            with track_usage() as usage:
+                code, success, error = service.generate_flutter_code(prompt, model_route)
+            elapsed = time.perf_counter() - start
+            LLM_REQUESTS.inc(service_name, "success" if success else "failed")
+            LLM_GENERATION_SECONDS.observe(elapsed, service_name)
+            LLM_ROUTE_REQUESTS.inc(service_name, route, "success" if success else "failed")
+            LLM_ROUTE_SECONDS.observe(elapsed, service_name, route)
+            span.set_attribute("success", success)
+            
+            return {
+                "service": service_name,
+                "success": success,
+                "error": error,
+                "code": code,
+                "widget_name": service.widget_name,
+                "model": service.model_for(model_route),
+                "route": route,
+                "usage": usage.as_dict(),
+                "result_id": save_result(service_name, service.widget_name, prompt, code) if success else None,
+                **budget_fields
+            }
+        except Exception as e:
+            logger.error(f"❌ Error with {service_name}: {str(e)}")
+            LLM_REQUESTS.inc(service_name, "error")
+            LLM_ROUTE_REQUESTS.inc(service_name, route, "error")
+            span.record_exception(e)
             return {
                 "service": service_name,
                 "success": False,
-                "error": "Service not initialized",
+                "error": f"Generation failed: {str(e)}",
                 "code": None,
-                "widget_name": None
+                "widget_name": None,
+                **budget_fields
             }
-        
-        logger.info(f"🔄 Generating code with {service_name}...")
-        code, success, error = service.generate_flutter_code(prompt)
-        
-        return {
-            "service": service_name,
-            "success": success,
-            "error": error,
-            "code": code,
-            "widget_name": service.widget_name,
-            "model": service.current_model_name
-        }
+
+def refine_with_service(service_name: str, service: Any, previous: Dict[str, Any], instruction: str) -> Dict[str, Any]:
+    """Apply ``instruction`` to a stored result with one service and store the refined code"""
+    start = time.perf_counter()
+    with start_span("refine_with_service", service=service_name) as span:
+        try:
+            with track_usage() as usage:
+                code, success, error, mode = service.refine_flutter_code(previous["code"], instruction)
+            span.set_attribute("success", success)
+            span.set_attribute("mode", mode)
+            return {
+                "service": service_name,
+                "success": success,
+                "error": error,
+                "code": code,
+                "widget_name": service.widget_name,
+                "model": service.current_model_name,
+                "mode": mode,
+                "result_id": save_result(service_name, service.widget_name, instruction, code,
+                                         previous["result_id"], mode) if success else None,
+                "parent_id": previous["result_id"],
+                "usage": usage.as_dict(),
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1)
+            }
+        except Exception as e:
+            logger.error(f"❌ Refinement with {service_name} failed: {str(e)}")
+            span.record_exception(e)
+            return {
+                "service": service_name,
+                "success": False,
+                "error": f"Refinement failed: {str(e)}",
+                "code": None,
+                "widget_name": None,
+                "mode": "failed",
+                "result_id": None,
+                "parent_id": previous["result_id"],
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1)
+            }
+
+# Complexity-aware model routing: prompts classified simple go to each provider's small model
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING", "0") == "1"
+MODEL_ROUTING_THRESHOLD = float(os.getenv("MODEL_ROUTING_THRESHOLD", "1.0"))
+
+async def classify_generation(prompt: str, filters: Optional[Dict[str, Any]] = None,
+                              neighbours: Optional[List[Dict[str, Any]]] = None) -> Optional[PromptComplexity]:
+    """Complexity route for a prompt, using retriever neighbours (looked up unless given); None when disabled"""
+    if not MODEL_ROUTING_ENABLED:
+        return None
+    if neighbours is None and training_model_service:
+        loop = asyncio.get_event_loop()
+        try:
+            neighbours = await loop.run_in_executor(
+                None,
+                contextvars.copy_context().run,
+                lambda: training_model_service.search(prompt, top_k=3, filters=filters)
+            )
+        except Exception as e:
+            logger.debug("⚠️ Neighbour lookup for complexity routing failed: %s", e)
+    complexity = classify_prompt(prompt, neighbours or (), MODEL_ROUTING_THRESHOLD)
+    logger.debug("🧭 Prompt routed %s (score %.2f, %s)", complexity.route, complexity.score, complexity.features)
+    return complexity
+
+def complexity_summary(complexity: Optional[PromptComplexity]) -> Dict[str, Any]:
+    if complexity is None:
+        return {}
+    return {"complexity": {"route": complexity.route, "score": complexity.score}}
+
+def budget_plan(prompt: str, complexity: Optional[PromptComplexity], budget: Optional[GenerationBudget],
+                planned_services: Dict[str, Any]) -> Dict[str, str]:
+    """Run / downgrade / skip per service under the request budget; empty without one"""
+    if budget is None:
+        return {}
+    plan = plan_budget(planned_services, prompt, complexity.route if complexity else None, budget)
+    for service_name, decision in plan.items():
+        LLM_BUDGET_DECISIONS.inc(service_name, decision)
+    if any(decision != RUN for decision in plan.values()):
+        logger.info("💰 Request budget plan: %s", plan)
+    return plan
+
+def budget_skipped(service_name: str) -> Dict[str, Any]:
+    LLM_REQUESTS.inc(service_name, "skipped")
+    return {
+        "service": service_name,
+        "success": False,
+        "error": "Skipped: estimated usage exceeds the request budget",
+        "code": None,
+        "widget_name": None,
+        "budget": SKIP
+    }
+
+def usage_summary(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Provider usage summed over the results (cost None if any call was unpriced)"""
+    usages = [r["usage"] for r in results if r.get("usage")]
+    costs = [u["cost_usd"] for u in usages]
+    return {
+        "prompt_tokens": sum(u["prompt_tokens"] for u in usages),
+        "completion_tokens": sum(u["completion_tokens"] for u in usages),
+        "cached_tokens": sum(u["cached_tokens"] for u in usages),
+        "cost_usd": None if None in costs else round(sum(costs), 6),
+    }
+
+# Identical prompts in flight at the same time share one provider fan-out
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT", "1") == "1"
+generation_flight = SingleFlight("generate-ui")
+
+def generation_key(endpoint: str, prompt: str, filters: Optional[Dict[str, Any]],
+                   budget: Optional[GenerationBudget] = None) -> tuple:
+    """Normalized prompt + the services that would run + retriever filters + budget"""
+    return (
+        endpoint,
+        normalize_query(prompt),
+        tuple(name for name, service in services.items() if service is not None),
+        json.dumps(filters, sort_keys=True) if filters else None,
+        budget.model_dump_json() if budget else None,
+    )
+
+# Admission control: at most ADMISSION_MAX_CONCURRENT fan-outs run at once, the rest queue by priority
+admission = AdmissionController(
+    max_concurrent=int(os.getenv("ADMISSION_MAX_CONCURRENT", "8")),
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "64")),
+    max_wait=float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "30"))
+)
+# "designsystem=low,checkout=high"; takes precedence over the X-Priority header
+TENANT_PRIORITIES = {
+    tenant.strip(): priority.strip().lower()
+    for tenant, _, priority in (item.partition("=") for item in os.getenv("ADMISSION_TENANT_PRIORITIES", "").split(","))
+    if tenant.strip() and priority.strip()
+}
+
+def request_tenant(http_request: Request) -> str:
+    """X-Tenant-ID header, else the client address"""
+    return http_request.headers.get("x-tenant-id") or (http_request.client.host if http_request.client else "anonymous")
+
+def request_priority(http_request: Request, tenant: str) -> str:
+    return admission.priority_for(
+        TENANT_PRIORITIES.get(tenant) or (http_request.headers.get("x-priority") or "normal").lower()
+    )
+
+def admission_rejected(error: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=f"Server busy ({error.reason}), retry later",
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+REGISTRY.gauge("admission_queue_depth", "Generations waiting for an admission slot", ("priority",)).set_function(
+    lambda: {(priority,): depth for priority, depth in admission.queue_depths().items()}
+)
+REGISTRY.gauge("admission_in_flight", "Generations holding an admission slot").set_function(
+    lambda: admission.in_flight
+)
+
+def training_model_failure(error: Exception) -> Dict[str, Any]:
+    return {
+        "service": "training_model",
+        "success": False,
+        "error": str(error),
+        "code": None,
+        "widget_name": "TrainingModelGeneratedWidget",
+        "model": None,
+        "score": None
+    }
+
+async def run_llm_fanout(
+    prompt: str,
+    on_result: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    complexity: Optional[PromptComplexity] = None,
+    budget: Optional[GenerationBudget] = None
+) -> List[Dict[str, Any]]:
+    """Run every LLM service in parallel (within ``budget``) and queue the accepted outputs for indexing"""
+    loop = asyncio.get_event_loop()
+    executor = ThreadPoolExecutor(max_workers=5)
+    plan = budget_plan(prompt, complexity, budget, services)
+    
+    async def run_service(service_name: str, service: Any) -> Dict[str, Any]:
+        if plan.get(service_name) == SKIP:
+            result = budget_skipped(service_name)
+        else:
+            result = await loop.run_in_executor(
+                executor,
+                contextvars.copy_context().run,
+                generate_code_with_service,
+                service_name,
+                service,
+                prompt,
+                time.perf_counter(),
+                complexity,
+                plan.get(service_name)
+            )
+        if on_result:
+            await on_result(result)
+        return result
+    
+    try:
+        results = list(await asyncio.gather(*(
+            run_service(service_name, service) for service_name, service in services.items()
+        )))
+    finally:
+        executor.shutdown(wait=False)
+    
+    index_accepted_results(prompt, results)
+    return results
+
+async def run_training_model(prompt: str, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    loop = asyncio.get_event_loop()
+    try:
+        return await loop.run_in_executor(
+            None,
+            contextvars.copy_context().run,
+            lambda: training_model_service.get_code(prompt, filters=filters)
+        )
     except Exception as e:
-        logger.error(f"❌ Error with {service_name}: {str(e)}")
-        return {
-            "service": service_name,
-            "success": False,
-            "error": f"Generation failed: {str(e)}",
-            "code": None,
-            "widget_name": None
-        }
+        logger.error(f"❌ Training model failed: {e}")
+        return training_model_failure(e)
+
+def generation_summary(results: List[Dict[str, Any]], **extra: Any) -> Dict[str, Any]:
+    successful = sum(1 for r in results if r['success'])
+    return {
+        "total_services": len(results),
+        "successful": successful,
+        "failed": len(results) - successful,
+        "timestamp": None,
+        "usage": usage_summary(results),
+        **extra
+    }
+
+# Retriever-first routing: answer from the training model alone when its match is confident enough
+ROUTING_MODE = os.getenv("ROUTING_MODE", "fanout")  # "fanout" or "retriever_first"
+RETRIEVER_CONFIDENCE_THRESHOLD = float(os.getenv("RETRIEVER_CONFIDENCE_THRESHOLD", "0.85"))
+# What happens to the LLM calls of a short-circuited prompt: "skip", or "background" (still run, for indexing)
+RETRIEVER_FIRST_LLM = os.getenv("RETRIEVER_FIRST_LLM", "skip")
+RETRIEVER_FIRST_BACKGROUND_MAX = int(os.getenv("RETRIEVER_FIRST_BACKGROUND_MAX", "4"))
+background_fanouts: set = set()
+
+def confident_match(training_result: Dict[str, Any]) -> bool:
+    score = training_result.get("score")
+    return bool(training_result["success"]) and score is not None and score >= RETRIEVER_CONFIDENCE_THRESHOLD
+
+def start_background_fanout(prompt: str) -> bool:
+    """Run the skipped LLM calls after responding, at low admission priority; False when at capacity"""
+    if len(background_fanouts) >= RETRIEVER_FIRST_BACKGROUND_MAX:
+        return False
+    
+    async def fanout():
+        try:
+            async with admission.admit("background", "low"):
+                await run_llm_fanout(prompt, complexity=await classify_generation(prompt))
+        except AdmissionRejected:
+            logger.debug("🚦 Background fan-out dropped: admission queue full")
+    
+    task = asyncio.ensure_future(fanout())
+    background_fanouts.add(task)
+    task.add_done_callback(background_fanouts.discard)
+    return True
+
+def retriever_short_circuit(prompt: str, training_result: Dict[str, Any]) -> Dict[str, Any]:
+    """Route a confident retriever match; returns the summary fields describing the decision"""
+    ROUTING_DECISIONS.inc("retriever")
+    background = RETRIEVER_FIRST_LLM == "background" and start_background_fanout(prompt)
+    llm_calls = "background" if background else "skipped"
+    logger.info("⚡ Retriever match %.3f >= %.2f, LLM calls %s",
+                training_result["score"], RETRIEVER_CONFIDENCE_THRESHOLD, llm_calls)
+    return {"routed_to": "retriever", "retriever_score": training_result["score"], "llm_calls": llm_calls}
+
+async def run_generation(
+    prompt: str,
+    filters: Optional[Dict[str, Any]] = None,
+    on_result: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    budget: Optional[GenerationBudget] = None
+) -> Dict[str, Any]:
+    """
+    Fan out to every service in parallel, then the training model; returns results and summary.
+    
+    With ROUTING_MODE=retriever_first the training model runs first, and a
+    match scoring at least RETRIEVER_CONFIDENCE_THRESHOLD is returned on its
+    own. ``on_result`` is awaited with each service's result as soon as it
+    completes; ``budget`` downgrades or skips providers (see budget_plan).
+    """
+    if training_model_service and ROUTING_MODE == "retriever_first":
+        training_result = await run_training_model(prompt, filters)
+        if on_result:
+            await on_result(training_result)
+        if confident_match(training_result):
+            return {
+                "results": [training_result],
+                "summary": generation_summary([training_result], **retriever_short_circuit(prompt, training_result))
+            }
+        ROUTING_DECISIONS.inc("fanout")
+        complexity = await classify_generation(prompt, filters, training_result.get("matches"))
+        results = await run_llm_fanout(prompt, on_result, complexity, budget) + [training_result]
+    else:
+        complexity = await classify_generation(prompt, filters)
+        results = await run_llm_fanout(prompt, on_result, complexity, budget)
+        
+        # Generate code with training model
+        if training_model_service:
+            results.append(await run_training_model(prompt, filters))
+            if on_result:
+                await on_result(results[-1])
+    
+    return {
+        "results": results,
+        "summary": generation_summary(results, **complexity_summary(complexity))
+    }
+
+async def admitted_generation(tenant: str, priority: str, prompt: str,
+                              filters: Optional[Dict[str, Any]] = None,
+                              budget: Optional[GenerationBudget] = None) -> Dict[str, Any]:
+    """``run_generation`` once the admission controller grants a slot"""
+    async with admission.admit(tenant, priority) as waited:
+        response = await run_generation(prompt, filters, budget=budget)
+    response["summary"]["admission_wait_ms"] = round(waited * 1000, 1)
+    return response
+
+def parse_provider_limits(spec: str, default: int) -> Dict[str, int]:
+    """Per-service concurrency from ``"groq=8,gemini=2"``; unlisted services get ``default``"""
+    limits = {name: default for name in SERVICE_TYPES + ["training_model"]}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            limits[name.strip()] = max(1, int(value))
+    return limits
+
+# Batch generation: at most this many calls in flight per provider, sized to its rate limit
+PROVIDER_CONCURRENCY = parse_provider_limits(
+    os.getenv("PROVIDER_CONCURRENCY", ""),
+    int(os.getenv("PROVIDER_CONCURRENCY_DEFAULT", "4"))
+)
+BATCH_MAX_PROMPTS = int(os.getenv("BATCH_MAX_PROMPTS", "500"))
+provider_semaphores = {name: asyncio.Semaphore(limit) for name, limit in PROVIDER_CONCURRENCY.items()}
+batch_executor = ThreadPoolExecutor(
+    max_workers=sum(PROVIDER_CONCURRENCY.values()),
+    thread_name_prefix="batch"
+)
+
+@app.on_event("shutdown")
+def shutdown_batch_executor():
+    batch_executor.shutdown(wait=False, cancel_futures=True)
+
+# Asynchronous jobs: state in SQLite so any worker process can answer polls
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "jobs/jobs.sqlite3")
+JOB_CALLBACK_ALLOWED_HOSTS = [
+    host.strip() for host in os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "localhost,127.0.0.1").split(",") if host.strip()
+]
+job_store = JobStore(JOB_DB_PATH)
+
+async def execute_job(job_id: str, prompt: str, filters: Optional[Dict[str, Any]],
+                      budget: Optional[GenerationBudget] = None) -> Dict[str, Any]:
+    """Run one job, storing each service's result as it completes"""
+    loop = asyncio.get_event_loop()
+    
+    async def record(result: Dict[str, Any]):
+        await loop.run_in_executor(None, job_store.add_result, job_id, result)
+    
+    # Jobs were accepted already: they wait for a slot at low priority instead of being refused
+    async with admission.admit("jobs", "low", bounded=False):
+        response = await run_generation(prompt, filters, on_result=record, budget=budget)
+    return response["summary"]
+
+job_runner = JobRunner(
+    job_store,
+    execute_job,
+    workers=int(os.getenv("JOB_WORKERS", "2")),
+    max_queue=int(os.getenv("JOB_MAX_QUEUE", "100")),
+    heartbeat_interval=float(os.getenv("JOB_HEARTBEAT_SECONDS", "15")),
+    heartbeat_timeout=float(os.getenv("JOB_HEARTBEAT_TIMEOUT_SECONDS", "60"))
+)
+
+@app.on_event("startup")
+async def start_job_runner():
+    """Fail jobs orphaned by a previous run or a dead worker process, drop expired ones, start the workers"""
+    orphaned = job_runner.sweep()
+    purged = job_store.purge(float(os.getenv("JOB_RETENTION_HOURS", "24")) * 3600)
+    if orphaned or purged:
+        logger.info("🧹 Jobs: %d orphaned marked failed, %d expired purged", orphaned, purged)
+    job_runner.start()
+
+@app.on_event("shutdown")
+async def stop_job_runner():
+    await job_runner.stop()
 
 @app.get("/")
 async def root():
@@ -154,7 +725,8 @@ async def health_check():
         "services_status": {
             name: "initialized" if service else "failed"
             for name, service in services.items()
-        }
+        },
+        "admission": admission.stats()
     }
 
 @app.get("/models")
@@ -181,7 +753,7 @@ async def list_models():
     }
 
 @app.post("/generate-ui")
-async def generate_ui(request: PromptRequest):
+async def generate_ui(request: PromptRequest, http_request: Request):
     """
     Generate Flutter UI code from natural language prompt using ALL services
     
@@ -194,6 +766,10 @@ async def generate_ui(request: PromptRequest):
       - widget_name: Name of the generated widget class
       - model: Model used by the service
     - summary: Summary of generation results
+    
+    Requests queue for an admission slot by priority (X-Priority: high, normal,
+    low; per tenant via ADMISSION_TENANT_PRIORITIES) and tenant (X-Tenant-ID);
+    503 with Retry-After when the queue is full.
     """
     if not services or all(v is None for v in services.values()):
         raise HTTPException(
@@ -208,84 +784,86 @@ async def generate_ui(request: PromptRequest):
         )
     
     try:
-        logger.info("=" * 80)
-        logger.info(f"🎨 NEW MULTI-SERVICE UI GENERATION REQUEST")
-        logger.info(f"📝 Prompt: {request.prompt}")
-        logger.info(f"🔧 Services: {len(services)} available")
-        logger.info("=" * 80)
-        
-        # Generate code with all services in parallel
-        results = []
+        logger.info("🎨 Multi-service UI generation request (%d services, %d-character prompt)",
+                    len(services), len(request.prompt))
+        logger.debug("📝 Prompt: %r", request.prompt)
         
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = []
-            for service_name, service in services.items():
-                future = executor.submit(
-                    generate_code_with_service,
-                    service_name,
-                    service,
-                    request.prompt
-                )
-                futures.append(future)
-            
-            # Collect results as they complete
-            for future in futures:
-                result = future.result()
-                results.append(result)
-        
-        # Generate code with training model
-        if training_model_service:
-            logger.info("🧠 Running training model...")
-            try:
-                training_result = training_model_service.get_code(request.prompt)
-                results.append(training_result)
-                logger.info("✅ Training model result added")
-            except Exception as e:
-                logger.error(f"❌ Training model failed: {e}")
-                results.append({
-                    "service": "training_model",
-                    "success": False,
-                    "error": str(e),
-                    "code": None,
-                    "widget_name": "TrainingModelGeneratedWidget",
-                    "model": None,
-                    "score": None
-                })
-        
-        # Calculate summary
-        successful = sum(1 for r in results if r['success'])
-        failed = len(results) - successful
-        
-        logger.info("=" * 80)
-        logger.info(f"✅ MULTI-SERVICE GENERATION COMPLETED")
-        logger.info(f"   Total services: {len(results)}")
-        logger.info(f"   Successful: {successful}")
-        logger.info(f"   Failed: {failed}")
-        logger.info("=" * 80)
+        tenant = request_tenant(http_request)
+        priority = request_priority(http_request, tenant)
+        if SINGLE_FLIGHT_ENABLED:
+            # Followers join the leader's place in the queue instead of taking a slot
+            response, shared = await generation_flight.do(
+                generation_key("generate-ui", request.prompt, request.filters, request.budget),
+                lambda: admitted_generation(tenant, priority, request.prompt, request.filters, request.budget)
+            )
+            SINGLE_FLIGHT.inc("generate-ui", "follower" if shared else "leader")
+            if shared:
+                logger.info("🔗 Joined an in-flight generation for the same prompt")
+                response = {**response, "summary": {**response["summary"], "coalesced": True}}
+        else:
+            response = await admitted_generation(tenant, priority, request.prompt, request.filters, request.budget)
         
-        return {
-            "results": results,
-            "summary": {
-                "total_services": len(results),
-                "successful": successful,
-                "failed": failed,
-                "timestamp": None
-            }
-        }
+        summary = response["summary"]
+        logger.info("✅ Multi-service generation completed: %d/%d successful",
+                    summary["successful"], summary["total_services"])
+        return response
         
+    except AdmissionRejected as e:
+        raise admission_rejected(e)
     except Exception as e:
-        logger.error("=" * 80)
-        logger.error(f"❌ MULTI-SERVICE GENERATION FAILED")
-        logger.error(f"   Error: {str(e)}")
-        logger.error("=" * 80)
+        logger.error("❌ Multi-service generation failed: %s", e)
         
         raise HTTPException(
             status_code=500,
             detail=f"Generation failed: {str(e)}"
         )
 
+@app.post("/refine")
+async def refine_ui(request: RefineRequest, http_request: Request):
+    """
+    Edit a previous generation instead of regenerating the whole screen
+    
+    The stored code (result_id from /generate-ui, a job, a batch or an earlier
+    /refine) goes to one service, by default the one that produced it, which
+    answers with a unified diff that is applied and checked locally; when the
+    diff does not apply the service regenerates the full widget instead
+    ("mode": "patch" or "regenerate"). The refined code gets its own result_id
+    (parent_id points at the edited one), so refinements can be chained.
+    Admission works as for /generate-ui.
+    """
+    loop = asyncio.get_event_loop()
+    previous = await loop.run_in_executor(None, result_store.get, request.result_id)
+    if previous is None:
+        raise HTTPException(status_code=404, detail="Result not found (unknown or expired result_id)")
+    
+    service_name = request.service or previous["service"]
+    if service_name not in services:
+        raise HTTPException(status_code=400, detail=f"Unknown service: {service_name}")
+    service = services[service_name]
+    if service is None:
+        raise HTTPException(status_code=503, detail=f"Service not initialized: {service_name}")
+    
+    tenant = request_tenant(http_request)
+    try:
+        async with admission.admit(tenant, request_priority(http_request, tenant)):
+            result = await loop.run_in_executor(
+                None,
+                contextvars.copy_context().run,
+                refine_with_service,
+                service_name,
+                service,
+                previous,
+                request.instruction
+            )
+    except AdmissionRejected as e:
+        raise admission_rejected(e)
+    
+    logger.info("✏️ Refinement with %s: %s (%s)", service_name,
+                "success" if result["success"] else "failed", result["mode"])
+    return result
+
 @app.post("/generate-ui-stream")
-async def generate_ui_stream(request: PromptRequest):
+async def generate_ui_stream(request: PromptRequest, http_request: Request):
     """
     Generate Flutter UI code with real-time progress updates via Server-Sent Events
     """
@@ -301,12 +879,28 @@ async def generate_ui_stream(request: PromptRequest):
             detail="Prompt cannot be empty"
         )
     
+    key = generation_key("generate-ui-stream", request.prompt, request.filters, request.budget)
+    tenant = request_tenant(http_request)
+    priority = request_priority(http_request, tenant)
+    slot_held = False
+    admitted_at = None
+    
+    async def acquire_slot():
+        nonlocal slot_held, admitted_at
+        await admission.acquire(tenant, priority)
+        slot_held = True
+        admitted_at = time.perf_counter()
+    
+    def release_slot():
+        nonlocal slot_held
+        if slot_held:
+            slot_held = False
+            admission.release(time.perf_counter() - admitted_at)
+    
     async def event_generator():
         try:
-            logger.info("=" * 80)
-            logger.info(f"🎨 NEW STREAMING UI GENERATION REQUEST")
-            logger.info(f"📝 Prompt: {request.prompt}")
-            logger.info("=" * 80)
+            logger.info("🎨 Streaming UI generation request (%d-character prompt)", len(request.prompt))
+            logger.debug("📝 Prompt: %r", request.prompt)
             
             # Send initialization message
             yield f"data: {json.dumps({'type': 'init', 'message': 'Initializing generation...', 'service': 'system'})}\n\n"
@@ -316,6 +910,22 @@ async def generate_ui_stream(request: PromptRequest):
             total_services = len(services) + (1 if training_model_service else 0)
             completed = 0
             
+            # Retriever-first routing: a confident match ends the stream before any LLM call
+            early_training_result = None
+            if training_model_service and ROUTING_MODE == "retriever_first":
+                early_training_result = await run_training_model(request.prompt, request.filters)
+                if confident_match(early_training_result):
+                    decision = retriever_short_circuit(request.prompt, early_training_result)
+                    yield f"data: {json.dumps({'type': 'service_complete', 'service': 'training_model', 'status': 'success', 'completed': 1, 'total': 1})}\n\n"
+                    yield f"data: {json.dumps({'type': 'complete', 'results': [early_training_result], 'summary': {'total_services': 1, 'successful': 1, 'failed': 0, **decision}})}\n\n"
+                    return
+                ROUTING_DECISIONS.inc("fanout")
+            complexity = await classify_generation(
+                request.prompt, request.filters,
+                early_training_result.get("matches") if early_training_result else None
+            )
+            plan = budget_plan(request.prompt, complexity, request.budget, services)
+            
             # Process services sequentially to show progress
             loop = asyncio.get_event_loop()
             for service_name, service in services.items():
@@ -324,13 +934,20 @@ async def generate_ui_stream(request: PromptRequest):
                 await asyncio.sleep(0.1)
                 
                 # Generate code in executor (non-blocking)
-                result = await loop.run_in_executor(
-                    None,
-                    generate_code_with_service,
-                    service_name,
-                    service,
-                    request.prompt
-                )
+                if plan.get(service_name) == SKIP:
+                    result = budget_skipped(service_name)
+                else:
+                    result = await loop.run_in_executor(
+                        None,
+                        contextvars.copy_context().run,
+                        generate_code_with_service,
+                        service_name,
+                        service,
+                        request.prompt,
+                        time.perf_counter(),
+                        complexity,
+                        plan.get(service_name)
+                    )
                 results.append(result)
                 completed += 1
                 
@@ -339,29 +956,30 @@ async def generate_ui_stream(request: PromptRequest):
                 yield f"data: {json.dumps({'type': 'service_complete', 'service': service_name, 'status': status, 'completed': completed, 'total': total_services})}\n\n"
                 await asyncio.sleep(0.1)
             
+            index_accepted_results(request.prompt, results)
+            
             # Process training model
-            if training_model_service:
+            if early_training_result is not None:
+                results.append(early_training_result)
+                completed += 1
+                status = 'success' if early_training_result['success'] else 'failed'
+                yield f"data: {json.dumps({'type': 'service_complete', 'service': 'training_model', 'status': status, 'completed': completed, 'total': total_services})}\n\n"
+            elif training_model_service:
                 yield f"data: {json.dumps({'type': 'progress', 'message': 'Generating with TRAINING MODEL...', 'service': 'training_model', 'completed': completed, 'total': total_services})}\n\n"
                 await asyncio.sleep(0.1)
                 
                 try:
                     training_result = await loop.run_in_executor(
                         None,
-                        training_model_service.get_code,
-                        request.prompt
+                        contextvars.copy_context().run,
+                        lambda: training_model_service.get_code(request.prompt, filters=request.filters)
                     )
                     results.append(training_result)
                     completed += 1
                     yield f"data: {json.dumps({'type': 'service_complete', 'service': 'training_model', 'status': 'success', 'completed': completed, 'total': total_services})}\n\n"
                 except Exception as e:
                     logger.error(f"❌ Training model failed: {e}")
-                    results.append({
-                        "service": "training_model",
-                        "success": False,
-                        "error": str(e),
-                        "code": None,
-                        "widget_name": "TrainingModelGeneratedWidget",
-                    })
+                    results.append(training_model_failure(e))
                     completed += 1
                     yield f"data: {json.dumps({'type': 'service_complete', 'service': 'training_model', 'status': 'failed', 'completed': completed, 'total': total_services})}\n\n"
                 await asyncio.sleep(0.1)
@@ -370,12 +988,7 @@ async def generate_ui_stream(request: PromptRequest):
             successful = sum(1 for r in results if r['success'])
             failed = len(results) - successful
             
-            logger.info("=" * 80)
-            logger.info(f"✅ STREAMING GENERATION COMPLETED")
-            logger.info(f"   Total services: {len(results)}")
-            logger.info(f"   Successful: {successful}")
-            logger.info(f"   Failed: {failed}")
-            logger.info("=" * 80)
+            logger.info("✅ Streaming generation completed: %d/%d successful", successful, len(results))
             
             # Send final result
             final_data = {
@@ -385,6 +998,8 @@ async def generate_ui_stream(request: PromptRequest):
                     "total_services": len(results),
                     "successful": successful,
                     "failed": failed,
+                    "usage": usage_summary(results),
+                    **complexity_summary(complexity)
                 }
             }
             yield f"data: {json.dumps(final_data)}\n\n"
@@ -392,8 +1007,350 @@ async def generate_ui_stream(request: PromptRequest):
         except Exception as e:
             logger.error(f"❌ Streaming generation failed: {str(e)}")
             yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+        finally:
+            release_slot()
+    
+    # The admission slot is taken before the response starts, so a full queue is still a plain 503
+    if not SINGLE_FLIGHT_ENABLED:
+        try:
+            await acquire_slot()
+        except AdmissionRejected as e:
+            raise admission_rejected(e)
+        # The background task covers a client that disconnects before the stream starts
+        return StreamingResponse(event_generator(), media_type="text/event-stream",
+                                 background=BackgroundTask(release_slot))
+    
+    # Duplicates replay the events sent so far, then follow the live stream; only the
+    # request that becomes the leader takes a slot, in the same step that makes it the leader
+    try:
+        events, shared = await generation_flight.stream(key, event_generator, admit=acquire_slot)
+    except AdmissionRejected as e:
+        raise admission_rejected(e)
+    SINGLE_FLIGHT.inc("generate-ui-stream", "follower" if shared else "leader")
+    return StreamingResponse(events, media_type="text/event-stream")
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: JobRequest):
+    """
+    Queue a generation and return its job id immediately
+    
+    Poll ``GET /jobs/{job_id}`` for per-service partial results. If
+    ``callback_url`` is given (allowed hosts: JOB_CALLBACK_ALLOWED_HOSTS), the
+    finished job is POSTed there.
+    """
+    if not services or all(v is None for v in services.values()):
+        raise HTTPException(
+            status_code=503,
+            detail="No LLM services initialized. Please check server logs."
+        )
+    
+    if not request.prompt or not request.prompt.strip():
+        raise HTTPException(
+            status_code=400,
+            detail="Prompt cannot be empty"
+        )
+    
+    if request.callback_url and not callback_allowed(request.callback_url, JOB_CALLBACK_ALLOWED_HOSTS):
+        raise HTTPException(
+            status_code=400,
+            detail=f"callback_url host must be one of: {', '.join(JOB_CALLBACK_ALLOWED_HOSTS)}"
+        )
+    
+    expected = list(services.keys()) + (["training_model"] if training_model_service else [])
+    loop = asyncio.get_event_loop()
+    job_id = await loop.run_in_executor(
+        None, job_store.create, request.prompt, request.filters, expected, request.callback_url
+    )
+    
+    if not job_runner.submit(job_id, request.prompt, request.filters, request.budget):
+        await loop.run_in_executor(None, job_store.finish, job_id, "failed", None, "Job queue full")
+        raise HTTPException(
+            status_code=503,
+            detail="Job queue is full, retry later",
+            headers={"Retry-After": "30"}
+        )
+    
+    logger.info("📥 Job %s queued (%d waiting)", job_id, job_runner.queued)
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "poll_url": f"/jobs/{job_id}"
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, include_code: bool = True):
+    """Job status with the results of the services that have finished so far"""
+    loop = asyncio.get_event_loop()
+    job = await loop.run_in_executor(None, job_store.get, job_id, include_code)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/generate-ui/batch")
+async def generate_ui_batch(request: BatchRequest, http_request: Request):
+    """
+    Generate many prompts in one call, streaming NDJSON as each prompt/service pair completes
+    
+    Each prompt takes an admission slot at low priority (like jobs, it waits
+    rather than being refused), so a large batch shares the fan-out cap with
+    interactive traffic instead of competing with it. Within a slot, every pair
+    waits on its provider's concurrency limit (PROVIDER_CONCURRENCY), so the
+    providers work through the batch in parallel, each at its own pace. Lines
+    are ``{"type": "result", "index": i, ...}`` (the ``/generate-ui`` result
+    fields) followed by one ``{"type": "summary"}``.
+    """
+    if len(request.requests) > BATCH_MAX_PROMPTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(request.requests)} prompts (max {BATCH_MAX_PROMPTS})"
+        )
     
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    if any(not item.prompt.strip() for item in request.requests):
+        raise HTTPException(
+            status_code=400,
+            detail="Prompt cannot be empty"
+        )
+    
+    selected = request.services or list(services.keys())
+    unknown = [name for name in selected if name not in services]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown services: {', '.join(unknown)}"
+        )
+    
+    batch_services = {name: services[name] for name in selected if services[name] is not None}
+    use_training_model = request.include_training_model and training_model_service is not None
+    if not batch_services and not use_training_model:
+        raise HTTPException(
+            status_code=503,
+            detail="No LLM services initialized. Please check server logs."
+        )
+    
+    loop = asyncio.get_event_loop()
+    tenant = request_tenant(http_request)
+    
+    async def run_pair(index: int, item: PromptRequest, service_name: str, service: Any,
+                       complexity: Optional[PromptComplexity], plan: Dict[str, str]) -> Dict[str, Any]:
+        if plan.get(service_name) == SKIP:
+            return {"type": "result", "index": index, **budget_skipped(service_name)}
+        async with provider_semaphores[service_name]:
+            result = await loop.run_in_executor(
+                batch_executor,
+                contextvars.copy_context().run,
+                generate_code_with_service,
+                service_name,
+                service,
+                item.prompt,
+                time.perf_counter(),
+                complexity,
+                plan.get(service_name)
+            )
+        index_accepted_results(item.prompt, [result])
+        return {"type": "result", "index": index, **result}
+    
+    async def run_training_model(index: int, item: PromptRequest) -> Dict[str, Any]:
+        async with provider_semaphores["training_model"]:
+            try:
+                result = await loop.run_in_executor(
+                    batch_executor,
+                    contextvars.copy_context().run,
+                    lambda: training_model_service.get_code(item.prompt, filters=item.filters)
+                )
+            except Exception as e:
+                logger.error(f"❌ Training model failed: {e}")
+                result = training_model_failure(e)
+        return {"type": "result", "index": index, **result}
+    
+    async def run_prompt(index: int, item: PromptRequest, completed: "asyncio.Queue"):
+        """
+        All pairs of one prompt, within one admission slot; results go to ``completed`` as they finish.
+        
+        Every service of the prompt yields exactly one result: a failure (in
+        admission, classification, planning or a pair) becomes a failed result
+        line for the services it affects, never an error for the whole batch.
+        """
+        emitted = set()
+        
+        def failure(service_name: str, error: Exception) -> Dict[str, Any]:
+            if service_name == "training_model":
+                return {"type": "result", "index": index, **training_model_failure(error)}
+            return {
+                "type": "result",
+                "index": index,
+                "service": service_name,
+                "success": False,
+                "error": str(error),
+                "code": None,
+                "widget_name": None
+            }
+        
+        async def emit(service_name: str, pair: Awaitable[Dict[str, Any]]):
+            try:
+                result = await pair
+            except Exception as e:
+                logger.error("❌ Batch prompt %d failed for %s: %s", index, service_name, e)
+                result = failure(service_name, e)
+            emitted.add(service_name)
+            await completed.put(result)
+        
+        try:
+            async with admission.admit(tenant, "low", bounded=False):
+                # One complexity classification and budget plan per prompt, shared by its services
+                complexity = await classify_generation(item.prompt, item.filters)
+                plan = budget_plan(item.prompt, complexity, item.budget, batch_services)
+                pairs = [
+                    emit(service_name, run_pair(index, item, service_name, service, complexity, plan))
+                    for service_name, service in batch_services.items()
+                ]
+                if use_training_model:
+                    pairs.append(emit("training_model", run_training_model(index, item)))
+                await asyncio.gather(*pairs)
+        except Exception as e:
+            logger.error("❌ Batch prompt %d failed: %s", index, e)
+            service_names = list(batch_services) + (["training_model"] if use_training_model else [])
+            for service_name in service_names:
+                if service_name not in emitted:
+                    emitted.add(service_name)
+                    await completed.put(failure(service_name, e))
+    
+    async def ndjson_generator():
+        start = time.perf_counter()
+        completed: "asyncio.Queue" = asyncio.Queue()
+        tasks = [
+            asyncio.ensure_future(run_prompt(index, item, completed))
+            for index, item in enumerate(request.requests)
+        ]
+        total = len(request.requests) * (len(batch_services) + (1 if use_training_model else 0))
+        
+        successful = 0
+        usages = []
+        try:
+            for _ in range(total):
+                result = await completed.get()
+                successful += 1 if result["success"] else 0
+                usages.append({"usage": result.get("usage")})
+                yield json.dumps(result) + "\n"
+            
+            logger.info("✅ Batch generation completed: %d/%d successful across %d prompts in %.1fs",
+                        successful, total, len(request.requests), time.perf_counter() - start)
+            yield json.dumps({
+                "type": "summary",
+                "prompts": len(request.requests),
+                "total_results": total,
+                "successful": successful,
+                "failed": total - successful,
+                "usage": usage_summary(usages),
+                "duration_s": round(time.perf_counter() - start, 3)
+            }) + "\n"
+        finally:
+            # Client went away: drop the prompts still waiting for an admission or provider slot
+            for task in tasks:
+                task.cancel()
+    
+    logger.info("📦 Batch generation request: %d prompts x %d services",
+                len(request.requests), len(batch_services) + (1 if use_training_model else 0))
+    return StreamingResponse(ndjson_generator(), media_type="application/x-ndjson")
+
+@app.post("/retrieve")
+async def retrieve(request: RetrievalRequest):
+    """
+    Top-k search over the training model dataset with optional metadata filters
+    
+    Filters are resolved through the metadata inverted index before vector
+    scoring, so only the matching subset of the embedding matrix is scored.
+    """
+    if not training_model_service:
+        raise HTTPException(
+            status_code=503,
+            detail="Training model not loaded. Please check server logs."
+        )
+    
+    loop = asyncio.get_event_loop()
+    try:
+        results = await loop.run_in_executor(
+            None,
+            contextvars.copy_context().run,
+            lambda: training_model_service.search(
+                request.prompt,
+                top_k=request.top_k,
+                threshold=request.threshold,
+                filters=request.filters
+            )
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "results": results,
+        "total": len(results),
+        "model": training_model_service.model_name
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of request, provider, retriever and process metrics"""
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+# Debug endpoints: X-Debug-Token must match DEBUG_TOKEN when it is set;
+# the profiler additionally needs ENABLE_PROFILER=1 and a DEBUG_TOKEN
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN") or None
+ENABLE_PROFILER = os.getenv("ENABLE_PROFILER", "0") == "1"
+
+def require_debug_token(x_debug_token: Optional[str] = Header(None)):
+    """Reject debug requests without the configured token"""
+    if DEBUG_TOKEN and not (x_debug_token and hmac.compare_digest(x_debug_token, DEBUG_TOKEN)):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Debug-Token")
+
+@app.get("/debug/profile", dependencies=[Depends(require_debug_token)])
+async def debug_profile(
+    seconds: float = Query(10.0, gt=0, le=60),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    format: str = Query("collapsed", pattern="^(collapsed|json)$"),
+    include_idle: bool = False,
+):
+    """
+    Sample every thread of this worker (event loop and executors) for N seconds.
+    
+    ``collapsed`` returns flamegraph.pl / speedscope input; ``json`` returns
+    the hottest leaf frames and per-thread sample counts.
+    """
+    if not (ENABLE_PROFILER and DEBUG_TOKEN):
+        raise HTTPException(status_code=404, detail="Profiler disabled (set ENABLE_PROFILER=1 and DEBUG_TOKEN)")
+    if not try_acquire_profile():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    
+    try:
+        profiler = SamplingProfiler(interval=interval_ms / 1000.0, include_idle=include_idle)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+    finally:
+        release_profile()
+    
+    logger.info("🔬 Profiled %.1fs: %d samples", profiler.duration, profiler.samples)
+    if format == "json":
+        return profiler.summary()
+    return PlainTextResponse(
+        profiler.collapsed(),
+        headers={"Content-Disposition": f'attachment; filename="profile-{int(time.time())}.collapsed"'}
+    )
+
+@app.get("/debug/traces", dependencies=[Depends(require_debug_token)])
+async def debug_traces(limit: int = 20, min_duration_ms: float = 0.0):
+    """Most recent traces from the in-memory span buffer, slowest filter optional"""
+    traces = TRACER.buffer.traces(limit=limit, min_duration_ms=min_duration_ms)
+    return {"traces": traces, "total": len(traces), "sample_rate": TRACER.sample_rate}
+
+@app.get("/debug/traces/{trace_id}", dependencies=[Depends(require_debug_token)])
+async def debug_trace(trace_id: str):
+    """All buffered spans of one trace (X-Trace-ID response header)"""
+    trace = TRACER.buffer.trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found (not sampled or evicted)")
+    return trace
 
 @app.get("/service-info")
 async def service_info():
@@ -406,6 +1363,9 @@ async def service_info():
                 "service_class": service.__class__.__name__,
                 "widget_name": service.widget_name,
                 "current_model": service.current_model_name,
+                "small_model": service.small_model_name,
+                "usage": USAGE.snapshot(service.service_type),
+                "few_shot_tokens": service.few_shot_tokens if service.example_retriever else 0,
                 "generation_config": {
                     "temperature": service.generation_config.temperature,
                     "top_p": service.generation_config.top_p,
@@ -421,6 +1381,17 @@ async def service_info():
         else:
             info[name] = {"status": "not initialized"}
     
+    if training_model_service:
+        info["training_model"] = {
+            "service_class": training_model_service.__class__.__name__,
+            "widget_name": "TrainingModelGeneratedWidget",
+            "current_model": training_model_service.model_name,
+            "model_dir": training_model_service.model_dir,
+            "samples": training_model_service.snapshot().size,
+            "embedding_cache": training_model_service.cache_stats(),
+            "online_indexing": online_indexer.stats() if online_indexer else None
+        }
+    
     return info
 
 if __name__ == "__main__":
@@ -429,5 +1400,7 @@ if __name__ == "__main__":
         app, 
         host="0.0.0.0", 
         port=8000,
-        log_level="info"
+        log_level="info",
+        # Keep uvicorn's records on the queue-backed root handler
+        log_config=None
     )
\ No newline at end of file
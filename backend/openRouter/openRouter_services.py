@@ -18,6 +18,10 @@ logger = logging.getLogger(__name__)
 class OpenRouterService(BaseLLMService):
     """OpenRouter-specific implementation of the LLM service"""
     
+    SMALL_MODELS = ('google/gemma-2-9b-it', 'mistralai/mistral-nemo', 'mistralai/mistral-small')
+    # Models whose providers only cache prompts marked with cache_control
+    CACHE_CONTROL_PREFIXES = ('anthropic/', 'google/gemini')
+    
     def __init__(self, generation_config: GenerationConfig = None, retry_config: RetryConfig = None):
         load_dotenv()
         
@@ -124,6 +128,7 @@ class OpenRouterService(BaseLLMService):
                         # CRITICAL FIX: Set both model attributes
                         self.current_model_name = model_name
                         self.model = self  # Reference to self for parent class compatibility
+                        self.small_model_name = self._select_small_model(available_models)
                         
                         logger.info(f"✅ self.model set successfully")
                         logger.info(f"✅ self.current_model_name set to: {self.current_model_name}")
@@ -152,20 +157,34 @@ class OpenRouterService(BaseLLMService):
         logger.error("💥 No available OpenRouter models could be initialized")
         return False
     
-    def _make_api_request(self, prompt: str) -> Optional[str]:
+    def _messages_for(self, model_name: str, prompt: str) -> list:
+        """Chat messages; Anthropic and Gemini models get an explicit cache breakpoint on the system prompt"""
+        messages = self._chat_messages(prompt)
+        # OpenAI, DeepSeek, Grok... cache identical prefixes automatically and
+        # reject unknown content parts on some routes, so only these opt in
+        if model_name.startswith(self.CACHE_CONTROL_PREFIXES):
+            messages[0]["content"] = [{
+                "type": "text",
+                "text": messages[0]["content"],
+                "cache_control": {"type": "ephemeral"},
+            }]
+        return messages
+    
+    def _make_api_request(self, prompt: str, model_name: Optional[str] = None) -> Optional[str]:
         """Make a single API request to OpenRouter"""
         if not hasattr(self, 'current_model_name') or not self.current_model_name:
             raise ValueError("Model not initialized. Cannot make API request.")
+        model_name = model_name or self.current_model_name
         
         try:
-            logger.info(f"🚀 Making API request to OpenRouter ({self.current_model_name})...")
+            logger.info(f"🚀 Making API request to OpenRouter ({model_name})...")
             
             response = requests.post(
                 f"{self.base_url}/chat/completions",
                 headers=self.headers,
                 json={
-                    "model": self.current_model_name,
-                    "messages": [{"role": "user", "content": prompt}],
+                    "model": model_name,
+                    "messages": self._messages_for(model_name, prompt),
                     "temperature": self.generation_config.temperature,
                     "top_p": self.generation_config.top_p,
                     "top_k": self.generation_config.top_k,
@@ -176,6 +195,9 @@ class OpenRouterService(BaseLLMService):
             
             if response.status_code == 200:
                 response_data = response.json()
+                usage = response_data.get("usage") or {}
+                cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+                self._record_token_usage(usage.get("prompt_tokens"), usage.get("completion_tokens"), cached)
                 if response_data.get("choices") and len(response_data["choices"]) > 0:
                     response_text = response_data["choices"][0]["message"]["content"]
                     logger.info(f"✅ Received response ({len(response_text)} chars)")
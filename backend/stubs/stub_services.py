@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+from typing import Optional, List
+import sys
+from pathlib import Path
+
+# Add the backend directory to the Python path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from base.llm_service import BaseLLMService
+from base.models import GenerationConfig, RetryConfig
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATASET_PATHS = [
+    backend_dir.parent / "Training_Model" / "flutter_dataset.jsonl",
+    backend_dir.parent / "Training_Model" / "flutter_dataset",
+]
+
+
+def load_sample_outputs(dataset_path: Optional[str] = None, limit: int = 500) -> List[str]:
+    """Read up to ``limit`` flutter_code bodies from the JSONL dataset or the JSON directory"""
+    candidates = [Path(dataset_path)] if dataset_path else DEFAULT_DATASET_PATHS
+    for path in candidates:
+        if path.is_file():
+            codes = []
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if len(codes) >= limit:
+                        break
+                    if line.strip():
+                        code = json.loads(line).get('flutter_code')
+                        if code:
+                            codes.append(code)
+            return codes
+        if path.is_dir():
+            codes = []
+            for file in sorted(path.glob("*.json"))[:limit]:
+                try:
+                    with open(file, 'r', encoding='utf-8') as f:
+                        code = json.load(f).get('flutter_code')
+                    if code:
+                        codes.append(code)
+                except (OSError, ValueError):
+                    continue
+            return codes
+    return []
+
+
+class StubService(BaseLLMService):
+    """
+    In-process fake provider for load testing without API quota.
+
+    Latency follows a log-normal distribution around ``latency_ms`` and blocks
+    the calling thread like the real SDKs do. ``error_rate`` of the calls raise,
+    which exercises the retry path; responses are real dataset outputs wrapped
+    in a markdown fence, so post-processing sees realistic input sizes.
+    """
+
+    _samples_lock = threading.Lock()
+    _samples_cache = {}
+
+    def __init__(
+        self,
+        name: str = "stub",
+        latency_ms: float = 1500.0,
+        latency_sigma: float = 0.5,
+        error_rate: float = 0.05,
+        dataset_path: Optional[str] = None,
+        seed: Optional[int] = None,
+        small_model_speedup: float = 3.0,
+        generation_config: GenerationConfig = None,
+        retry_config: RetryConfig = None,
+    ):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.dataset_path = dataset_path
+        self.small_model_speedup = small_model_speedup
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+        super().__init__(generation_config, retry_config)
+
+        # Same widget class as the provider it stands in for, output files kept apart from its widgets
+        self.service_type = name
+        self.widget_name = self._get_widget_name()
+        self.service_type = f"stub_{name}"
+
+        if not self._initialize_model():
+            raise ValueError("Failed to initialize stub model - no sample outputs found")
+
+        logger.info(f"✅ StubService '{name}' ready ({len(self.samples)} samples, "
+                    f"~{latency_ms:.0f}ms, {error_rate:.0%} errors)")
+
+    def _initialize_model(self) -> bool:
+        """Load (once per dataset path) the outputs the stub replies with"""
+        key = self.dataset_path or "default"
+        with StubService._samples_lock:
+            if key not in StubService._samples_cache:
+                StubService._samples_cache[key] = load_sample_outputs(self.dataset_path)
+        self.samples = StubService._samples_cache[key]
+        if not self.samples:
+            return False
+        self.model = f"stub-{self.name}"
+        self.current_model_name = self.model
+        self.small_model_name = f"stub-{self.name}-small"
+        return True
+
+    def _make_api_request(self, prompt: str, model_name: Optional[str] = None) -> Optional[str]:
+        """Sleep for a sampled latency, then fail or return a dataset sample"""
+        # The small model answers in a fraction of the time
+        speedup = self.small_model_speedup if model_name == self.small_model_name else 1.0
+        with self._random_lock:
+            self.calls += 1
+            delay = self._random.lognormvariate(0.0, self.latency_sigma) * self.latency_ms / 1000.0 / speedup
+            fail = self._random.random() < self.error_rate
+            code = self._random.choice(self.samples)
+
+        time.sleep(delay)
+
+        if fail:
+            with self._random_lock:
+                self.errors += 1
+            raise RuntimeError(f"Simulated {self.name} provider error")
+
+        # Rough 4 characters per token, so token metrics have data under load tests
+        self._record_token_usage((len(self._current_system_prompt()) + len(prompt)) // 4, len(code) // 4)
+        return f"```dart\n{code}\n```"
+
+    def list_available_models(self):
+        """List the single stub model"""
+        return [{
+            'id': self.current_model_name,
+            'name': f"Stub {self.name}",
+            'latency_ms': self.latency_ms,
+            'latency_sigma': self.latency_sigma,
+            'error_rate': self.error_rate,
+            'samples': len(self.samples),
+        }]
+
+
+def stub_service_from_env(name: str) -> StubService:
+    """Build a stub from STUB_* environment variables (per-service overrides first)"""
+    def setting(key: str, default: str) -> str:
+        return os.getenv(f"STUB_{name.upper()}_{key}", os.getenv(f"STUB_{key}", default))
+
+    seed = setting("SEED", "")
+    return StubService(
+        name=name,
+        latency_ms=float(setting("LATENCY_MS", "1500")),
+        latency_sigma=float(setting("LATENCY_SIGMA", "0.5")),
+        error_rate=float(setting("ERROR_RATE", "0.05")),
+        dataset_path=setting("DATASET", "") or None,
+        seed=int(seed) if seed else None,
+        small_model_speedup=float(setting("SMALL_MODEL_SPEEDUP", "3.0")),
+        retry_config=RetryConfig(
+            max_retries=int(setting("MAX_RETRIES", "3")),
+            base_delay=float(setting("RETRY_BASE_DELAY", "1.0")),
+        ),
+    )
@@ -0,0 +1,61 @@
+"""
+Tests for base.usage.plan_budget. Run from backend/:
+
+    python -m pytest -q tests
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from base.usage import DEFAULT_PRICES, DOWNGRADE, RUN, SKIP, UsageTracker, plan_budget
+
+
+def make_service(service_type, model, small_model):
+    return SimpleNamespace(
+        service_type=service_type,
+        small_model_name=small_model,
+        model_for=lambda route: model,
+        estimate_prompt_tokens=lambda prompt: 1000,
+        generation_config=SimpleNamespace(max_output_tokens=4096),
+    )
+
+
+def make_budget(max_tokens=None, max_cost_usd=None, max_latency_ms=None):
+    return SimpleNamespace(max_tokens=max_tokens, max_cost_usd=max_cost_usd, max_latency_ms=max_latency_ms)
+
+
+SERVICES = {
+    "groq": make_service("groq", "llama-3.3-70b-versatile", "llama-3.1-8b-instant"),
+    "cohere": make_service("cohere", "command-r-plus-08-2024", "command-r7b"),
+    # No default price, so its cost estimate is None
+    "openrouter": make_service("openrouter", "meta-llama/llama-3.3-70b-instruct", "meta-llama/llama-3.1-8b-instruct"),
+}
+
+
+def test_unlimited_budget_runs_everything():
+    plan = plan_budget(SERVICES, "prompt", None, make_budget(), tracker=UsageTracker(DEFAULT_PRICES))
+    assert plan == {"groq": RUN, "cohere": RUN, "openrouter": RUN}
+
+
+def test_token_tie_with_unpriced_model():
+    # Equal token estimates (no usage history) for two of three providers: the
+    # restore pass must order them without comparing a None cost to a float
+    plan = plan_budget(SERVICES, "prompt", None, make_budget(max_tokens=15000), tracker=UsageTracker(DEFAULT_PRICES))
+    assert sorted(plan.values()) == sorted([RUN, RUN, SKIP])
+
+
+def test_downgrades_everyone_before_skipping():
+    # The cost limit fits all three providers on their small models, but not cohere's large one
+    plan = plan_budget(SERVICES, "prompt", None, make_budget(max_cost_usd=0.01), tracker=UsageTracker(DEFAULT_PRICES))
+    assert SKIP not in plan.values()
+    assert plan["cohere"] == DOWNGRADE
+
+
+def test_result_does_not_depend_on_service_order():
+    budget = make_budget(max_tokens=11000, max_cost_usd=0.005)
+    forward = plan_budget(SERVICES, "prompt", None, budget, tracker=UsageTracker(DEFAULT_PRICES))
+    backward = plan_budget(dict(reversed(list(SERVICES.items()))), "prompt", None, budget,
+                           tracker=UsageTracker(DEFAULT_PRICES))
+    assert forward == backward
@@ -0,0 +1,236 @@
+# training_model/bm25_index.py
+import os
+import re
+import sys
+import json
+import pickle
+import logging
+from collections import Counter
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z0-9_]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens; widget names like SliverAppBar stay whole."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def document_text(entry: Dict[str, Any]) -> str:
+    """Text indexed for a dataset record: its prompt plus its component names."""
+    return f"{entry.get('prompt') or ''} {' '.join(entry.get('components') or [])}"
+
+
+class BM25Index:
+    """
+    Sparse BM25 index stored as compact CSR arrays.
+
+    ``indptr``/``doc_ids``/``weights`` hold one posting list per vocabulary term,
+    with the full BM25 term weight precomputed, so scoring a query is a handful
+    of vectorized adds over the postings of its terms.
+    """
+
+    def __init__(
+        self,
+        vocab: Dict[str, int],
+        indptr: np.ndarray,
+        doc_ids: np.ndarray,
+        weights: np.ndarray,
+        num_docs: int,
+    ):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.num_docs = num_docs
+
+    @classmethod
+    def build(cls, texts: Iterable[str], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """Build the index from one text per document."""
+        doc_terms = [Counter(tokenize(text)) for text in texts]
+        num_docs = len(doc_terms)
+        doc_len = np.asarray([sum(terms.values()) for terms in doc_terms], dtype=np.float32)
+        avg_len = float(doc_len.mean()) if num_docs else 0.0
+
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for doc_id, terms in enumerate(doc_terms):
+            for term, tf in terms.items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+        vocab = {term: term_id for term_id, term in enumerate(sorted(postings))}
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        for term, term_id in vocab.items():
+            indptr[term_id + 1] = len(postings[term])
+        np.cumsum(indptr, out=indptr)
+
+        doc_ids = np.empty(indptr[-1], dtype=np.int32)
+        weights = np.empty(indptr[-1], dtype=np.float32)
+        for term, term_id in vocab.items():
+            start, end = indptr[term_id], indptr[term_id + 1]
+            ids = np.fromiter((d for d, _ in postings[term]), dtype=np.int32, count=end - start)
+            tfs = np.fromiter((tf for _, tf in postings[term]), dtype=np.float32, count=end - start)
+            df = end - start
+            idf = np.log(1.0 + (num_docs - df + 0.5) / (df + 0.5))
+            norm = k1 * (1.0 - b + b * doc_len[ids] / (avg_len or 1.0))
+            doc_ids[start:end] = ids
+            weights[start:end] = idf * tfs * (k1 + 1.0) / (tfs + norm)
+
+        return cls(vocab, indptr, doc_ids, weights, num_docs)
+
+    def score(self, query: str) -> np.ndarray:
+        """Return a BM25 score for every document (0 for no overlap)."""
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            scores[self.doc_ids[start:end]] += self.weights[start:end]
+        return scores
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize for storage inside a retrieval model package."""
+        terms = [None] * len(self.vocab)
+        for term, term_id in self.vocab.items():
+            terms[term_id] = term
+        return {
+            "terms": terms,
+            "indptr": self.indptr,
+            "doc_ids": self.doc_ids,
+            "weights": self.weights,
+            "num_docs": self.num_docs,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "BM25Index":
+        vocab = {term: term_id for term_id, term in enumerate(data["terms"])}
+        return cls(
+            vocab,
+            np.asarray(data["indptr"], dtype=np.int64),
+            np.asarray(data["doc_ids"], dtype=np.int32),
+            np.asarray(data["weights"], dtype=np.float32),
+            int(data["num_docs"]),
+        )
+
+
+class OnlineBM25Index:
+    """
+    Append-only BM25 over rows added after load.
+
+    ``append`` only extends raw postings (term -> doc ids and term frequencies)
+    and document lengths, so it costs O(tokens appended). Term weights use
+    corpus statistics that change with every append, so they are computed at
+    query time from the postings of the query's terms. ``view`` freezes the
+    first N documents for a reader snapshot; appends never disturb it.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._doc_len = np.zeros(1024, dtype=np.float32)
+        self.num_docs = 0
+        self._total_len = 0.0
+
+    def append(self, texts: Iterable[str]) -> None:
+        """Index the next documents (single writer)."""
+        for text in texts:
+            terms = Counter(tokenize(text))
+            doc_id = self.num_docs
+            if doc_id == self._doc_len.shape[0]:
+                # Views keep the old array, whose first doc_id entries stay valid
+                grown = np.zeros(doc_id * 2, dtype=np.float32)
+                grown[:doc_id] = self._doc_len
+                self._doc_len = grown
+            self._doc_len[doc_id] = sum(terms.values())
+            for term, tf in terms.items():
+                ids, tfs = self._postings.setdefault(term, ([], []))
+                ids.append(doc_id)
+                tfs.append(tf)
+            self._total_len += float(self._doc_len[doc_id])
+            self.num_docs = doc_id + 1
+
+    def view(self) -> "OnlineBM25View":
+        """Frozen scorer over the documents indexed so far."""
+        return OnlineBM25View(self, self._doc_len, self.num_docs, self._total_len)
+
+
+class OnlineBM25View:
+    """``score`` over the first ``num_docs`` documents of an ``OnlineBM25Index``."""
+
+    def __init__(self, index: OnlineBM25Index, doc_len: np.ndarray, num_docs: int, total_len: float):
+        self.index = index
+        self.doc_len = doc_len
+        self.num_docs = num_docs
+        self.avg_len = total_len / num_docs if num_docs else 0.0
+
+    def score(self, query: str) -> np.ndarray:
+        """Return a BM25 score for every document (0 for no overlap)."""
+        k1, b = self.index.k1, self.index.b
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            postings = self.index._postings.get(term)
+            if postings is None:
+                continue
+            ids_list, tfs_list = postings
+            # Postings are in doc order; later appends are past num_docs
+            count = len(ids_list)
+            ids = np.asarray(ids_list[:count], dtype=np.int64)
+            keep = int(np.searchsorted(ids, self.num_docs))
+            if not keep:
+                continue
+            ids = ids[:keep]
+            tfs = np.asarray(tfs_list[:keep], dtype=np.float32)
+            idf = np.log(1.0 + (self.num_docs - keep + 0.5) / (keep + 0.5))
+            norm = k1 * (1.0 - b + b * self.doc_len[ids] / (self.avg_len or 1.0))
+            scores[ids] += idf * tfs * (k1 + 1.0) / (tfs + norm)
+        return scores
+
+
+def save_bm25_arrays(index: BM25Index, directory: str) -> None:
+    """Write the index as .npy files (memory-mappable) plus a JSON term list."""
+    os.makedirs(directory, exist_ok=True)
+    data = index.to_dict()
+    for name in ("indptr", "doc_ids", "weights"):
+        np.save(os.path.join(directory, f"bm25_{name}.npy"), data[name])
+    with open(os.path.join(directory, "bm25_terms.json"), 'w', encoding='utf-8') as f:
+        json.dump({"terms": data["terms"], "num_docs": data["num_docs"]}, f, ensure_ascii=False)
+
+
+def load_bm25_arrays(directory: str, mmap_mode: Optional[str] = "r") -> BM25Index:
+    """Load an index written by ``save_bm25_arrays``."""
+    with open(os.path.join(directory, "bm25_terms.json"), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    arrays = {
+        name: np.load(os.path.join(directory, f"bm25_{name}.npy"), mmap_mode=mmap_mode)
+        for name in ("indptr", "doc_ids", "weights")
+    }
+    vocab = {term: term_id for term_id, term in enumerate(meta["terms"])}
+    return BM25Index(vocab, arrays["indptr"], arrays["doc_ids"], arrays["weights"], int(meta["num_docs"]))
+
+
+def package_indexes(pkl_path: str) -> None:
+    """Add the BM25 and metadata indexes to an existing retrieval model package."""
+    from training_model.metadata_index import MetadataIndex
+
+    with open(pkl_path, 'rb') as f:
+        package = pickle.load(f)
+
+    train_data = package.get("train_data", [])
+    logger.info(f"🔨 Building sparse indexes for {len(train_data)} samples...")
+    package["bm25_index"] = BM25Index.build(document_text(entry) for entry in train_data).to_dict()
+    package["metadata_index"] = MetadataIndex.build(train_data).to_dict()
+
+    with open(pkl_path, 'wb') as f:
+        pickle.dump(package, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    logger.info(f"✅ Indexes written to {pkl_path}")
+
+
+if __name__ == "__main__":
+    # Usage (from backend/): python -m training_model.bm25_index training_model/flutter_ui_retrieval_model.pkl
+    logging.basicConfig(level=logging.INFO)
+    package_indexes(sys.argv[1] if len(sys.argv) > 1 else "training_model/flutter_ui_retrieval_model.pkl")
@@ -0,0 +1,92 @@
+# training_model/embedding_cache.py
+import re
+import threading
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, Any, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Normalize prompt text so trivially different spellings share a cache entry."""
+    return _WHITESPACE_RE.sub(" ", text).strip().lower()
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded, thread-safe LRU cache of (encoder, normalized query text) -> embedding vector.
+
+    Vectors are stored as float16 numpy arrays to keep the footprint small.
+    A single instance can be shared by every component that embeds prompts:
+    entries are keyed by an encoder id (e.g. the checkpoint path), so callers
+    using different models never see each other's vectors.
+    """
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, encoder: str, text: str) -> Optional[np.ndarray]:
+        """Return the cached ``encoder`` embedding for ``text`` or None."""
+        key = (encoder, normalize_query(text))
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, encoder: str, text: str, vector) -> np.ndarray:
+        """Store an embedding, evicting the least recently used entry when full."""
+        key = (encoder, normalize_query(text))
+        compact = np.asarray(vector, dtype=np.float16).reshape(-1)
+        compact.setflags(write=False)
+        with self._lock:
+            self._entries[key] = compact
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return compact
+
+    def get_or_compute(self, encoder: str, text: str, encode: Callable[[str], Any]) -> np.ndarray:
+        """
+        Return the cached embedding, running ``encode`` only on a miss.
+
+        Only the key is normalized: ``encode`` gets the original text, so
+        case-sensitive tokenizers see the prompt as written.
+        """
+        vector = self.get(encoder, text)
+        if vector is not None:
+            return vector
+        return self.put(encoder, text, encode(text))
+
+    def clear(self):
+        """Drop all cached embeddings and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit-rate metrics for the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,117 @@
+# training_model/metadata_index.py
+import logging
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Union
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Fields with one value per record: a list filter matches ANY of its values
+SINGLE_VALUE_FIELDS = ("category", "layout_type")
+# Fields with many values per record: a list filter must match ALL of its values
+MULTI_VALUE_FIELDS = ("tags", "components")
+INDEXED_FIELDS = SINGLE_VALUE_FIELDS + MULTI_VALUE_FIELDS
+
+FilterValue = Union[str, List[str]]
+
+
+def _normalize_value(value: Any) -> str:
+    return str(value).strip().lower()
+
+
+class MetadataIndex:
+    """
+    Inverted index over dataset metadata (category, layout_type, tags, components).
+
+    Postings are sorted int32 arrays of record positions, so a filter resolves to
+    a candidate subset of the embedding matrix before any vector scoring.
+    """
+
+    def __init__(self, postings: Dict[str, Dict[str, np.ndarray]], size: int):
+        self.postings = postings
+        self.size = size
+
+    @classmethod
+    def build(cls, entries: List[Dict[str, Any]], start: int = 0) -> "MetadataIndex":
+        """Build an index over ``entries``; positions are offset by ``start``."""
+        lists: Dict[str, Dict[str, List[int]]] = {field: defaultdict(list) for field in INDEXED_FIELDS}
+
+        for position, entry in enumerate(entries, start):
+            for field in SINGLE_VALUE_FIELDS:
+                value = entry.get(field)
+                if value:
+                    lists[field][_normalize_value(value)].append(position)
+            for field in MULTI_VALUE_FIELDS:
+                for value in set(_normalize_value(v) for v in entry.get(field) or []):
+                    lists[field][value].append(position)
+
+        postings = {
+            field: {value: np.asarray(ids, dtype=np.int32) for value, ids in values.items()}
+            for field, values in lists.items()
+        }
+        return cls(postings, start + len(entries))
+
+    def extended(self, entries: List[Dict[str, Any]], start: int) -> "MetadataIndex":
+        """
+        Return a new index with ``entries`` appended at position ``start``.
+
+        Untouched posting arrays are shared with this index, which is never
+        mutated, so readers holding the old index keep a consistent view.
+        """
+        delta = MetadataIndex.build(entries, start)
+        postings = {field: dict(values) for field, values in self.postings.items()}
+        for field, values in delta.postings.items():
+            field_postings = postings.setdefault(field, {})
+            for value, ids in values.items():
+                existing = field_postings.get(value)
+                field_postings[value] = ids if existing is None else np.concatenate([existing, ids])
+        return MetadataIndex(postings, delta.size)
+
+    def candidates(self, filters: Optional[Dict[str, FilterValue]]) -> Optional[np.ndarray]:
+        """
+        Resolve ``filters`` to sorted record positions.
+
+        Returns None when there is nothing to filter on, meaning "all records".
+        """
+        if not filters:
+            return None
+
+        result: Optional[np.ndarray] = None
+        for field, wanted in filters.items():
+            if field not in INDEXED_FIELDS:
+                raise ValueError(f"Unsupported filter field '{field}', expected one of {INDEXED_FIELDS}")
+            if wanted is None or wanted == []:
+                continue
+
+            values = [wanted] if isinstance(wanted, str) else list(wanted)
+            field_postings = self.postings.get(field, {})
+            lists = [field_postings.get(_normalize_value(v), np.empty(0, dtype=np.int32)) for v in values]
+
+            if field in SINGLE_VALUE_FIELDS:
+                matched = np.unique(np.concatenate(lists)) if len(lists) > 1 else lists[0]
+            else:
+                matched = lists[0]
+                for other in lists[1:]:
+                    matched = np.intersect1d(matched, other, assume_unique=True)
+
+            result = matched if result is None else np.intersect1d(result, matched, assume_unique=True)
+            if result.size == 0:
+                break
+
+        return result
+
+    def values(self, field: str) -> List[str]:
+        """List the distinct indexed values for a field."""
+        return sorted(self.postings.get(field, {}).keys())
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize for storage inside a retrieval model package."""
+        return {"size": self.size, "postings": self.postings}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MetadataIndex":
+        postings = {
+            field: {value: np.asarray(ids, dtype=np.int32) for value, ids in values.items()}
+            for field, values in data["postings"].items()
+        }
+        return cls(postings, data["size"])
@@ -0,0 +1,246 @@
+# training_model/online_indexer.py
+import os
+import re
+import json
+import time
+import queue
+import base64
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+import numpy as np
+
+from base.code_processor import CodeProcessor
+
+logger = logging.getLogger(__name__)
+
+_WIDGET_CALL_RE = re.compile(r"\b([A-Z][A-Za-z0-9]*)\s*[(.]")
+# Class name of the dataset screens, which the frontend's training model widget file must declare
+DATASET_WIDGET_NAME = "GeneratedWidget"
+
+
+class OnlineIndexer:
+    """
+    Append-only ingestion of accepted generations into the training model retriever.
+
+    ``submit`` is non-blocking: pairs are queued and a background thread embeds
+    them in batches and calls ``TrainingModelService.append_entries``. Every
+    ingested record is also appended to a JSONL log (with its float16
+    embedding and the encoder's identity) and replayed on startup, so the
+    store survives restarts.
+    """
+
+    def __init__(
+        self,
+        training_service,
+        log_path: Optional[str] = "training_model/online_entries.jsonl",
+        batch_size: int = 32,
+        flush_interval: float = 2.0,
+        max_queue: int = 1000,
+        max_seen: int = 100_000,
+    ):
+        self.training_service = training_service
+        self.log_path = log_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        # LRU of code hashes already ingested; bounded, so very old duplicates may be re-indexed
+        self._seen_codes: "OrderedDict[str, None]" = OrderedDict()
+        self.max_seen = max_seen
+        self._seen_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.ingested = 0
+        self.dropped = 0
+        self.duplicates = 0
+
+    @staticmethod
+    def _code_key(code: str) -> str:
+        return hashlib.sha1(" ".join(code.split()).encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str):
+        """Record a code hash, evicting the least recently seen beyond ``max_seen`` (caller holds the lock)"""
+        self._seen_codes[key] = None
+        self._seen_codes.move_to_end(key)
+        while len(self._seen_codes) > self.max_seen:
+            self._seen_codes.popitem(last=False)
+
+    def start(self):
+        """Replay the log and start the background ingestion thread."""
+        self.replay()
+        self._thread = threading.Thread(target=self._run, name="online-indexer", daemon=True)
+        self._thread.start()
+        logger.info("🛰️ Online indexer started")
+
+    def stop(self, timeout: float = 10.0):
+        """Flush queued entries and stop the background thread."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        logger.info(f"🛑 Online indexer stopped ({self.ingested} entries ingested)")
+
+    def submit(self, prompt: str, code: str, service: str) -> bool:
+        """Queue an accepted (prompt, code, service) pair; returns False if dropped."""
+        if not prompt or not code:
+            return False
+
+        # Served later as training model code, so it must declare the dataset's widget class
+        code = CodeProcessor.rename_widget(code, DATASET_WIDGET_NAME)
+        key = self._code_key(code)
+        with self._seen_lock:
+            if key in self._seen_codes:
+                self._seen_codes.move_to_end(key)
+                self.duplicates += 1
+                return False
+            self._remember(key)
+
+        try:
+            self._queue.put_nowait({"prompt": prompt, "code": code, "service": service})
+            return True
+        except queue.Full:
+            with self._seen_lock:
+                self._seen_codes.pop(key, None)
+            self.dropped += 1
+            logger.warning("⚠️ Online indexer queue full, dropping entry")
+            return False
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                try:
+                    self._ingest(batch)
+                except Exception as e:
+                    logger.exception(f"❌ Online indexing batch failed: {e}")
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        """Collect up to ``batch_size`` items, waiting at most ``flush_interval``."""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _ingest(self, batch: List[Dict[str, Any]]):
+        service = self.training_service
+        cache = service.embedding_cache
+
+        # Most prompts were just embedded by the retriever on the request path
+        vectors: List[Optional[np.ndarray]] = [cache.get(service.model_dir, item["prompt"]) for item in batch]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            encoded = service.encoder.encode(
+                [batch[i]["prompt"] for i in missing],
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+            )
+            for i, vector in zip(missing, encoded):
+                vectors[i] = cache.put(service.model_dir, batch[i]["prompt"], vector)
+
+        known = self._known_components()
+        entries = [self._to_entry(item, known) for item in batch]
+        embeddings = np.vstack([np.asarray(v, dtype=np.float32) for v in vectors])
+
+        service.append_entries(entries, embeddings)
+        self._append_log(entries, vectors)
+        self.ingested += len(entries)
+
+    def _known_components(self) -> set:
+        index = self.training_service.snapshot().metadata_index
+        return set(index.values("components"))
+
+    @staticmethod
+    def _to_entry(item: Dict[str, Any], known_components: set) -> Dict[str, Any]:
+        """Shape an accepted generation like a dataset record."""
+        components = []
+        for name in _WIDGET_CALL_RE.findall(item["code"]):
+            if name.lower() in known_components and name not in components:
+                components.append(name)
+
+        return {
+            "prompt": item["prompt"],
+            "flutter_code": item["code"],
+            "category": "generated",
+            "tags": [item["service"]],
+            "components": components,
+            "layout_type": "unknown",
+            "source": item["service"],
+            "created_at": datetime.now().isoformat(),
+        }
+
+    def _append_log(self, entries: List[Dict[str, Any]], vectors: List[np.ndarray]):
+        if not self.log_path:
+            return
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        with open(self.log_path, "a+b") as f:
+            # A crash mid-write can leave a truncated last line; never append to it
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            for entry, vector in zip(entries, vectors):
+                record = dict(entry)
+                record["encoder"] = self.training_service.encoder_identity
+                record["embedding_f16"] = base64.b64encode(
+                    np.asarray(vector, dtype=np.float16).tobytes()
+                ).decode("ascii")
+                f.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+
+    def replay(self) -> int:
+        """
+        Re-append previously ingested entries from the log (no re-encoding).
+
+        Records embedded by another encoder (or logged before records carried
+        the encoder identity) and lines left truncated by a crash are skipped.
+        """
+        if not self.log_path or not os.path.exists(self.log_path):
+            return 0
+
+        identity = self.training_service.encoder_identity
+        entries, vectors = [], []
+        malformed = other_encoder = 0
+        with open(self.log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    vector = np.frombuffer(base64.b64decode(record.pop("embedding_f16")), dtype=np.float16)
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    malformed += 1
+                    continue
+                if record.pop("encoder", None) != identity:
+                    other_encoder += 1
+                    continue
+                # Entries logged before ingestion renamed the widget class kept the provider's name
+                record["flutter_code"] = CodeProcessor.rename_widget(record["flutter_code"], DATASET_WIDGET_NAME)
+                entries.append(record)
+                vectors.append(vector.astype(np.float32))
+                with self._seen_lock:
+                    self._remember(self._code_key(record["flutter_code"]))
+
+        if malformed:
+            logger.warning(f"⚠️ Skipped {malformed} malformed online entries in {self.log_path}")
+        if other_encoder:
+            logger.warning(f"⚠️ Skipped {other_encoder} online entries embedded with a different encoder")
+        if entries:
+            self.training_service.append_entries(entries, np.vstack(vectors))
+            logger.info(f"♻️ Replayed {len(entries)} online entries from {self.log_path}")
+        return len(entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "ingested": self.ingested,
+            "dropped": self.dropped,
+            "duplicates": self.duplicates,
+        }
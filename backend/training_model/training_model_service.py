@@ -1,29 +1,187 @@
 # training_model/training_model_service.py
 import os
+import json
 import pickle
+import hashlib
 import logging
-from sentence_transformers import SentenceTransformer, util
+import time
+import threading
+from pathlib import Path
+import numpy as np
+from sentence_transformers import SentenceTransformer
 import torch
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, NamedTuple, Optional
 from datetime import datetime
+from training_model.embedding_cache import QueryEmbeddingCache
+from training_model.metadata_index import MetadataIndex
+from training_model.bm25_index import BM25Index, OnlineBM25Index, OnlineBM25View, document_text, load_bm25_arrays
+from base.metrics import RETRIEVER_SECONDS, RETRIEVER_TOP_SCORE
+from base.tracing import start_span
 
 logger = logging.getLogger(__name__)
 
+# Fine-tuned retriever checkpoints shipped with the repo (Training_Model/trained_models)
+TRAINED_MODELS_DIR = Path(__file__).parent.parent.parent / "Training_Model" / "trained_models"
+DEFAULT_MODEL_DIR = TRAINED_MODELS_DIR / "MiniLM-L6_flutter_retriever_transformer"
+
+
+# Memory-mappable artifact directory written by Training_Model/build_retriever.py
+ARTIFACT_MANIFEST = "manifest.json"
+ARTIFACT_EMBEDDINGS = "embeddings.npy"
+ARTIFACT_RECORDS = "records.jsonl"
+ARTIFACT_METADATA_INDEX = "metadata_index.pkl"
+
+
+def manifest_path_for(pkl_path: str) -> str:
+    """Return the manifest path for a retrieval model package or artifact directory."""
+    if os.path.isdir(pkl_path):
+        return os.path.join(pkl_path, ARTIFACT_MANIFEST)
+    return os.path.splitext(pkl_path)[0] + ".manifest.json"
+
+
+def load_artifact_dir(artifact_dir: str) -> Dict[str, Any]:
+    """
+    Read an artifact directory into the same shape as a .pkl package.
+
+    The embedding matrix and BM25 arrays are memory-mapped read-only.
+    """
+    with open(os.path.join(artifact_dir, ARTIFACT_MANIFEST), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    with open(os.path.join(artifact_dir, ARTIFACT_RECORDS), 'r', encoding='utf-8') as f:
+        train_data = [json.loads(line) for line in f if line.strip()]
+    # Duplicate-prompt rows of a deduplicated dataset share their record's code
+    for record in train_data:
+        if "code_row" in record:
+            record["flutter_code"] = train_data[record.pop("code_row")]["flutter_code"]
+
+    package = {
+        "model_name": manifest.get("model_name"),
+        "model_dir": manifest.get("model_dir"),
+        "train_data": train_data,
+        "train_embeddings": np.load(os.path.join(artifact_dir, ARTIFACT_EMBEDDINGS), mmap_mode="r"),
+        "normalized": manifest.get("normalized", False),
+    }
+
+    metadata_path = os.path.join(artifact_dir, ARTIFACT_METADATA_INDEX)
+    if os.path.exists(metadata_path):
+        with open(metadata_path, 'rb') as f:
+            package["metadata_index"] = pickle.load(f)
+    if os.path.exists(os.path.join(artifact_dir, "bm25_terms.json")):
+        package["bm25_arrays"] = load_bm25_arrays(artifact_dir)
+    return package
+
+
+def embeddings_sha256(embeddings) -> str:
+    """Hash the embedding matrix as contiguous float32 bytes."""
+    if isinstance(embeddings, torch.Tensor):
+        embeddings = embeddings.detach().cpu().numpy()
+    matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+    return hashlib.sha256(matrix.tobytes()).hexdigest()
+
+
+def model_identity(model_dir: str) -> Dict[str, str]:
+    """
+    Resolved checkpoint path and a hash of its config files.
+
+    Same identity as ``Training_Model/build_retriever.py`` stores with its
+    shards; vectors recorded under another identity came from another encoder.
+    """
+    model_dir = os.path.realpath(model_dir)
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(model_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.json'):
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, model_dir).encode('utf-8') + b'\0')
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+    return {'model_dir': model_dir, 'model_config_sha256': digest.hexdigest()}
+
+
+def write_manifest(pkl_path: str, model_dir: str) -> str:
+    """Pin a retrieval model package to a local checkpoint and its embedding hash."""
+    with open(pkl_path, 'rb') as f:
+        package = pickle.load(f)
+
+    embeddings = package["train_embeddings"]
+    manifest = {
+        "model_dir": str(model_dir),
+        "embeddings_sha256": embeddings_sha256(embeddings),
+        "num_samples": len(package.get("train_data", [])),
+        "embedding_dim": int(np.asarray(embeddings).shape[-1]),
+        "created_at": datetime.now().isoformat(),
+    }
+
+    manifest_path = manifest_path_for(pkl_path)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    logger.info(f"📌 Wrote retrieval model manifest: {manifest_path}")
+    return manifest_path
+
+class RetrieverSnapshot(NamedTuple):
+    """Immutable view of the retriever state; readers grab one and use it throughout."""
+    size: int
+    matrix: np.ndarray
+    metadata_index: MetadataIndex
+    bm25_index: Optional[BM25Index]
+    # BM25 over rows appended online (positions base_size..size)
+    online_bm25: Optional[OnlineBM25View]
+    base_size: int
+
+
 class TrainingModelService:
     """
     Loads and queries the local retrieval model (.pkl) for Flutter code suggestions.
+
+    The encoder is always loaded from a local checkpoint directory with
+    ``local_files_only=True`` so startup never resolves a model over the network.
     """
 
-    def __init__(self, pkl_path: str = "training_model/flutter_ui_retrieval_model.pkl"):
+    def __init__(
+        self,
+        pkl_path: str = "training_model/flutter_ui_retrieval_model.pkl",
+        model_dir: Optional[str] = None,
+        require_manifest: bool = False,
+        embedding_cache: Optional[QueryEmbeddingCache] = None,
+        retrieval_mode: str = "hybrid",
+        rrf_k: int = 60,
+        rrf_depth: int = 100,
+        sparse_first_stage: Optional[int] = None,
+    ):
         self.pkl_path = pkl_path
+        self.model_dir = model_dir or os.getenv("TRAINING_MODEL_DIR")
+        self.require_manifest = require_manifest
+        # "dense" scores embeddings only, "hybrid" fuses dense and BM25 ranks (RRF)
+        self.retrieval_mode = retrieval_mode
+        self.rrf_k = rrf_k
+        self.rrf_depth = rrf_depth
+        # When set, only the top-N BM25 candidates are scored densely
+        self.sparse_first_stage = sparse_first_stage
         self.model_name = None
         self.encoder = None
+        # model_identity of the loaded encoder; online log records embedded by another one are not replayed
+        self.encoder_identity: Optional[Dict[str, str]] = None
         self.train_data = []
         self.train_embeddings = None
+        # L2-normalized float32 copy of the embeddings used for scoring
+        self.train_matrix = None
+        self.metadata_index = None
+        self.bm25_index = None
+        self._snapshot: Optional[RetrieverSnapshot] = None
+        # Backing store for train_matrix; spare rows absorb online appends
+        self._matrix_buffer = None
+        self._write_lock = threading.Lock()
+        # BM25 postings of the rows appended online; extended in place, read through snapshot views
+        self._online_bm25 = OnlineBM25Index()
         self.is_loaded = False
+        # Shared with any other component that embeds prompts
+        self.embedding_cache = embedding_cache or QueryEmbeddingCache()
 
     def load(self) -> bool:
-        """Load the saved training model (.pkl)."""
+        """Load the saved training model (.pkl file or artifact directory)."""
         if not os.path.exists(self.pkl_path):
             logger.error(f"❌ Model file not found: {self.pkl_path}")
             return False
@@ -31,21 +189,75 @@ class TrainingModelService:
         try:
             logger.info(f"📦 Loading training model from {self.pkl_path} ...")
 
-            with open(self.pkl_path, 'rb') as f:
-                package = pickle.load(f)
+            if os.path.isdir(self.pkl_path):
+                package = load_artifact_dir(self.pkl_path)
+            else:
+                with open(self.pkl_path, 'rb') as f:
+                    package = pickle.load(f)
 
             self.model_name = package.get("model_name", "all-MiniLM-L6-v2")
             self.train_data = package.get("train_data", [])
             self.train_embeddings = package.get("train_embeddings", None)
 
-            if not isinstance(self.train_embeddings, torch.Tensor):
-                try:
-                    self.train_embeddings = torch.tensor(self.train_embeddings)
-                except Exception:
-                    logger.warning("⚠️ Failed to convert embeddings to torch.Tensor")
+            if isinstance(self.train_embeddings, torch.Tensor):
+                self.train_embeddings = self.train_embeddings.detach().cpu().numpy()
+            self.train_embeddings = np.asarray(self.train_embeddings, dtype=np.float32)
+
+            manifest = self._load_manifest()
+            if manifest is None and self.require_manifest:
+                logger.error(
+                    f"❌ Manifest required but not found: {manifest_path_for(self.pkl_path)} "
+                    f"(write it with: python -m training_model.training_model_service --write-manifest --pkl {self.pkl_path})"
+                )
+                return False
+            if manifest is not None and not self._verify_manifest(manifest):
+                return False
+
+            model_dir = self._resolve_model_dir(package, manifest)
+            if model_dir is None:
+                return False
+
+            if package.get("normalized"):
+                # Rows are already unit length; score straight off the memory map
+                self.train_matrix = self.train_embeddings
+            else:
+                self.train_matrix = self._normalize_rows(self.train_embeddings)
+
+            if package.get("metadata_index") is not None:
+                self.metadata_index = MetadataIndex.from_dict(package["metadata_index"])
+            else:
+                logger.info("🗂️ Package has no metadata index, building one at load time")
+                self.metadata_index = MetadataIndex.build(self.train_data)
 
-            self.train_embeddings = self.train_embeddings.to("cpu")
-            self.encoder = SentenceTransformer(self.model_name)
+            if package.get("bm25_arrays") is not None:
+                self.bm25_index = package["bm25_arrays"]
+            elif package.get("bm25_index") is not None:
+                self.bm25_index = BM25Index.from_dict(package["bm25_index"])
+            elif self.retrieval_mode == "hybrid":
+                logger.info("🔤 Package has no BM25 index, building one at load time")
+                self.bm25_index = BM25Index.build(document_text(entry) for entry in self.train_data)
+
+            self._matrix_buffer = self.train_matrix
+            self._snapshot = RetrieverSnapshot(
+                size=len(self.train_data),
+                matrix=self.train_matrix,
+                metadata_index=self.metadata_index,
+                bm25_index=self.bm25_index,
+                online_bm25=None,
+                base_size=len(self.train_data),
+            )
+
+            logger.info(f"🧠 Loading local retriever checkpoint: {model_dir}")
+            encoder = SentenceTransformer(str(model_dir), device="cpu", local_files_only=True)
+            # A matrix embedded by another encoder would be queried with meaningless vectors
+            dim = encoder.get_sentence_embedding_dimension()
+            expected_dims = {self.train_matrix.shape[1], (manifest or {}).get("embedding_dim", dim)}
+            if expected_dims != {dim}:
+                logger.error(f"❌ Encoder dimension {dim} does not match the embedding matrix {sorted(expected_dims)}")
+                return False
+            self.encoder = encoder
+            self.model_dir = str(model_dir)
+            self.encoder_identity = model_identity(self.model_dir)
             self.is_loaded = True
 
             logger.info(f"✅ Training model loaded successfully ({len(self.train_data)} samples)")
@@ -55,26 +267,279 @@ class TrainingModelService:
             logger.exception(f"❌ Failed to load training model: {e}")
             return False
 
-    def _retrieve(self, query: str, top_k: int = 1, threshold: float = 0.0) -> Optional[Dict[str, Any]]:
-        """Retrieve top-matching Flutter code from the dataset."""
+    def _load_manifest(self) -> Optional[Dict[str, Any]]:
+        """Read the manifest that pins this package, if one exists."""
+        manifest_path = manifest_path_for(self.pkl_path)
+        if not os.path.exists(manifest_path):
+            logger.warning(
+                f"⚠️ No manifest found for {self.pkl_path}: the encoder and embedding hash are NOT verified. "
+                f"Pin them with: python -m training_model.training_model_service --write-manifest --pkl {self.pkl_path}"
+            )
+            return None
+
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _verify_manifest(self, manifest: Dict[str, Any]) -> bool:
+        """Check the loaded embedding matrix against the manifest hash."""
+        expected = manifest.get("embeddings_sha256")
+        actual = embeddings_sha256(self.train_embeddings)
+
+        if expected != actual:
+            logger.error(f"❌ Embedding hash mismatch: manifest={expected} loaded={actual}")
+            return False
+
+        if manifest.get("num_samples") not in (None, len(self.train_data)):
+            logger.error(
+                f"❌ Sample count mismatch: manifest={manifest['num_samples']} loaded={len(self.train_data)}"
+            )
+            return False
+
+        logger.info("✅ Embedding matrix matches manifest hash")
+        return True
+
+    def _resolve_model_dir(self, package: Dict[str, Any], manifest: Optional[Dict[str, Any]]) -> Optional[Path]:
+        """
+        Pick the local checkpoint directory for the encoder.
+
+        Order: explicit ``model_dir`` / ``TRAINING_MODEL_DIR``, the manifest pin,
+        the ``model_dir`` saved in the package, then the bundled MiniLM-L6 checkpoint.
+        A manifest pin is binding: when it is missing locally there is no fallback.
+        Relative paths are tried against the package directory and ``trained_models``.
+        """
+        pinned = (manifest or {}).get("model_dir")
+        if pinned:
+            candidates = [self.model_dir, pinned]
+        else:
+            candidates = [self.model_dir, package.get("model_dir"), str(DEFAULT_MODEL_DIR)]
+        pkl_dir = Path(self.pkl_path).resolve().parent
+
+        for candidate in candidates:
+            if not candidate:
+                continue
+            path = Path(candidate)
+            for option in (path, pkl_dir / path, TRAINED_MODELS_DIR / path.name):
+                if (option / "modules.json").exists():
+                    return option.resolve()
+            logger.warning(f"⚠️ Retriever checkpoint not found locally: {candidate}")
+
+        if pinned:
+            logger.error(f"❌ Checkpoint pinned by the manifest is not available locally: {pinned}")
+            return None
+        logger.error("❌ No local retriever checkpoint available (network loading is disabled)")
+        return None
+
+    @staticmethod
+    def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+        """L2-normalize rows so a dot product is the cosine similarity."""
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+    def _retrieve(
+        self,
+        query: str,
+        top_k: int = 1,
+        threshold: float = 0.0,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve the top-k matching Flutter code entries, best first.
+
+        ``filters`` (category, layout_type, tags, components) are resolved
+        through the metadata index first so only the matching rows are scored.
+        In hybrid mode the BM25 ranking is fused with the cosine ranking; the
+        returned ``score`` stays the cosine similarity that ``threshold`` applies to.
+        """
         if not self.is_loaded:
             raise RuntimeError("Model not loaded.")
 
-        query_emb = self.encoder.encode(query, convert_to_tensor=True)
-        cos_scores = util.pytorch_cos_sim(query_emb, self.train_embeddings)[0]
-        top = torch.topk(cos_scores, k=min(top_k, len(self.train_data)))
+        start = time.perf_counter()
+        with start_span("retriever.retrieve", mode=self.retrieval_mode, top_k=top_k,
+                        filtered=bool(filters)) as span:
+            snap = self._snapshot
+            candidates = snap.metadata_index.candidates(filters)
+            if candidates is not None and candidates.size == 0:
+                span.set_attribute("candidates", 0)
+                return []
 
-        for score, idx in zip(top.values, top.indices):
-            sim = float(score)
-            if sim >= threshold:
-                entry = self.train_data[int(idx)]
-                return {
+            sparse_scores = None
+            if self.retrieval_mode == "hybrid" and snap.bm25_index is not None:
+                with start_span("retriever.bm25"):
+                    sparse_scores = self._sparse_scores(snap, query)
+                    if self.sparse_first_stage:
+                        candidates = self._sparse_candidates(sparse_scores, candidates)
+
+            with start_span("retriever.embed_query"):
+                query_emb = self.embed_query(query).astype(np.float32)
+            with start_span("retriever.dense_scoring") as dense_span:
+                norm = float(np.linalg.norm(query_emb)) or 1.0
+                matrix = snap.matrix if candidates is None else snap.matrix[candidates]
+                dense = matrix @ (query_emb / norm)
+                dense_span.set_attribute("rows", int(matrix.shape[0]))
+            sparse = None
+            if sparse_scores is not None:
+                sparse = sparse_scores if candidates is None else sparse_scores[candidates]
+
+            with start_span("retriever.rank"):
+                if sparse is None or not sparse.any():
+                    order = self._top_positions(dense, top_k)
+                    fused = None
+                else:
+                    order, fused = self._fuse_ranks(dense, sparse, top_k)
+
+            results = []
+            for rank, pos in enumerate(order):
+                sim = float(dense[pos])
+                if sim < threshold:
+                    continue
+                idx = int(pos) if candidates is None else int(candidates[pos])
+                entry = self.train_data[idx]
+                result = {
+                    "index": idx,
                     "prompt": entry.get("prompt"),
                     "code": entry.get("flutter_code"),
                     "category": entry.get("category", "unknown"),
+                    "layout_type": entry.get("layout_type"),
+                    "components": entry.get("components", []),
                     "score": sim,
                 }
-        return None
+                if fused is not None:
+                    result["bm25_score"] = float(sparse[pos])
+                    result["fused_score"] = float(fused[rank])
+                results.append(result)
+
+            RETRIEVER_SECONDS.observe(time.perf_counter() - start, self.retrieval_mode)
+            span.set_attribute("results", len(results))
+            if results:
+                RETRIEVER_TOP_SCORE.observe(results[0]["score"])
+                span.set_attribute("top_score", results[0]["score"])
+            return results
+
+    @staticmethod
+    def _sparse_scores(snap: RetrieverSnapshot, query: str) -> np.ndarray:
+        """BM25 scores for every row of the snapshot, base and online segments."""
+        scores = snap.bm25_index.score(query)
+        if snap.online_bm25 is not None:
+            scores = np.concatenate([scores, snap.online_bm25.score(query)])
+        return scores
+
+    @staticmethod
+    def _top_positions(scores: np.ndarray, k: int) -> np.ndarray:
+        """Positions of the ``k`` highest scores, best first."""
+        k = min(k, scores.shape[0])
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        top = np.argpartition(-scores, k - 1)[:k] if k < scores.shape[0] else np.arange(scores.shape[0])
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    def _sparse_candidates(self, sparse_scores: np.ndarray, candidates: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """Narrow the candidate set to the top BM25 hits (first-stage filter)."""
+        pool = sparse_scores if candidates is None else sparse_scores[candidates]
+        hits = int(np.count_nonzero(pool))
+        if hits == 0:
+            return candidates
+        top = self._top_positions(pool, min(self.sparse_first_stage, hits))
+        selected = top if candidates is None else candidates[top]
+        return np.sort(selected)
+
+    def _fuse_ranks(self, dense: np.ndarray, sparse: np.ndarray, top_k: int):
+        """
+        Reciprocal-rank fusion of the dense and sparse rankings.
+
+        Only the top ``rrf_depth`` of each ranking contribute, as usual for RRF.
+        Returns the fused order (best first) and the fused scores in that order.
+        """
+        depth = max(self.rrf_depth, top_k)
+        dense_top = self._top_positions(dense, depth)
+        sparse_top = self._top_positions(sparse, min(depth, int(np.count_nonzero(sparse))))
+
+        fused: Dict[int, float] = {}
+        for rank, pos in enumerate(dense_top, 1):
+            fused[int(pos)] = 1.0 / (self.rrf_k + rank)
+        for rank, pos in enumerate(sparse_top, 1):
+            fused[int(pos)] = fused.get(int(pos), 0.0) + 1.0 / (self.rrf_k + rank)
+
+        ranked = sorted(fused.items(), key=lambda item: (-item[1], -dense[item[0]]))[:top_k]
+        order = np.asarray([pos for pos, _ in ranked], dtype=np.int64)
+        return order, [score for _, score in ranked]
+
+    def snapshot(self) -> RetrieverSnapshot:
+        """Current consistent view of the retriever state."""
+        return self._snapshot
+
+    def append_entries(self, entries: List[Dict[str, Any]], embeddings) -> int:
+        """
+        Append records and their embeddings without rebuilding the base index.
+
+        Rows are written past the end of the current snapshot's matrix view and
+        a new snapshot is published afterwards, so concurrent readers always see
+        a consistent set of rows. Returns the new number of records.
+        """
+        if not self.is_loaded:
+            raise RuntimeError("Model not loaded.")
+        if not entries:
+            return self._snapshot.size
+
+        rows = self._normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(entries), -1))
+
+        with self._write_lock:
+            snap = self._snapshot
+            start, end = snap.size, snap.size + len(entries)
+
+            if end > self._matrix_buffer.shape[0]:
+                capacity = max(end, snap.size + max(snap.size // 2, 1024))
+                buffer = np.empty((capacity, rows.shape[1]), dtype=np.float32)
+                buffer[:start] = self._matrix_buffer[:start]
+                self._matrix_buffer = buffer
+            self._matrix_buffer[start:end] = rows
+
+            self.train_data.extend(entries)
+            online_bm25 = None
+            if snap.bm25_index is not None:
+                self._online_bm25.append(document_text(entry) for entry in entries)
+                online_bm25 = self._online_bm25.view()
+
+            self._snapshot = RetrieverSnapshot(
+                size=end,
+                matrix=self._matrix_buffer[:end],
+                metadata_index=snap.metadata_index.extended(entries, start),
+                bm25_index=snap.bm25_index,
+                online_bm25=online_bm25,
+                base_size=snap.base_size,
+            )
+
+        logger.info(f"➕ Appended {len(entries)} entries to the retriever ({end} total)")
+        return end
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        threshold: float = 0.0,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Public top-k search with optional metadata filters."""
+        return self._retrieve(query, top_k, threshold, filters)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """
+        Embed a prompt through the shared LRU cache, under this encoder's id
+        (its checkpoint directory) so other models sharing the cache never
+        get these vectors.
+        """
+        if not self.is_loaded:
+            raise RuntimeError("Model not loaded.")
+
+        return self.embedding_cache.get_or_compute(
+            self.model_dir,
+            query,
+            lambda text: self.encoder.encode(text, convert_to_numpy=True),
+        )
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Return query-embedding cache metrics."""
+        return self.embedding_cache.stats()
 
     def _save_to_training_widget(self, dart_code: str) -> bool:
         """Save generated code to frontend/lib/widgets/training_model_widget.dart"""
@@ -103,15 +568,21 @@ class TrainingModelService:
             logger.error(f"❌ Error writing training widget file: {str(e)}")
             return False
 
-    def get_code(self, prompt: str, top_k: int = 1, threshold: float = 0.0) -> Dict[str, Any]:
+    def get_code(
+        self,
+        prompt: str,
+        top_k: int = 1,
+        threshold: float = 0.0,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
         """Public interface — retrieve and save result like other LLMs."""
         svc_name = "training_model"
         widget_name = "TrainingModelGeneratedWidget"
 
         try:
-            retrieved = self._retrieve(prompt, top_k, threshold)
+            matches = self._retrieve(prompt, top_k, threshold, filters)
 
-            if not retrieved:
+            if not matches:
                 return {
                     "service": svc_name,
                     "success": False,
@@ -122,6 +593,7 @@ class TrainingModelService:
                     "score": None,
                 }
 
+            retrieved = matches[0]
             code = retrieved["code"]
             score = retrieved["score"]
 
@@ -136,6 +608,10 @@ class TrainingModelService:
                 "widget_name": widget_name,
                 "model": self.model_name,
                 "score": score,
+                "matches": [
+                    {key: value for key, value in match.items() if key != "code"}
+                    for match in matches
+                ],
             }
 
         except Exception as e:
@@ -149,3 +625,30 @@ class TrainingModelService:
                 "model": self.model_name,
                 "score": None,
             }
+
+
+if __name__ == "__main__":
+    # Usage (from backend/), once per retrieval model package, e.g. after upgrading or rebuilding it:
+    #   python -m training_model.training_model_service --write-manifest [--pkl PATH] [--model-dir CHECKPOINT]
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pin a retrieval model package to its encoder checkpoint")
+    parser.add_argument("--write-manifest", action="store_true", help="Write <package>.manifest.json")
+    parser.add_argument("--pkl", default="training_model/flutter_ui_retrieval_model.pkl")
+    parser.add_argument("--model-dir", default=None,
+                        help="Checkpoint the package was embedded with (default: resolved as at load time)")
+    args = parser.parse_args()
+    if not args.write_manifest:
+        parser.error("nothing to do (pass --write-manifest)")
+
+    if args.model_dir and not (Path(args.model_dir) / "modules.json").exists():
+        parser.error(f"not a sentence-transformers checkpoint: {args.model_dir}")
+
+    logging.basicConfig(level=logging.INFO)
+    with open(args.pkl, 'rb') as f:
+        package = pickle.load(f)
+    service = TrainingModelService(pkl_path=args.pkl, model_dir=args.model_dir)
+    model_dir = service._resolve_model_dir(package, None)
+    if model_dir is None:
+        raise SystemExit(1)
+    write_manifest(args.pkl, str(model_dir))